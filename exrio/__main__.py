@@ -13,14 +13,27 @@ from fs.osfs import OSFS
 from fs.errors import CreateFailed
 
 # exrio
-from exrio.rechannel import rechannel_dir, rechannel_file
-from exrio.preview import preview_dir, preview_file
+from exrio.rechannel import rechannel_dir, rechannel_file, HALF_EXCLUDE, CONSTANT_MODES, CONSTANT_CHANNELS_ATTRIBUTE
+from exrio.split import split_dir, split_file
+from exrio.merge import merge_dirs
+from exrio.preview import preview_dir, preview_file, preview_files_to_url, get_preview_name
+from exrio.contactsheet import contactsheet_dir, contactsheet_files, DEFAULT_TILE_WIDTH, DEFAULT_COLUMNS, MAX_SHEET_SIZE
 from exrio.inspect import inspect_dir, inspect_file
+from exrio.diff import diff_dirs, diff_files
+from exrio.shard import merge_manifests
 from exrio import console
 
 # helpers
 from exrio.helpers.dict_helpers import dict_to_namedtuple
 from exrio.helpers.fs_helpers import assure_fs
+from exrio.helpers.archive_helpers import is_fs_url, is_persistent_url
+from exrio.helpers.multiprocessing_helpers import get_num_threads
+from exrio.helpers.discovery_helpers import DEFAULT_INCLUDE
+from exrio.helpers.exposure_helpers import DEFAULT_SAMPLE_RATE, DEFAULT_PERCENTILES
+from exrio.helpers.color_helpers import VIEWS, TONES, RAW_VIEW, DEFAULT_VIEW, DEFAULT_TONE
+from exrio.helpers.sequence_helpers import FrameRange
+from exrio.helpers.shard_helpers import Shard
+from exrio.helpers.cache_helpers import PreviewCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE
 
 # overrides
 
@@ -79,6 +92,54 @@ def apply_multiprocessing_arguments(parser):
     # multithreading
     parser.add_argument('--multithreading', type=int, default=1, help='Use multithreading (default=1).')
 
+def apply_half_arguments(parser):
+    # half
+    parser.add_argument('--half', action='store_true', help='Convert float channels to half unless the map specifies a pixel type.')
+
+    # half exclude
+    parser.add_argument('--half_exclude', type=str, nargs='+', help='Regular expressions of channels to keep at full precision with --half (default={}).'.format(' '.join(HALF_EXCLUDE)))
+
+def apply_part_argument(parser):
+    # part
+    parser.add_argument('--part', type=str, help='Index or name of the part to process in multipart EXR files. Only the first part can be read, outputs are written as single part scanline files, so writing files with several parts requires --part 0.')
+
+def apply_resume_argument(parser):
+    # resume
+    parser.add_argument('--resume', action='store_true', help='Skip files completed by the previous job according to the journal in the output directory.')
+
+def apply_shard_argument(parser):
+    # shard
+    parser.add_argument('--shard', type=Shard.parse, help='Process only shard i of n of the discovered files, e.g. 3/20. Shards are balanced by file size and write a manifest to the output directory.')
+
+    # job
+    parser.add_argument('--job', type=str, help='Identifier of the job shared by all of its shards, e.g. the job id of the render farm. Recorded in the manifest, so shard-merge ignores manifests of other jobs in the same output directory.')
+
+def apply_view_arguments(parser):
+    # percentiles
+    parser.add_argument('--percentiles', type=float, nargs=2, default=list(DEFAULT_PERCENTILES), metavar=('LOW', 'HIGH'), help='Percentiles of pixel values mapped to black and white, outliers beyond them are clipped (default={} {}).'.format(*DEFAULT_PERCENTILES))
+
+    # view
+    parser.add_argument('--view', type=str, choices=VIEWS, default=DEFAULT_VIEW, help='View of the pixels, raw maps the exposure range linearly, linear, srgb and rec709 are display views of scene linear pixels (default={}).'.format(DEFAULT_VIEW))
+
+    # tone
+    parser.add_argument('--tone', type=str, choices=TONES, default=DEFAULT_TONE, help='Tone curve compressing highlights of display views (default={}).'.format(DEFAULT_TONE))
+
+    # exposure
+    parser.add_argument('--exposure', type=float, default=0.0, help='Exposure adjustment in stops, e.g. +1 doubles the brightness (default=0).')
+
+def apply_discovery_arguments(parser):
+    # include
+    parser.add_argument('--include', type=str, nargs='+', help='Glob patterns of files to process in directories (default={}).'.format(' '.join(DEFAULT_INCLUDE)))
+
+    # exclude
+    parser.add_argument('--exclude', type=str, nargs='+', help='Glob patterns of files and directories to skip in directories.')
+
+    # max depth
+    parser.add_argument('--max_depth', type=int, help='Maximum depth of subdirectories to scan, 0 scans only the input directory.')
+
+    # frames
+    parser.add_argument('--frames', type=FrameRange.parse, help='Frames to process in directories, e.g. 1001-1100x2,1200. Frame numbers follow a . or _ and have at least 3 digits, e.g. shot.1001.exr, files without frame number are skipped.')
+
 def apply_input_output_arguments(parser):
     # input path argument
     parser.add_argument('input', default=os.getcwd(), type=str, help='Path to an EXR file or a directory containing EXR files.')
@@ -98,7 +159,8 @@ def handle_arguments():
         '^(?P<layer>g)$': 'G',
         '^(?P<layer>b)$': 'B',
         '^(?P<layer>a)$': 'A',
-        '(?P<layer>diffuse)\.(?P<channel>\S+)': 'diffuse'
+        '(?P<layer>diffuse)\.(?P<channel>\S+)': 'diffuse',
+        '(?P<layer>specular)\.(?P<channel>\S+)': {'name': 'specular', 'type': 'HALF'}
     }
 
     # argument parser
@@ -130,26 +192,177 @@ def handle_arguments():
     apply_input_output_arguments(rechannel_parser)
 
     # layer map argument
-    rechannel_parser.add_argument('map', type=str, help='Path to a JSON file containing the layers to rename. Use regular expression to find the name and replace it with a new name. Example: {}'.format(json.dumps(layer_map)))
+    rechannel_parser.add_argument('map', type=str, help='Path to a JSON file containing the layers to rename. Use regular expression to find the name and replace it with a new name or a dict with a new name and pixel type (UINT, HALF or FLOAT). Example: {}'.format(json.dumps(layer_map)))
+
+    apply_half_arguments(rechannel_parser)
+
+    # constant
+    rechannel_parser.add_argument('--constant', type=str, choices=CONSTANT_MODES, help='Drop channels with a single value for all pixels and optionally record them as JSON in the {} header attribute, NaN and infinite values are recorded as the strings nan, inf and -inf.'.format(CONSTANT_CHANNELS_ATTRIBUTE))
+
+    apply_part_argument(rechannel_parser)
+
+    apply_discovery_arguments(rechannel_parser)
+
+    apply_shard_argument(rechannel_parser)
+
+    apply_resume_argument(rechannel_parser)
 
     apply_multiprocessing_arguments(rechannel_parser)
 
+    # create split subparser
+    split_parser = subparsers.add_parser('split', help='Split EXR files into one EXR file per renamed layer, stored in a directory per layer.')
+
+    apply_input_output_arguments(split_parser)
+
+    # layer map argument
+    split_parser.add_argument('map', type=str, help='Path to a JSON file containing the layers to split. Channels are grouped into files by their replacement name.')
+
+    apply_half_arguments(split_parser)
+
+    apply_part_argument(split_parser)
+
+    apply_discovery_arguments(split_parser)
+
+    apply_shard_argument(split_parser)
+
+    apply_resume_argument(split_parser)
+
+    apply_multiprocessing_arguments(split_parser)
+
+    # create merge subparser
+    merge_parser = subparsers.add_parser('merge', help='Merge EXR files of several directories into one EXR file per frame.')
+
+    # input paths argument
+    merge_parser.add_argument('input', type=str, nargs='+', help='Paths to directories containing EXR files, files are matched by frame number.')
+
+    # output path argument
+    merge_parser.add_argument('output', type=str, help='Path to output directory.')
+
+    # layer map argument
+    merge_parser.add_argument('map', type=str, help='Path to a JSON file containing the layers to merge.')
+
+    # prefix
+    merge_parser.add_argument('--prefix', type=str, help='Prefix output files.')
+
+    # name
+    merge_parser.add_argument('--name', type=str, default='merged', help='Name of output files, followed by the frame number (default=merged).')
+
+    # qualify
+    merge_parser.add_argument('--qualify', action='store_true', help='Prefix channel names with the name of their input directory before matching the map, e.g. R of diffuse/v001/diffuse.1001.exr becomes diffuse.R for the input diffuse, files in subdirectories keep the name of the input.')
+
+    apply_half_arguments(merge_parser)
+
+    apply_discovery_arguments(merge_parser)
+
+    apply_shard_argument(merge_parser)
+
+    apply_resume_argument(merge_parser)
+
+    apply_multiprocessing_arguments(merge_parser)
+
     # create preview subparser
-    preview_parser = subparsers.add_parser('preview', help='Create previews for EXR files and directories containing EXR files.')
+    preview_parser = subparsers.add_parser('preview', help='Create previews for EXR files and directories containing EXR files. The output may be a directory or an FS URL, e.g. zip://previews.zip, tar://previews.tar or ftp://host/previews, archives are written sequentially with an index next to them. Filesystems which discard their files once closed, like mem://, are rejected.')
 
     apply_input_output_arguments(preview_parser)
 
+    apply_part_argument(preview_parser)
+
+    apply_discovery_arguments(preview_parser)
+
+    apply_shard_argument(preview_parser)
+
+    apply_resume_argument(preview_parser)
+
     apply_multiprocessing_arguments(preview_parser)
 
     # layer
     preview_parser.add_argument('--layer', type=str, nargs='+', help='Select layer to preview (default=rgb).')
 
+    # cache
+    preview_parser.add_argument('--cache', type=str, nargs='?', const=DEFAULT_CACHE_DIR, help='Serve previews from a shared cache directory and store new previews in it (default={}).'.format(DEFAULT_CACHE_DIR))
+
+    # cache size
+    preview_parser.add_argument('--cache_size', type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024), help='Maximum size of the preview cache in megabytes, least recently used previews are evicted (default={}).'.format(DEFAULT_CACHE_SIZE // (1024 * 1024)))
+
+    # sample rate
+    preview_parser.add_argument('--sample_rate', type=float, default=DEFAULT_SAMPLE_RATE, help='Fraction of bands of scanlines sampled to estimate the exposure range, 1 samples every pixel (default={}).'.format(DEFAULT_SAMPLE_RATE))
+
+    apply_view_arguments(preview_parser)
+
+    # create contact sheet subparser
+    contactsheet_parser = subparsers.add_parser('contactsheet', help='Create one contact sheet per frame sequence with downscaled frames and their frame numbers, without writing full resolution previews. Sheets mirror the directory tree of the input.')
+
+    apply_input_output_arguments(contactsheet_parser)
+
+    apply_part_argument(contactsheet_parser)
+
+    apply_discovery_arguments(contactsheet_parser)
+
+    apply_shard_argument(contactsheet_parser)
+
+    apply_resume_argument(contactsheet_parser)
+
+    apply_multiprocessing_arguments(contactsheet_parser)
+
+    # layer
+    contactsheet_parser.add_argument('--layer', type=str, nargs='+', help='Select layer to preview (default=rgb).')
+
+    # tile width
+    contactsheet_parser.add_argument('--tile_width', type=int, default=DEFAULT_TILE_WIDTH, help='Maximum width of downscaled frames in pixels (default={}).'.format(DEFAULT_TILE_WIDTH))
+
+    # columns
+    contactsheet_parser.add_argument('--columns', type=int, default=DEFAULT_COLUMNS, help='Number of frames per row (default={}).'.format(DEFAULT_COLUMNS))
+
+    apply_view_arguments(contactsheet_parser)
+
+    # create diff subparser
+    diff_parser = subparsers.add_parser('diff', help='Compare pixels of EXR files or directories containing EXR files.')
+
+    # first path argument
+    diff_parser.add_argument('a', type=str, help='Path to an EXR file or a directory containing EXR files.')
+
+    # second path argument
+    diff_parser.add_argument('b', type=str, help='Path to an EXR file or a directory to compare against, files are paired by relative path.')
+
+    # layer map
+    diff_parser.add_argument('--map', type=str, help='Path to a JSON file with the layer map to apply to channels of a before comparing.')
+
+    # tolerance
+    diff_parser.add_argument('--tolerance', type=float, default=0.0, help='Maximum absolute difference per pixel (default=0).')
+
+    apply_discovery_arguments(diff_parser)
+
+    apply_shard_argument(diff_parser)
+
+    apply_multiprocessing_arguments(diff_parser)
+
     # create inspect subparser
     inspect_parser = subparsers.add_parser('inspect', help='Inspect EXR files or a directory containing EXR files.')
 
     # input path argument
     inspect_parser.add_argument('input', type=str, help='Path to an EXR file or a directory containing EXR files.')
 
+    apply_discovery_arguments(inspect_parser)
+
+    apply_shard_argument(inspect_parser)
+
+    # sequences
+    inspect_parser.add_argument('--sequences', action='store_true', help='Summarize frame sequences including frame ranges and missing frames instead of headers.')
+
+    # stats
+    inspect_parser.add_argument('--stats', action='store_true', help='Compute min, max, mean, NaN and Inf counts and percentage of zero pixels per channel.')
+
+    apply_multiprocessing_arguments(inspect_parser)
+
+    # create shard merge subparser
+    shard_merge_parser = subparsers.add_parser('shard-merge', help='Combine the manifests of all shards of a job and report missing shards, failed and unfinished files.')
+
+    # output path argument
+    shard_merge_parser.add_argument('output', type=str, help='Path to the output directory of the sharded job.')
+
+    # job
+    shard_merge_parser.add_argument('--job', type=str, help='Identifier of the job to merge (default=job of the most recent manifest).')
+
     try:
         args = parser.parse_args()
     except ArgumentParserError as error:
@@ -163,12 +376,57 @@ def handle_arguments():
 
         return
 
+    # all shards of a job record the same job identifier
+    if getattr(args, 'shard', None):
+        args.shard.job = args.job
+
     if args.module == 'rechannel':
         handle_rechannel(**vars(args))
+    elif args.module == 'split':
+        handle_split(**vars(args))
+    elif args.module == 'merge':
+        handle_merge(**vars(args))
     elif args.module == 'preview':
         handle_preview(**vars(args))
+    elif args.module == 'contactsheet':
+        handle_contactsheet(**vars(args))
+    elif args.module == 'diff':
+        handle_diff(**vars(args))
     elif args.module == 'inspect':
         handle_inspect(**vars(args))
+    elif args.module == 'shard-merge':
+        handle_shard_merge(**vars(args))
+
+def load_layer_map(path):
+    """ Load layer map from JSON file.
+
+    Args:
+        path (str): Path to layer map
+
+    Returns:
+        dict: Layer map or None if it could not be loaded
+    """
+    # split map path
+    dirname, basename = os.path.split(unicode(path))
+    try:
+        map_fs = OSFS(dirname)
+
+        if map_fs.isfile(basename):
+            with map_fs.open(basename) as file_handle:
+                try:
+                    return json.loads(file_handle.read())
+                except Exception as error:
+                    console.error(error)
+
+                    return
+        else:
+            console.error('Map {} does not exist.'.format(path))
+
+            return
+    except CreateFailed:
+        console.error('Map parent directory {} does not exist.'.format(path))
+
+        return
 
 def handle_rechannel(**kwargs):
     """ Handle rechannel actions.
@@ -181,7 +439,17 @@ def handle_rechannel(**kwargs):
         'output': None,
         'prefix': None,
         'map': None,
+        'half': False,
+        'half_exclude': None,
+        'constant': None,
+        'part': None,
+        'include': None,
+        'exclude': None,
+        'max_depth': None,
+        'frames': None,
+        'shard': None,
         'num_threads': None,
+        'resume': False,
         'multithreading': 1
     }
 
@@ -192,26 +460,9 @@ def handle_rechannel(**kwargs):
     # open output filesystem
     out_fs = assure_fs(args.output)
 
-    # split map path
-    dirname, basename = os.path.split(unicode(args.map))
-    try:
-        map_fs = OSFS(dirname)
-
-        if map_fs.isfile(basename):
-            with map_fs.open(basename) as file_handle:
-                try:
-                    layer_map = json.loads(file_handle.read())
-                except Exception as error:
-                    console.error(error)
-
-                    return
-        else:
-            console.error('Map {} does not exist.'.format(args.map))
-
-            return
-    except CreateFailed:
-        console.error('Map parent directory {} does not exist.'.format(args.map))
+    layer_map = load_layer_map(args.map)
 
+    if layer_map is None:
         return
 
     # split input path
@@ -226,14 +477,116 @@ def handle_rechannel(**kwargs):
             if args.prefix:
                 basename = args.prefix + basename
 
-            rechannel_file(in_fs.getsyspath(basename), out_fs.getsyspath(basename), layer_map)
+            rechannel_file(in_fs.getsyspath(basename), out_fs.getsyspath(basename), layer_map, args.half, args.half_exclude, args.constant, args.part, get_num_threads(args.num_threads))
         elif in_fs.isdir(basename):
-            rechannel_dir(in_fs.opendir(basename), out_fs, layer_map, args.num_threads, bool(args.multithreading), prefix=args.prefix)
+            rechannel_dir(in_fs.opendir(basename), out_fs, layer_map, args.num_threads, bool(args.multithreading), prefix=args.prefix, half=args.half, half_exclude=args.half_exclude, constant=args.constant, part=args.part, include=args.include, exclude=args.exclude, max_depth=args.max_depth, frames=args.frames, shard=args.shard, resume=args.resume)
     except CreateFailed:
         console.error('Input {} does not exist.'.format(args.input))
 
         return
 
+def handle_split(**kwargs):
+    """ Handle split actions.
+
+    Args:
+        **kwargs (dict): Arguments
+    """
+    default_args = {
+        'input': None,
+        'output': None,
+        'prefix': None,
+        'map': None,
+        'half': False,
+        'half_exclude': None,
+        'part': None,
+        'include': None,
+        'exclude': None,
+        'max_depth': None,
+        'frames': None,
+        'shard': None,
+        'num_threads': None,
+        'resume': False,
+        'multithreading': 1
+    }
+
+    default_args.update(kwargs)
+
+    args = dict_to_namedtuple(default_args)
+
+    # open output filesystem
+    out_fs = assure_fs(args.output)
+
+    layer_map = load_layer_map(args.map)
+
+    if layer_map is None:
+        return
+
+    # split input path
+    dirname, basename = os.path.split(unicode(args.input))
+
+    # open input filesystem
+    try:
+        in_fs = OSFS(dirname)
+
+        if in_fs.isfile(basename):
+            split_file(in_fs.getsyspath(basename), out_fs.getsyspath(u'/'), layer_map, args.half, args.half_exclude, args.part, get_num_threads(args.num_threads), args.prefix)
+        elif in_fs.isdir(basename):
+            split_dir(in_fs.opendir(basename), out_fs, layer_map, args.num_threads, bool(args.multithreading), prefix=args.prefix, half=args.half, half_exclude=args.half_exclude, part=args.part, include=args.include, exclude=args.exclude, max_depth=args.max_depth, frames=args.frames, shard=args.shard, resume=args.resume)
+    except CreateFailed:
+        console.error('Input {} does not exist.'.format(args.input))
+
+        return
+
+def handle_merge(**kwargs):
+    """ Handle merge actions.
+
+    Args:
+        **kwargs (dict): Arguments
+    """
+    default_args = {
+        'input': None,
+        'output': None,
+        'prefix': None,
+        'map': None,
+        'name': 'merged',
+        'qualify': False,
+        'half': False,
+        'half_exclude': None,
+        'include': None,
+        'exclude': None,
+        'max_depth': None,
+        'frames': None,
+        'shard': None,
+        'num_threads': None,
+        'resume': False,
+        'multithreading': 1
+    }
+
+    default_args.update(kwargs)
+
+    args = dict_to_namedtuple(default_args)
+
+    # open output filesystem
+    out_fs = assure_fs(args.output)
+
+    layer_map = load_layer_map(args.map)
+
+    if layer_map is None:
+        return
+
+    in_fss = []
+
+    # open input filesystems
+    for path in args.input:
+        try:
+            in_fss.append(OSFS(unicode(path)))
+        except CreateFailed:
+            console.error('Input {} does not exist.'.format(path))
+
+            return
+
+    merge_dirs(in_fss, out_fs, layer_map, args.num_threads, bool(args.multithreading), prefix=args.prefix, name=args.name, qualify=args.qualify, half=args.half, half_exclude=args.half_exclude, include=args.include, exclude=args.exclude, max_depth=args.max_depth, frames=args.frames, shard=args.shard, resume=args.resume)
+
 def handle_preview(**kwargs):
     """ Handle preview actions.
 
@@ -245,7 +598,21 @@ def handle_preview(**kwargs):
         'output': None,
         'prefix': None,
         'layer': None,
+        'cache': None,
+        'cache_size': DEFAULT_CACHE_SIZE // (1024 * 1024),
+        'sample_rate': DEFAULT_SAMPLE_RATE,
+        'percentiles': DEFAULT_PERCENTILES,
+        'view': DEFAULT_VIEW,
+        'tone': DEFAULT_TONE,
+        'exposure': 0.0,
+        'part': None,
+        'include': None,
+        'exclude': None,
+        'max_depth': None,
+        'frames': None,
+        'shard': None,
         'num_threads': None,
+        'resume': False,
         'multithreading': 1
     }
 
@@ -253,6 +620,113 @@ def handle_preview(**kwargs):
 
     args = dict_to_namedtuple(default_args)
 
+    if not 0 < args.sample_rate <= 1:
+        console.error('Sample rate must be greater than 0 and at most 1.')
+
+        return
+
+    if not 0 <= args.percentiles[0] < args.percentiles[1] <= 100:
+        console.error('Percentiles must be between 0 and 100 with LOW below HIGH.')
+
+        return
+
+    out_fs = None
+    out_url = None
+
+    # archives and other filesystems given as FS URL are written by a single writer
+    if is_fs_url(args.output):
+        if not is_persistent_url(args.output):
+            console.error('Output {} discards its files once it is closed, use a directory or an archive.'.format(args.output))
+
+            return
+
+        out_url = args.output
+    else:
+        # open output filesystem
+        out_fs = assure_fs(args.output)
+
+    # open preview cache
+    cache = None
+
+    if args.cache:
+        cache = PreviewCache(args.cache, args.cache_size * 1024 * 1024)
+
+    # join layer
+    layer = None
+
+    if args.layer:
+        layer = ' '.join(args.layer)
+
+    if args.view == RAW_VIEW and args.tone != DEFAULT_TONE:
+        console.warning('Tone curve {} only applies to display views and is ignored by the {} view.'.format(args.tone, RAW_VIEW))
+
+    # split input path
+    dirname, basename = os.path.split(unicode(args.input))
+
+    # open input filesystem
+    try:
+        in_fs = OSFS(dirname)
+
+        if in_fs.isfile(basename) and out_url:
+            preview_files_to_url([in_fs.getsyspath(basename)], out_url, get_num_threads(args.num_threads), False, prefix=args.prefix, layer=layer, part=args.part, cache=cache, sample_rate=args.sample_rate, percentiles=tuple(args.percentiles), view=args.view, tone=args.tone, exposure=args.exposure)
+        elif in_fs.isfile(basename):
+            out_name = get_preview_name(basename, args.prefix)
+
+            preview_file(in_fs.getsyspath(basename), out_fs.getsyspath(out_name), layer, args.part, get_num_threads(args.num_threads), cache, args.sample_rate, tuple(args.percentiles), args.view, args.tone, args.exposure)
+        elif in_fs.isdir(basename):
+            preview_dir(in_fs.opendir(basename), out_fs, args.num_threads, bool(args.multithreading), prefix=args.prefix, layer=layer, part=args.part, cache=cache, sample_rate=args.sample_rate, percentiles=tuple(args.percentiles), view=args.view, tone=args.tone, exposure=args.exposure, include=args.include, exclude=args.exclude, max_depth=args.max_depth, frames=args.frames, shard=args.shard, resume=args.resume, out_url=out_url)
+    except CreateFailed:
+        console.error('Input {} does not exist.'.format(args.input))
+
+        return
+
+def handle_contactsheet(**kwargs):
+    """ Handle contact sheet actions.
+
+    Args:
+        **kwargs (dict): Arguments
+    """
+    default_args = {
+        'input': None,
+        'output': None,
+        'prefix': None,
+        'layer': None,
+        'tile_width': DEFAULT_TILE_WIDTH,
+        'columns': DEFAULT_COLUMNS,
+        'percentiles': DEFAULT_PERCENTILES,
+        'view': DEFAULT_VIEW,
+        'tone': DEFAULT_TONE,
+        'exposure': 0.0,
+        'part': None,
+        'include': None,
+        'exclude': None,
+        'max_depth': None,
+        'frames': None,
+        'shard': None,
+        'resume': False,
+        'num_threads': None,
+        'multithreading': 1
+    }
+
+    default_args.update(kwargs)
+
+    args = dict_to_namedtuple(default_args)
+
+    if args.tile_width < 1 or args.columns < 1:
+        console.error('Tile width and columns must be at least 1.')
+
+        return
+
+    if not 0 <= args.percentiles[0] < args.percentiles[1] <= 100:
+        console.error('Percentiles must be between 0 and 100 with LOW below HIGH.')
+
+        return
+
+    if args.tile_width * args.columns > MAX_SHEET_SIZE:
+        console.error('Contact sheets may be at most {} pixels wide, reduce the tile width or number of columns.'.format(MAX_SHEET_SIZE))
+
+        return
+
     # open output filesystem
     out_fs = assure_fs(args.output)
 
@@ -262,6 +736,9 @@ def handle_preview(**kwargs):
     if args.layer:
         layer = ' '.join(args.layer)
 
+    if args.view == RAW_VIEW and args.tone != DEFAULT_TONE:
+        console.warning('Tone curve {} only applies to display views and is ignored by the {} view.'.format(args.tone, RAW_VIEW))
+
     # split input path
     dirname, basename = os.path.split(unicode(args.input))
 
@@ -270,19 +747,63 @@ def handle_preview(**kwargs):
         in_fs = OSFS(dirname)
 
         if in_fs.isfile(basename):
-            filename, extension = os.path.splitext(basename)
+            contactsheet_files([in_fs.getsyspath(basename)], out_fs, get_num_threads(args.num_threads), False, prefix=args.prefix, layer=layer, part=args.part, tile_width=args.tile_width, columns=args.columns, percentiles=tuple(args.percentiles), view=args.view, tone=args.tone, exposure=args.exposure)
+        elif in_fs.isdir(basename):
+            contactsheet_dir(in_fs.opendir(basename), out_fs, args.num_threads, bool(args.multithreading), prefix=args.prefix, layer=layer, part=args.part, tile_width=args.tile_width, columns=args.columns, percentiles=tuple(args.percentiles), view=args.view, tone=args.tone, exposure=args.exposure, include=args.include, exclude=args.exclude, max_depth=args.max_depth, frames=args.frames, shard=args.shard, resume=args.resume)
+    except CreateFailed:
+        console.error('Input {} does not exist.'.format(args.input))
 
-            # prepend prefix to filename
-            if args.prefix:
-                filename = args.prefix + filename
+        return
 
-            out_name = unicode(filename + '.jpg')
+def handle_diff(**kwargs):
+    """ Handle diff actions.
 
-            preview_file(in_fs.getsyspath(basename), out_fs.getsyspath(out_name), layer)
-        elif in_fs.isdir(basename):
-            preview_dir(in_fs.opendir(basename), out_fs, args.num_threads, bool(args.multithreading), prefix=args.prefix, layer=layer)
+    Args:
+        **kwargs (dict): Arguments
+    """
+    default_args = {
+        'a': None,
+        'b': None,
+        'map': None,
+        'tolerance': 0.0,
+        'include': None,
+        'exclude': None,
+        'max_depth': None,
+        'frames': None,
+        'shard': None,
+        'num_threads': None,
+        'multithreading': 1
+    }
+
+    default_args.update(kwargs)
+
+    args = dict_to_namedtuple(default_args)
+
+    layer_map = None
+
+    if args.map:
+        layer_map = load_layer_map(args.map)
+
+        if layer_map is None:
+            return
+
+    # split input paths
+    a_dirname, a_basename = os.path.split(unicode(args.a))
+    b_dirname, b_basename = os.path.split(unicode(args.b))
+
+    # open input filesystems
+    try:
+        a_fs = OSFS(a_dirname)
+        b_fs = OSFS(b_dirname)
+
+        if a_fs.isfile(a_basename):
+            diff_files([(a_fs.getsyspath(a_basename), b_fs.getsyspath(b_basename))], layer_map, args.tolerance, 1, False)
+        elif a_fs.isdir(a_basename) and b_fs.isdir(b_basename):
+            diff_dirs(a_fs.opendir(a_basename), b_fs.opendir(b_basename), layer_map, args.num_threads, bool(args.multithreading), tolerance=args.tolerance, include=args.include, exclude=args.exclude, max_depth=args.max_depth, frames=args.frames, shard=args.shard)
+        else:
+            console.error('Input {} is not a directory.'.format(args.b))
     except CreateFailed:
-        console.error('Input {} does not exist.'.format(args.input))
+        console.error('Input {} or {} does not exist.'.format(args.a, args.b))
 
         return
 
@@ -293,7 +814,11 @@ def handle_inspect(**kwargs):
         **kwargs (dict): Arguments
     """
     default_args = {
-        'input': None
+        'input': None,
+        'include': None,
+        'exclude': None,
+        'max_depth': None,
+        'shard': None
     }
 
     default_args.update(kwargs)
@@ -308,14 +833,39 @@ def handle_inspect(**kwargs):
         in_fs = OSFS(dirname)
 
         if in_fs.isfile(basename):
-            inspect_file(in_fs.getsyspath(basename))
+            inspect_file(in_fs.getsyspath(basename), args.stats, get_num_threads(args.num_threads))
         elif in_fs.isdir(basename):
-            inspect_dir(in_fs.opendir(basename))
+            inspect_dir(in_fs.opendir(basename), args.num_threads, bool(args.multithreading), stats=args.stats, include=args.include, exclude=args.exclude, max_depth=args.max_depth, frames=args.frames, shard=args.shard, sequences=args.sequences)
     except CreateFailed:
         console.error('Input {} does not exist.'.format(args.input))
 
         return
 
+def handle_shard_merge(**kwargs):
+    """ Handle shard merge actions.
+
+    Args:
+        **kwargs (dict): Arguments
+    """
+    default_args = {
+        'output': None,
+        'job': None
+    }
+
+    default_args.update(kwargs)
+
+    args = dict_to_namedtuple(default_args)
+
+    # open output filesystem
+    try:
+        out_fs = OSFS(unicode(args.output))
+    except CreateFailed:
+        console.error('Output {} does not exist.'.format(args.output))
+
+        return
+
+    merge_manifests(out_fs, args.job)
+
 if __name__ == '__main__':
     freeze_support()
 
@@ -0,0 +1,451 @@
+""" Contact sheet module.
+
+Frames are downscaled band by band while they are decoded, so full resolution pixels of a frame are never held in memory or written to disk. Workers render labelled cells which the main process streams into a preallocated mosaic per sequence, long sequences are split across several sheets. Shards select whole sequences and the journal records a sequence as done once all of its sheets are written.
+"""
+
+# system
+import os
+import time
+
+from fractions import gcd
+
+# image manipulation
+import OpenEXR
+import Imath
+import Image
+import ImageDraw
+import numpy
+
+# exceptions
+from exrio.exrio_exceptions import NoExrFileException
+
+# helpers
+from exrio.helpers.multiprocessing_helpers import imap, get_worker_context
+from exrio.helpers.discovery_helpers import discover_fs
+from exrio.helpers.sequence_helpers import collect_sequences
+from exrio.helpers.exr_helpers import BAND_HEIGHT, get_size, iter_bands, imap_bands
+from exrio.helpers.mmap_helpers import map_channels
+from exrio.helpers.header_helpers import assure_readable_part
+from exrio.helpers.exposure_helpers import DEFAULT_PERCENTILES
+from exrio.helpers.color_helpers import DEFAULT_VIEW, DEFAULT_TONE
+from exrio.helpers.fs_helpers import atomic_path
+from exrio.helpers.journal_helpers import STARTED, DONE, FAILED, open_journal
+from exrio.helpers.shard_helpers import write_manifest
+
+# exrio
+from exrio.preview import get_preview_channels, map_preview
+from exrio import console
+
+# maximum width of the downscaled frames
+DEFAULT_TILE_WIDTH = 256
+
+# number of frames per row of a contact sheet
+DEFAULT_COLUMNS = 8
+
+# height of the strip below each frame showing its frame number
+LABEL_HEIGHT = 16
+
+# maximum width and height of JPEG images
+MAX_SHEET_SIZE = 65535
+
+def get_factor(size, tile_width=DEFAULT_TILE_WIDTH):
+    """ Get integer factor to downscale frames of size to at most tile_width.
+
+    Args:
+        size (tuple): Width and height of frames
+        tile_width (int): Maximum width of downscaled frames
+
+    Returns:
+        int
+    """
+    width, height = size
+
+    return max(1, -(-width // tile_width))
+
+def downscale(pixels, factor):
+    """ Downscale pixels by averaging blocks of factor by factor pixels, incomplete blocks at the edges are dropped.
+
+    Args:
+        pixels (numpy.ndarray): Pixels as rows and columns
+        factor (int): Downscale factor
+
+    Returns:
+        numpy.ndarray: Float pixels
+    """
+    rows = pixels.shape[0] // factor * factor
+    columns = pixels.shape[1] // factor * factor
+
+    blocks = pixels[:rows, :columns].astype(numpy.float32).reshape(rows // factor, factor, columns // factor, factor)
+
+    return blocks.mean(axis=(1, 3))
+
+def create_tile(in_path, factor, layer=None, part=None, num_threads=1, percentiles=DEFAULT_PERCENTILES, view=DEFAULT_VIEW, tone=DEFAULT_TONE, exposure=0.0):
+    """ Create downscaled 8bit pixels of exr file, bands of scanlines are downscaled as they are decoded.
+
+    Args:
+        in_path (str): File to read
+        factor (int): Downscale factor
+        layer (str): Regular expression selecting the channels to preview
+        part (mixed): Index or name of part to preview
+        num_threads (int): Number of threads decoding bands of scanlines or tiles
+        percentiles (tuple): Percentiles of pixel values mapped to black and white
+        view (str): raw maps the exposure range to 8bit, linear, srgb and rec709 are display views of scene linear pixels
+        tone (str): Tone curve of display views
+        exposure (float): Exposure adjustment in stops
+
+    Returns:
+        list: 8bit pixels of red, green and blue channel
+
+    Raises:
+        NoExrFileException
+        NoPartException
+        UnsupportedPartException
+    """
+    if not OpenEXR.isOpenExrFile(in_path):
+        raise NoExrFileException(in_path)
+
+    assure_readable_part(in_path, part)
+
+    in_exr_header = OpenEXR.InputFile(in_path).header()
+
+    channels = get_preview_channels(in_exr_header, layer)
+
+    width, height = get_size(in_exr_header)
+
+    y_min = in_exr_header['dataWindow'].min.y
+
+    # bands of whole blocks of scanlines, so each band downscales to complete rows
+    block_height = factor
+
+    if 'tiles' in in_exr_header:
+        # bands of tiled files are aligned to rows of tiles as well
+        tile_height = in_exr_header['tiles'].ySize
+
+        block_height = factor * tile_height // gcd(factor, tile_height)
+
+    bands = iter_bands(in_exr_header, block_height * max(1, BAND_HEIGHT // block_height))
+
+    tile_bands = {c: [] for c in channels}
+
+    views = map_channels(in_path)
+
+    if views is not None:
+        # uncompressed files are read from the mapped pages band by band
+        for y_start, y_end in bands:
+            for c in tile_bands:
+                tile_bands[c].append(downscale(views[c][y_start - y_min:y_end - y_min + 1], factor))
+    else:
+        pixel_type = Imath.PixelType(Imath.PixelType.FLOAT)
+
+        for band, band_data in imap_bands(in_path, {c: pixel_type for c in tile_bands}, bands, num_threads):
+            for c, data in band_data.iteritems():
+                tile_bands[c].append(downscale(numpy.frombuffer(data, dtype=numpy.float32).reshape(-1, width), factor))
+
+    # tiles are small, so the exposure range is estimated from all of their pixels
+    return map_preview([numpy.concatenate(tile_bands[c]) for c in channels], 1.0, percentiles, view, tone, exposure)
+
+def render_cell(rgb8, tile_size, label):
+    """ Render frame and its label into a cell of a contact sheet.
+
+    Args:
+        rgb8 (list): 8bit pixels of red, green and blue channel or None if the frame failed
+        tile_size (tuple): Width and height of the frame in the cell
+        label (str): Label below the frame
+
+    Returns:
+        str: Raw RGB pixels of cell
+    """
+    tile_width, tile_height = tile_size
+
+    cell = numpy.zeros((tile_height + LABEL_HEIGHT, tile_width, 3), dtype=numpy.uint8)
+
+    if rgb8 is not None:
+        # frames of a different size than the first frame of the sequence are cropped
+        tile = numpy.dstack(rgb8)[:tile_height, :tile_width]
+
+        cell[:tile.shape[0], :tile.shape[1]] = tile
+
+    label_image = Image.new('RGB', (tile_width, LABEL_HEIGHT))
+
+    ImageDraw.Draw(label_image).text((4, 2), label, fill=(255, 255, 255))
+
+    cell[tile_height:] = numpy.fromstring(label_image.tostring(), dtype=numpy.uint8).reshape(LABEL_HEIGHT, tile_width, 3)
+
+    return cell.tostring()
+
+def contactsheet_task(in_path, sheet_index, cell_index, factor, tile_size, label):
+    """ Render cell of frame with the job configuration of the worker.
+
+    Frames which can not be read are logged and rendered as black cells, so a single broken frame does not fail the sheet.
+
+    Args:
+        in_path (str): File to read
+        sheet_index (int): Index of contact sheet
+        cell_index (int): Index of cell in contact sheet
+        factor (int): Downscale factor
+        tile_size (tuple): Width and height of the frame in the cell
+        label (str): Label below the frame
+
+    Returns:
+        tuple: sheet_index, cell_index and raw RGB pixels of cell
+    """
+    context = get_worker_context()
+
+    try:
+        rgb8 = create_tile(in_path, factor, context['layer'], context['part'], context['band_threads'], context['percentiles'], context['view'], context['tone'], context['exposure'])
+    except Exception as error:
+        console.error('Failed to read {}: {}'.format(os.path.basename(in_path), error))
+
+        rgb8 = None
+
+    return (sheet_index, cell_index, render_cell(rgb8, tile_size, label))
+
+def get_sheet_name(sequence, frames, prefix=None, in_root=None):
+    """ Get file name of the contact sheet of frames of a sequence, e.g. shotA/beauty/shot_beauty.1001-1100.jpg.
+
+    Args:
+        sequence (Sequence): Sequence
+        frames (list): Path and frame number pairs on the sheet
+        prefix (str): Prefix of file name
+        in_root (str): Input directory whose tree is mirrored, sheets of sequences of different directories do not collide
+
+    Returns:
+        unicode: Path relative to the output directory
+    """
+    if sequence.padding:
+        name = '{}{:0{padding}d}-{:0{padding}d}'.format(sequence.head, frames[0][1], frames[-1][1], padding=sequence.padding)
+    else:
+        name = os.path.splitext(sequence.head)[0]
+
+    # prepend prefix to name
+    if prefix:
+        name = prefix + name
+
+    name = unicode(name + '.jpg')
+
+    if in_root:
+        rel_dir = os.path.relpath(sequence.directory, in_root)
+
+        if rel_dir != os.curdir:
+            name = os.path.join(rel_dir, name).replace(os.sep, '/')
+
+    return name
+
+def get_sequence_key(sequence):
+    """ Get journal key of the contact sheets of a sequence.
+
+    Args:
+        sequence (Sequence): Sequence
+
+    Returns:
+        str
+    """
+    return 'contactsheet:' + os.path.join(sequence.directory, sequence.pattern)
+
+def get_sheet_frames(sequence):
+    """ Get paths and frame numbers of the frames of a sequence.
+
+    Args:
+        sequence (Sequence): Sequence
+
+    Returns:
+        list: Path and frame number pairs in order of frames, the frame number of files without frame number is None
+    """
+    if not sequence.padding:
+        return [(os.path.join(sequence.directory, sequence.head), None)]
+
+    return [(sequence.get_path(frame), frame) for frame in sorted(set(sequence.frames))]
+
+def write_sheet(sheet, out_path):
+    """ Encode mosaic of contact sheet.
+
+    Args:
+        sheet (dict): Contact sheet
+        out_path (str): File to write
+    """
+    height, width = sheet['buffer'].shape[:2]
+
+    image = Image.fromstring('RGB', (width, height), sheet['buffer'].tostring())
+
+    # write to temporary file which replaces out_path once complete
+    with atomic_path(out_path) as temp_path:
+        image.save(temp_path, 'JPEG')
+
+def contactsheet_files(files, out_fs, num_threads=None, multiprocessing=True, **kwargs):
+    """ Create one contact sheet per sequence of files and use multiprocessing.
+
+    Args:
+        files (iterable): Exr files
+        out_fs (fs): Output filesystem
+        num_threads (int): Number of threads to use
+        multiprocessing (bool): Use multiprocessing
+    """
+    console.info('Started contact sheets of files.')
+
+    # start time
+    time_start = time.time()
+
+    # decode bands in threads only if files are not processed in parallel already
+    band_threads = 1 if multiprocessing else num_threads
+
+    tile_width = kwargs.get('tile_width') or DEFAULT_TILE_WIDTH
+    columns = kwargs.get('columns') or DEFAULT_COLUMNS
+
+    # frames are grouped into sequences once discovery is complete
+    sequences = collect_sequences(files)
+
+    shard = kwargs.get('shard')
+
+    # select whole sequences of this shard, so frames of a sheet are never spread across shards
+    if shard:
+        sequences = shard.select(sequences, lambda sequence: [path for path, frame in get_sheet_frames(sequence)])
+
+        console.info('Shard {}: {} sequences, {} bytes.'.format(shard, len(sequences), shard.bytes))
+
+    # journal of sequence states in the output directory, completed sequences are skipped on resume
+    journal, completed = open_journal(out_fs, bool(kwargs.get('resume')), shard)
+
+    skipped = [0]
+
+    # sheet index / contact sheet pairs of sheets with pending cells
+    sheets = {}
+
+    # task key / number of unwritten sheets pairs of sequences
+    unwritten = {}
+
+    def iter_tasks():
+        """ Create cell tasks sequence by sequence, frames are downscaled to the size of the first frame of their sequence.
+
+        Sequences with more rows than fit into the maximum height of a JPEG are split across several sheets.
+
+        Returns:
+            generator
+        """
+        sheet_index = 0
+
+        for sequence in sequences:
+            key = get_sequence_key(sequence)
+
+            if key in completed:
+                skipped[0] += 1
+
+                continue
+
+            frames = get_sheet_frames(sequence)
+
+            first_path = frames[0][0]
+
+            if not OpenEXR.isOpenExrFile(first_path):
+                console.error('Skipped contact sheet of {}, {} is no exr file.'.format(sequence.pattern, os.path.basename(first_path)))
+
+                journal.append(key, FAILED, repr(NoExrFileException(first_path)))
+
+                continue
+
+            journal.append(key, STARTED)
+
+            size = get_size(OpenEXR.InputFile(first_path).header())
+
+            factor = get_factor(size, tile_width)
+
+            tile_size = (size[0] // factor, size[1] // factor)
+
+            frames_per_sheet = columns * max(1, MAX_SHEET_SIZE // (tile_size[1] + LABEL_HEIGHT))
+
+            # the sequence is done once all of its sheets are written
+            unwritten[key] = -(-len(frames) // frames_per_sheet)
+
+            for start in xrange(0, len(frames), frames_per_sheet):
+                sheet_frames = frames[start:start + frames_per_sheet]
+
+                sheets[sheet_index] = {
+                    'key': key,
+                    'name': get_sheet_name(sequence, sheet_frames, kwargs.get('prefix'), kwargs.get('in_root')),
+                    'columns': min(columns, len(sheet_frames)),
+                    'rows': -(-len(sheet_frames) // columns),
+                    'cell_size': (tile_size[0], tile_size[1] + LABEL_HEIGHT),
+                    'pending': len(sheet_frames),
+                    'buffer': None
+                }
+
+                for cell_index, (in_path, frame) in enumerate(sheet_frames):
+                    label = sequence.head if frame is None else str(frame)
+
+                    yield (contactsheet_task, in_path, sheet_index, cell_index, factor, tile_size, label)
+
+                sheet_index += 1
+
+    # job configuration is sent to each worker once, tasks only carry the frame and its cell
+    context = {
+        'layer': kwargs.get('layer'),
+        'part': kwargs.get('part'),
+        'band_threads': band_threads,
+        'percentiles': kwargs.get('percentiles') or DEFAULT_PERCENTILES,
+        'view': kwargs.get('view') or DEFAULT_VIEW,
+        'tone': kwargs.get('tone') or DEFAULT_TONE,
+        'exposure': kwargs.get('exposure') or 0.0
+    }
+
+    count = 0
+
+    try:
+        for sheet_index, cell_index, data in imap(iter_tasks(), num_threads, multiprocessing, context):
+            sheet = sheets[sheet_index]
+
+            cell_width, cell_height = sheet['cell_size']
+
+            # mosaic is allocated once its first cell arrives and released once it is written
+            if sheet['buffer'] is None:
+                sheet['buffer'] = numpy.zeros((sheet['rows'] * cell_height, sheet['columns'] * cell_width, 3), dtype=numpy.uint8)
+
+            row, column = divmod(cell_index, sheet['columns'])
+
+            sheet['buffer'][row * cell_height:(row + 1) * cell_height, column * cell_width:(column + 1) * cell_width] = numpy.frombuffer(data, dtype=numpy.uint8).reshape(cell_height, cell_width, 3)
+
+            sheet['pending'] -= 1
+
+            if not sheet['pending']:
+                out_path = out_fs.getsyspath(sheet['name'])
+
+                if not os.path.isdir(os.path.dirname(out_path)):
+                    os.makedirs(os.path.dirname(out_path))
+
+                write_sheet(sheets.pop(sheet_index), out_path)
+
+                console.info('Finished contact sheet {}.'.format(sheet['name']))
+
+                count += 1
+
+                unwritten[sheet['key']] -= 1
+
+                if not unwritten[sheet['key']]:
+                    journal.append(sheet['key'], DONE)
+    finally:
+        # the manifest records failed and unfinished sequences as well
+        if shard:
+            write_manifest(out_fs, shard, journal, [get_sequence_key(sequence) for sequence in sequences])
+
+    if skipped[0]:
+        console.info('Skipped {} sequences completed before resume.'.format(skipped[0]))
+
+    # stop time
+    time_stop = time.time()
+
+    # duration
+    duration = round(time_stop - time_start)
+
+    console.info('Finished {} contact sheets ({}s).'.format(count, duration))
+
+def contactsheet_dir(in_fs, out_fs, num_threads=None, multithreading=True, **kwargs):
+    """ Create list of exr files in directory and create contact sheets of their sequences.
+
+    Args:
+        in_fs (fs): Input filesystem
+        out_fs (fs): Output filesystem
+        num_threads (int): Number of threads to use
+        multithreading (bool): Use multithreading
+    """
+    files = discover_fs(in_fs, kwargs.get('include'), kwargs.get('exclude'), kwargs.get('max_depth'), frames=kwargs.get('frames'))
+
+    # sheets mirror the directory tree of the input
+    return contactsheet_files(files, out_fs, num_threads, multithreading, in_root=in_fs.getsyspath(u'/'), **kwargs)
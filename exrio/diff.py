@@ -0,0 +1,290 @@
+""" Diff exr module. """
+
+# system
+import json
+import os
+import time
+
+# image manipulation
+import OpenEXR
+import Imath
+import numpy
+
+# exceptions
+from exrio.exrio_exceptions import NoExrFileException
+
+# helpers
+from exrio.helpers.multiprocessing_helpers import imap, get_worker_context
+from exrio.helpers.discovery_helpers import discover_fs
+from exrio.helpers.exr_helpers import iter_bands, get_data_window
+from exrio.helpers.mmap_helpers import map_channels
+
+# exrio
+from exrio.rechannel import compile_layer_map, match_layers
+from exrio import console
+
+# result states
+EQUAL = 'equal'
+DIFFERENT = 'different'
+HEADER_MISMATCH = 'header'
+MISSING = 'missing'
+
+# methods
+
+def get_channel_pairs(a_header, b_header, layer_map=None):
+    """ Get channel names of b paired with the channel names of a, mapped through layer_map.
+
+    Args:
+        a_header (dict): EXR header of a
+        b_header (dict): EXR header of b
+        layer_map (dict): Regular expression / replacement name pairs applied to channels of a
+
+    Returns:
+        dict: Channel name of b / channel name of a pairs
+    """
+    if not layer_map:
+        return {layer_name: layer_name for layer_name in a_header['channels'].keys()}
+
+    out_channels, matched_layers, out_layers = match_layers(a_header, compile_layer_map(layer_map))
+
+    pairs = {}
+
+    for layer_name, (pixel_type, layer_channels) in matched_layers.iteritems():
+        for out_channel_name in layer_channels.keys():
+            pairs[out_channel_name] = layer_name
+
+    return pairs
+
+def check_headers(a_header, b_header, pairs):
+    """ Compare data windows and channel lists without decoding pixels.
+
+    Args:
+        a_header (dict): EXR header of a
+        b_header (dict): EXR header of b
+        pairs (dict): Channel name of b / channel name of a pairs
+
+    Returns:
+        str: Reason of mismatch or None
+    """
+    a_data_window = get_data_window(a_header)
+    b_data_window = get_data_window(b_header)
+
+    if a_data_window != b_data_window:
+        return 'data windows differ ({} != {})'.format(a_data_window, b_data_window)
+
+    a_channels = set(pairs.keys())
+    b_channels = set(b_header['channels'].keys())
+
+    if a_channels != b_channels:
+        return 'channels differ (only in a: {}, only in b: {})'.format(sorted(a_channels - b_channels), sorted(b_channels - a_channels))
+
+def diff_file(a_path, b_path, layer_map=None, tolerance=0.0):
+    """ Compare pixels of exr files band by band, stopping at the first band exceeding tolerance.
+
+    Args:
+        a_path (str): File to compare
+        b_path (str): File to compare against
+        layer_map (dict): Regular expression / replacement name pairs applied to channels of a
+        tolerance (float): Maximum absolute difference
+
+    Returns:
+        dict: Result with state, reason and maximum absolute and rms error per channel
+
+    Raises:
+        NoExrFileException
+    """
+    result = {'a': a_path, 'b': b_path, 'state': EQUAL, 'reason': None, 'channels': {}}
+
+    if not os.path.isfile(b_path):
+        result.update({'state': MISSING, 'reason': 'missing in b'})
+
+        return result
+
+    for path in [a_path, b_path]:
+        if not OpenEXR.isOpenExrFile(path):
+            raise NoExrFileException(path)
+
+    a_exr_file = OpenEXR.InputFile(a_path)
+    b_exr_file = OpenEXR.InputFile(b_path)
+
+    a_header = a_exr_file.header()
+    b_header = b_exr_file.header()
+
+    pairs = get_channel_pairs(a_header, b_header, layer_map)
+
+    # cheap header check short-circuits files which can not be equal
+    reason = check_headers(a_header, b_header, pairs)
+
+    if reason:
+        result.update({'state': HEADER_MISMATCH, 'reason': reason})
+
+        return result
+
+    pixel_type = Imath.PixelType(Imath.PixelType.FLOAT)
+
+    # views of uncompressed files, bands are read from the mapped pages instead of being decoded
+    a_views = map_channels(a_path)
+    b_views = map_channels(b_path)
+
+    y_min = a_header['dataWindow'].min.y
+
+    def read_band(exr_file, views, channel_names, y_start, y_end):
+        """ Read band of channels as float64, the scanlines of the band are decoded once for all channels.
+
+        Args:
+            exr_file (OpenEXR.InputFile): Opened exr file
+            views (dict): Channel name / view pairs of mapped file or None
+            channel_names (list): Channel names
+            y_start (int): First scanline
+            y_end (int): Last scanline (inclusive)
+
+        Returns:
+            dict: Channel name / pixels pairs
+        """
+        if views is not None:
+            return {channel_name: views[channel_name][y_start - y_min:y_end - y_min + 1].astype(numpy.float64).ravel() for channel_name in channel_names}
+
+        return {channel_name: numpy.frombuffer(data, dtype=numpy.float32).astype(numpy.float64) for channel_name, data in zip(channel_names, exr_file.channels(channel_names, pixel_type, y_start, y_end))}
+
+    # maximum absolute error, sum of squared errors and number of pixels per channel
+    errors = {channel_name: [0.0, 0.0, 0] for channel_name in pairs.keys()}
+
+    a_channel_names = sorted(set(pairs.values()))
+    b_channel_names = sorted(pairs.keys())
+
+    for y_start, y_end in iter_bands(a_header):
+        a_band = read_band(a_exr_file, a_views, a_channel_names, y_start, y_end)
+        b_band = read_band(b_exr_file, b_views, b_channel_names, y_start, y_end)
+
+        for b_channel_name, a_channel_name in pairs.iteritems():
+            a_pixels = a_band[a_channel_name]
+            b_pixels = b_band[b_channel_name]
+
+            # NaN in both files is equal, NaN in one file is an infinite error
+            both_nan = numpy.isnan(a_pixels) & numpy.isnan(b_pixels)
+
+            difference = numpy.where(both_nan, 0.0, numpy.abs(a_pixels - b_pixels))
+
+            difference[numpy.isnan(difference)] = numpy.inf
+
+            error = errors[b_channel_name]
+
+            if difference.size:
+                error[0] = max(error[0], float(difference.max()))
+                error[1] += float(numpy.square(difference).sum())
+                error[2] += difference.size
+
+            if error[0] > tolerance:
+                result.update({'state': DIFFERENT, 'reason': 'channel {} exceeds tolerance in scanlines {}-{}'.format(b_channel_name, y_start, y_end)})
+
+                break
+
+        if result['state'] != EQUAL:
+            break
+
+    for channel_name, (max_abs, squared_sum, count) in errors.iteritems():
+        result['channels'][channel_name] = {
+            'max_abs': max_abs,
+            'rms': (squared_sum / count) ** 0.5 if count else None
+        }
+
+    return result
+
+def diff_task(a_path, b_path):
+    """ Compare pair of files with the job configuration of the worker.
+
+    Args:
+        a_path (str): File to compare
+        b_path (str): File to compare against
+
+    Returns:
+        dict
+    """
+    context = get_worker_context()
+
+    return diff_file(a_path, b_path, context['rules'], context['tolerance'])
+
+def diff_files(pairs, layer_map=None, tolerance=0.0, num_threads=None, multiprocessing=True, shard=None):
+    """ Compare pairs of exr files and use multiprocessing, printing files which differ.
+
+    Args:
+        pairs (iterable): Pairs of files to compare
+        layer_map (dict): regular expression / replacement name pairs applied to the first file of each pair
+        tolerance (float): Maximum absolute difference
+        num_threads (int): Number of threads to use
+        multiprocessing (bool): Use multiprocessing
+        shard (Shard): Compare only the pairs of this shard
+
+    Returns:
+        dict: State / number of files pairs
+    """
+    console.info('Started diff of files.')
+
+    # start time
+    time_start = time.time()
+
+    # select pairs of this shard, balanced by the size of the files of a
+    if shard:
+        pairs = shard.select(pairs, lambda pair: [pair[0]])
+
+        console.info('Shard {}: {} files, {} bytes.'.format(shard, len(pairs), shard.bytes))
+
+    def iter_tasks():
+        """ Create diff tasks while files are discovered.
+
+        Returns:
+            generator
+        """
+        for a_path, b_path in pairs:
+            yield (diff_task, a_path, b_path)
+
+    # job configuration is sent to each worker once, tasks only carry the pair of files
+    context = {
+        'rules': compile_layer_map(layer_map) if layer_map else None,
+        'tolerance': tolerance
+    }
+
+    counts = {EQUAL: 0, DIFFERENT: 0, HEADER_MISMATCH: 0, MISSING: 0}
+
+    for result in imap(iter_tasks(), num_threads, multiprocessing, context):
+        counts[result['state']] += 1
+
+        if result['state'] != EQUAL:
+            print json.dumps(result, indent=4)
+
+    # stop time
+    time_stop = time.time()
+
+    # duration
+    duration = round(time_stop - time_start)
+
+    console.info('Finished diff: {equal} equal, {different} different, {header} header mismatches, {missing} missing ({duration}s).'.format(equal=counts[EQUAL], different=counts[DIFFERENT], header=counts[HEADER_MISMATCH], missing=counts[MISSING], duration=duration))
+
+    return counts
+
+def diff_dirs(a_fs, b_fs, layer_map=None, num_threads=None, multithreading=True, **kwargs):
+    """ Compare exr files of a_fs with the files at the same relative path in b_fs.
+
+    Args:
+        a_fs (fs): Filesystem to compare
+        b_fs (fs): Filesystem to compare against
+        layer_map (dict): regular expression / replacement name pairs applied to channels of a_fs
+        num_threads (int): Number of threads to use
+        multithreading (bool): Use multithreading
+
+    Returns:
+        dict: State / number of files pairs
+    """
+    a_root = a_fs.getsyspath(u'/')
+    b_root = b_fs.getsyspath(u'/')
+
+    def iter_pairs():
+        """ Pair discovered files of a_fs with files of b_fs.
+
+        Returns:
+            generator
+        """
+        for a_path in discover_fs(a_fs, kwargs.get('include'), kwargs.get('exclude'), kwargs.get('max_depth'), frames=kwargs.get('frames')):
+            yield (a_path, os.path.join(b_root, os.path.relpath(a_path, a_root)))
+
+    return diff_files(iter_pairs(), layer_map, kwargs.get('tolerance') or 0.0, num_threads, multithreading, kwargs.get('shard'))
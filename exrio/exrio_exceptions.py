@@ -10,4 +10,10 @@ class SameFileException(Exception):
     """ Same file exception. """
 
 class LayerMapEmptyException(Exception):
-    """ Layermap is empty exception. """
\ No newline at end of file
+    """ Layermap is empty exception. """
+
+class NoPartException(Exception):
+    """ No such part in EXR file exception. """
+
+class UnsupportedPartException(Exception):
+    """ Part can not be read exception. """
@@ -0,0 +1,213 @@
+""" Archive helpers module.
+
+Outputs given as FS URLs are written by a single writer. Zip and tar archives are appended to sequentially as entries arrive and indexed for random access, other filesystems are opened with pyfilesystem.
+"""
+
+# system
+import json
+import os
+import tarfile
+import threading
+import time
+import zipfile
+
+from contextlib import contextmanager
+from StringIO import StringIO
+
+# filesystem
+from fs import open_fs
+
+# helpers
+from exrio.helpers.fs_helpers import atomic_paths
+
+# schemes of archives which are appended to directly
+ARCHIVE_SCHEMES = ['zip', 'tar']
+
+# suffix of the index written next to archives
+INDEX_SUFFIX = '.index.json'
+
+# schemes of filesystems which are discarded once they are closed
+NON_PERSISTENT_SCHEMES = ['mem', 'temp']
+
+def is_fs_url(value):
+    """ Test if output is an FS URL, e.g. zip://previews.zip or ftp://host/previews.
+
+    Args:
+        value (str): Output
+
+    Returns:
+        bool
+    """
+    return '://' in value
+
+def parse_fs_url(url):
+    """ Split FS URL into scheme and resource.
+
+    Args:
+        url (str): FS URL
+
+    Returns:
+        tuple: Lower case scheme and resource
+    """
+    scheme, resource = url.split('://', 1)
+
+    return (scheme.lower(), resource)
+
+def is_persistent_url(url):
+    """ Test if the filesystem of an FS URL keeps its files once the writer is closed.
+
+    Args:
+        url (str): FS URL
+
+    Returns:
+        bool
+    """
+    return not parse_fs_url(url)[0] in NON_PERSISTENT_SCHEMES
+
+def get_shard_url(url, shard):
+    """ Get URL of the archive of a shard, e.g. zip://previews.3of20.zip.
+
+    Args:
+        url (str): FS URL
+        shard (Shard): Shard
+
+    Returns:
+        str: URL of shard archive or url for other filesystems
+    """
+    scheme, resource = parse_fs_url(url)
+
+    if not scheme in ARCHIVE_SCHEMES:
+        return url
+
+    name, extension = os.path.splitext(resource)
+
+    return '{}://{}.{}{}'.format(scheme, name, shard.name, extension)
+
+class ArchiveWriter(object):
+    """ Append entries to a zip or tar archive and record the offset and size of their data. """
+
+    def __init__(self, path, scheme):
+        """ Create archive.
+
+        Args:
+            path (str): Path of archive
+            scheme (str): zip or tar
+        """
+        self.scheme = scheme
+
+        # entry name / data offset and size pairs
+        self.index = {}
+
+        self.lock = threading.Lock()
+
+        if scheme == 'zip':
+            # entries are stored uncompressed so they can be read at their offset
+            self.archive = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+        else:
+            # pax headers store names of any length as utf-8
+            self.archive = tarfile.open(path, 'w', format=tarfile.PAX_FORMAT, encoding='utf-8')
+
+    def write(self, name, data):
+        """ Append entry.
+
+        Args:
+            name (str): Entry name
+            data (str): Entry data
+        """
+        with self.lock:
+            if self.scheme == 'zip':
+                info = zipfile.ZipInfo(name, time.localtime()[:6])
+
+                self.archive.writestr(info, data)
+
+                offset = info.header_offset + len(info.FileHeader())
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = time.time()
+
+                offset = self.archive.offset + len(info.tobuf(self.archive.format, self.archive.encoding, self.archive.errors))
+
+                self.archive.addfile(info, StringIO(data))
+
+            self.index[name] = {'offset': offset, 'size': len(data)}
+
+    def close(self):
+        """ Close archive, zip archives get their central directory. """
+        self.archive.close()
+
+    def write_index(self, path, archive_name):
+        """ Write index of entries.
+
+        Args:
+            path (str): Path of index
+            archive_name (str): File name of the archive
+        """
+        with open(path, 'w') as file_handle:
+            file_handle.write(json.dumps({'archive': archive_name, 'entries': self.index}, indent=2, sort_keys=True))
+
+class FSWriter(object):
+    """ Write entries to a filesystem opened from an FS URL. """
+
+    def __init__(self, out_fs):
+        """ Create writer.
+
+        Args:
+            out_fs (fs): Output filesystem
+        """
+        self.out_fs = out_fs
+
+        self.lock = threading.Lock()
+
+    def write(self, name, data):
+        """ Write entry.
+
+        Args:
+            name (str): Entry name
+            data (str): Entry data
+        """
+        with self.lock:
+            self.out_fs.setbytes(unicode(name), data)
+
+@contextmanager
+def open_writer(url):
+    """ Open writer for an FS URL.
+
+    Archives are written to a temporary file next to the target which replaces the target together with its index once the block succeeds.
+
+    Args:
+        url (str): FS URL, e.g. zip://previews.zip, tar://previews.tar or ftp://host/previews
+
+    Returns:
+        contextmanager: ArchiveWriter or FSWriter
+
+    Raises:
+        ValueError
+    """
+    scheme, resource = parse_fs_url(url)
+
+    # outputs of filesystems like mem:// would be discarded once the job completes
+    if not is_persistent_url(url):
+        raise ValueError('Output {} is not persistent, its files are discarded once it is closed.'.format(url))
+
+    if scheme in ARCHIVE_SCHEMES:
+        path = os.path.abspath(resource)
+
+        with atomic_paths([path, path + INDEX_SUFFIX]) as (temp_path, temp_index_path):
+            writer = ArchiveWriter(temp_path, scheme)
+
+            try:
+                yield writer
+            finally:
+                writer.close()
+
+            writer.write_index(temp_index_path, os.path.basename(path))
+
+        return
+
+    out_fs = open_fs(url, writeable=True, create=True)
+
+    try:
+        yield FSWriter(out_fs)
+    finally:
+        out_fs.close()
@@ -0,0 +1,290 @@
+""" Cache helpers module. """
+
+# system
+import errno
+import hashlib
+import json
+import os
+import shutil
+
+# helpers
+from exrio.helpers.fs_helpers import TEMP_PREFIX, create_temp_file
+
+# default location of the preview cache
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.exrio', 'cache', 'previews')
+
+# default maximum size of the preview cache in bytes
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024
+
+# file storing hit and miss counts
+STATS_NAME = 'stats.json'
+
+# classes
+
+class PreviewCache(object):
+    """ Content addressed preview cache with size bounded least recently used eviction.
+
+    Entries are keyed by the identity of the input file (path, size and modification time) and the preview parameters. Entries are written atomically, hits touch the modification time which is used for eviction.
+    """
+
+    def __init__(self, root=None, max_bytes=DEFAULT_CACHE_SIZE, extension='.jpg'):
+        """ Create preview cache.
+
+        Args:
+            root (str): Cache directory
+            max_bytes (int): Maximum size of all entries in bytes
+            extension (str): Extension of entries
+        """
+        self.root = root or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.extension = extension
+
+        if not os.path.isdir(self.root):
+            try:
+                os.makedirs(self.root)
+            except OSError as error:
+                # directory may have been created by another process
+                if error.errno != errno.EEXIST:
+                    raise
+
+    def get_key(self, in_path, params=None):
+        """ Get key of input file and preview parameters without reading the file.
+
+        Args:
+            in_path (str): File to preview
+            params (dict): Preview parameters
+
+        Returns:
+            str
+        """
+        stat = os.stat(in_path)
+
+        identity = {
+            'path': os.path.realpath(in_path),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'params': params or {}
+        }
+
+        return hashlib.sha1(json.dumps(identity, sort_keys=True)).hexdigest()
+
+    def get_path(self, key):
+        """ Get path of cache entry.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            str
+        """
+        return os.path.join(self.root, key[:2], key + self.extension)
+
+    def fetch(self, key, out_path):
+        """ Hardlink or copy cached entry to out_path.
+
+        Args:
+            key (str): Cache key
+            out_path (str): File to write
+
+        Returns:
+            bool: True on cache hit
+        """
+        cache_path = self.get_path(key)
+
+        if not os.path.isfile(cache_path):
+            return False
+
+        if os.path.exists(out_path):
+            os.remove(out_path)
+
+        try:
+            os.link(cache_path, out_path)
+        except (AttributeError, OSError):
+            # hardlinks are not available on all platforms and not across devices
+            try:
+                shutil.copyfile(cache_path, out_path)
+            except (IOError, OSError):
+                # entry was evicted concurrently
+                if os.path.exists(out_path):
+                    os.remove(out_path)
+
+                return False
+
+        # mark entry as recently used
+        try:
+            os.utime(cache_path, None)
+        except OSError:
+            pass
+
+        return True
+
+    def read(self, key):
+        """ Read cached entry.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            str: Data of entry or None on cache miss
+        """
+        cache_path = self.get_path(key)
+
+        try:
+            with open(cache_path, 'rb') as file_handle:
+                data = file_handle.read()
+        except IOError:
+            return
+
+        # mark entry as recently used
+        try:
+            os.utime(cache_path, None)
+        except OSError:
+            pass
+
+        return data
+
+    def store(self, key, in_path):
+        """ Store file as cache entry with an atomic rename.
+
+        Args:
+            key (str): Cache key
+            in_path (str): File to store
+        """
+        with open(in_path, 'rb') as file_handle:
+            self.store_data(key, file_handle.read())
+
+    def store_data(self, key, data):
+        """ Store data as cache entry with an atomic rename.
+
+        Args:
+            key (str): Cache key
+            data (str): Data to store
+        """
+        cache_path = self.get_path(key)
+
+        cache_dir = os.path.dirname(cache_path)
+
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+
+        try:
+            self.write_atomic(cache_path, data)
+        except (IOError, OSError):
+            # entry was stored concurrently by another process or the cache is full, previews do not depend on it
+            pass
+
+    def write_atomic(self, path, data):
+        """ Write file in the cache with an atomic rename, the temporary file is removed on failure.
+
+        Args:
+            path (str): Path to write
+            data (str): Data to write
+
+        Raises:
+            IOError
+            OSError
+        """
+        # the cache is shared with other users, previews fetched as hardlinks keep the default permissions of new files
+        file_descriptor, temp_path = create_temp_file(os.path.dirname(path), TEMP_PREFIX, '.tmp')
+
+        try:
+            with os.fdopen(file_descriptor, 'wb') as file_handle:
+                file_handle.write(data)
+
+            # rename does not replace existing files on windows
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+
+            os.rename(temp_path, path)
+        except (IOError, OSError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+            raise
+
+    def iter_entries(self):
+        """ Iterate cache entries.
+
+        Returns:
+            generator: Path, size and modification time of each entry
+        """
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith(self.extension):
+                    continue
+
+                path = os.path.join(dirpath, filename)
+
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+
+                yield (path, stat.st_size, stat.st_mtime)
+
+    def evict(self):
+        """ Remove least recently used entries until the cache fits into max_bytes.
+
+        Returns:
+            int: Number of removed entries
+        """
+        entries = sorted(self.iter_entries(), key=lambda entry: entry[2])
+
+        total_bytes = sum(size for path, size, mtime in entries)
+
+        removed = 0
+
+        for path, size, mtime in entries:
+            if total_bytes <= self.max_bytes:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+            total_bytes -= size
+            removed += 1
+
+        return removed
+
+    def get_stats(self):
+        """ Get accumulated hit and miss counts.
+
+        Returns:
+            dict
+        """
+        stats_path = os.path.join(self.root, STATS_NAME)
+
+        try:
+            with open(stats_path) as file_handle:
+                return json.loads(file_handle.read())
+        except (IOError, ValueError):
+            return {'hits': 0, 'misses': 0}
+
+    def update_stats(self, hits, misses):
+        """ Add hit and miss counts to the accumulated statistics.
+
+        Args:
+            hits (int): Number of hits
+            misses (int): Number of misses
+
+        Returns:
+            dict
+        """
+        stats = self.get_stats()
+
+        stats['hits'] = stats.get('hits', 0) + hits
+        stats['misses'] = stats.get('misses', 0) + misses
+
+        try:
+            self.write_atomic(os.path.join(self.root, STATS_NAME), json.dumps(stats))
+        except (IOError, OSError):
+            # statistics are informational, a failed update is dropped
+            pass
+
+        return stats
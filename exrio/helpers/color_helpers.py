@@ -0,0 +1,126 @@
+""" Color helpers module.
+
+Display views map scene linear pixels to 8bit through exposure, a tone curve and a transfer function. The whole pipeline is precomputed as a lookup table over all 65536 half float values, so converting a pixel is a single lookup of its half float bit pattern instead of evaluating powers and divisions per pixel.
+"""
+
+# image manipulation
+import numpy
+
+# view mapping the estimated exposure range linearly to 8bit
+RAW_VIEW = 'raw'
+
+# views and their transfer functions, raw is not a display view and does not use a lookup table
+VIEWS = [RAW_VIEW, 'linear', 'srgb', 'rec709']
+
+# tone curves compressing highlights of display views
+TONES = ['none', 'reinhard', 'filmic']
+
+DEFAULT_VIEW = RAW_VIEW
+
+DEFAULT_TONE = 'none'
+
+# lookup tables of display views per view, tone and exposure
+_luts = {}
+
+def apply_tone(values, tone):
+    """ Apply tone curve to scene linear values.
+
+    Args:
+        values (numpy.ndarray): Non-negative float values
+        tone (str): none, reinhard or filmic
+
+    Returns:
+        numpy.ndarray: Values, 1 and above map to white
+
+    Raises:
+        ValueError
+    """
+    if tone == 'none':
+        return values
+
+    if tone == 'reinhard':
+        return values / (1.0 + values)
+
+    if tone == 'filmic':
+        # curve fitted to the ACES reference rendering by Krzysztof Narkowicz
+        return (values * (2.51 * values + 0.03)) / (values * (2.43 * values + 0.59) + 0.14)
+
+    raise ValueError('Unknown tone curve {}, must be one of {}.'.format(tone, ', '.join(TONES)))
+
+def apply_oetf(values, view):
+    """ Apply transfer function of view to linear values.
+
+    Args:
+        values (numpy.ndarray): Values between 0 and 1
+        view (str): linear, srgb or rec709
+
+    Returns:
+        numpy.ndarray: Encoded values between 0 and 1
+
+    Raises:
+        ValueError
+    """
+    if view == 'linear':
+        return values
+
+    if view == 'srgb':
+        return numpy.where(values <= 0.0031308, values * 12.92, 1.055 * numpy.power(values, 1.0 / 2.4) - 0.055)
+
+    if view == 'rec709':
+        return numpy.where(values < 0.018, values * 4.5, 1.099 * numpy.power(values, 0.45) - 0.099)
+
+    raise ValueError('Unknown view {}, must be one of {}.'.format(view, ', '.join(VIEWS)))
+
+def get_lut(view, tone=DEFAULT_TONE, exposure=0.0):
+    """ Get lookup table of a display view, tables are computed once per process and parameters.
+
+    Args:
+        view (str): linear, srgb or rec709
+        tone (str): none, reinhard or filmic
+        exposure (float): Exposure adjustment in stops
+
+    Returns:
+        numpy.ndarray: 8bit values indexed by bit pattern of half float pixels
+
+    Raises:
+        ValueError
+    """
+    key = (view, tone, float(exposure))
+
+    if not key in _luts:
+        values = numpy.arange(65536, dtype=numpy.uint32).astype(numpy.uint16).view(numpy.float16).astype(numpy.float64)
+
+        with numpy.errstate(invalid='ignore', over='ignore'):
+            # negative values and NaN are black, infinity is white
+            linear = numpy.maximum(numpy.nan_to_num(values * 2.0 ** exposure), 0.0)
+
+            toned = apply_tone(linear, tone)
+
+            toned[numpy.isposinf(values)] = 1.0
+
+            encoded = apply_oetf(numpy.clip(numpy.nan_to_num(toned), 0.0, 1.0), view)
+
+        lut = numpy.round(encoded * 255.0).astype(numpy.uint8)
+
+        lut.setflags(write=False)
+
+        _luts[key] = lut
+
+    return _luts[key]
+
+def apply_lut(pixels, lut):
+    """ Map pixels to 8bit with a lookup table of a display view.
+
+    Args:
+        pixels (numpy.ndarray): Pixels, converted to half float unless they are
+        lut (numpy.ndarray): Lookup table as returned by get_lut
+
+    Returns:
+        numpy.ndarray: 8bit pixels
+    """
+    if pixels.dtype != numpy.float16:
+        # values beyond the half float range become infinity and map to white
+        with numpy.errstate(over='ignore'):
+            pixels = pixels.astype(numpy.float16)
+
+    return lut.take(pixels.view(numpy.uint16))
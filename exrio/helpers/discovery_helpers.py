@@ -0,0 +1,154 @@
+""" Discovery helpers module. """
+
+# system
+import fnmatch
+import os
+
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
+
+try:
+    # Python 3.5+
+    from os import scandir
+except ImportError:
+    from scandir import scandir
+
+# helpers
+from exrio.helpers.multiprocessing_helpers import get_num_threads
+from exrio.helpers.fs_helpers import TEMP_PREFIX
+from exrio.helpers.sequence_helpers import SequenceCollector
+
+# exrio
+from exrio import console
+
+# default patterns of files to discover
+DEFAULT_INCLUDE = ['*.exr']
+
+# queue message kinds
+_FILE = 0
+_DIR = 1
+_DONE = 2
+
+def _matches(name, rel_path, patterns):
+    """ Test if name or relative path matches any glob pattern.
+
+    Args:
+        name (str): File or directory name
+        rel_path (str): Path relative to the discovery root
+        patterns (list): Glob patterns
+
+    Returns:
+        bool
+    """
+    for pattern in patterns:
+        if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(rel_path, pattern):
+            return True
+
+    return False
+
+def discover(root, include=None, exclude=None, max_depth=None, num_threads=None, frames=None, sequences=None):
+    """ Discover files below root, scanning subdirectories in parallel threads and yielding paths as soon as they are found.
+
+    Exclude patterns prune directories as well as files. Paths are yielded in no particular order. Sequences are only collected if a list is passed, the yielded paths are grouped by the consuming thread and the list is filled once discovery is complete.
+
+    Args:
+        root (str): Directory to scan
+        include (list): Glob patterns of files to yield (default=*.exr)
+        exclude (list): Glob patterns of files and directories to skip
+        max_depth (int): Maximum depth of subdirectories to scan, 0 scans only root
+        num_threads (int): Number of threads scanning directories
+        frames (FrameRange): Frames to select, files without frame number are skipped
+        sequences (list): List to append the sequences of all discovered files to
+
+    Returns:
+        generator: File paths
+    """
+    if not include:
+        include = DEFAULT_INCLUDE
+
+    if not exclude:
+        exclude = []
+
+    queue = Queue()
+
+    def scan(path, depth):
+        """ Scan single directory and report files and subdirectories to the queue.
+
+        Args:
+            path (str): Directory to scan
+            depth (int): Depth of directory below root
+        """
+        try:
+            for entry in scandir(path):
+                rel_path = os.path.relpath(entry.path, root).replace(os.sep, '/')
+
+                if _matches(entry.name, rel_path, exclude):
+                    continue
+
+                if entry.is_dir(follow_symlinks=False):
+                    if max_depth is None or depth < max_depth:
+                        queue.put((_DIR, (entry.path, depth + 1)))
+
+                    continue
+
+                # temporary files of running or crashed jobs are never inputs
+                if entry.name.startswith(TEMP_PREFIX):
+                    continue
+
+                # unselected frames are skipped by frame number before they are stat'ed
+                if frames is not None and not frames.contains_name(entry.name):
+                    continue
+
+                if _matches(entry.name, rel_path, include) and entry.is_file():
+                    queue.put((_FILE, entry.path))
+        except OSError as error:
+            console.warning('Could not scan {}: {}'.format(path, error))
+        finally:
+            queue.put((_DONE, path))
+
+    pool = ThreadPool(processes=get_num_threads(num_threads))
+
+    collector = SequenceCollector(frames) if sequences is not None else None
+
+    try:
+        # directories which are submitted but not scanned yet, only changed by the consuming thread
+        outstanding = 1
+
+        pool.apply_async(scan, (root, 0))
+
+        while outstanding:
+            kind, value = queue.get()
+
+            if kind == _FILE:
+                if collector is not None:
+                    collector.add(value)
+
+                yield value
+            elif kind == _DIR:
+                outstanding += 1
+
+                pool.apply_async(scan, value)
+            else:
+                outstanding -= 1
+
+        if collector is not None:
+            sequences.extend(collector.get_sequences())
+    finally:
+        pool.terminate()
+
+def discover_fs(in_fs, include=None, exclude=None, max_depth=None, num_threads=None, frames=None, sequences=None):
+    """ Discover files of filesystem.
+
+    Args:
+        in_fs (fs): Input filesystem
+        include (list): Glob patterns of files to yield (default=*.exr)
+        exclude (list): Glob patterns of files and directories to skip
+        max_depth (int): Maximum depth of subdirectories to scan
+        num_threads (int): Number of threads scanning directories
+        frames (FrameRange): Frames to select
+        sequences (list): List to append discovered sequences to
+
+    Returns:
+        generator: File paths
+    """
+    return discover(in_fs.getsyspath(u'/'), include, exclude, max_depth, num_threads, frames, sequences)
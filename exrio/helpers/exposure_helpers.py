@@ -0,0 +1,90 @@
+""" Exposure helpers module. """
+
+# image manipulation
+import numpy
+
+# number of scanlines per sampled band, short bands spread the samples over the image so gradients along rows are not aliased
+SAMPLE_BAND_HEIGHT = 8
+
+# percentiles of the pixel values mapped to black and white
+DEFAULT_PERCENTILES = (0.1, 99.9)
+
+# fraction of bands of scanlines sampled to estimate the exposure range
+DEFAULT_SAMPLE_RATE = 0.125
+
+def get_sample_step(sample_rate):
+    """ Get step between sampled bands.
+
+    Args:
+        sample_rate (float): Fraction of bands to sample, 1 samples all bands
+
+    Returns:
+        int
+
+    Raises:
+        ValueError
+    """
+    if not 0 < sample_rate <= 1:
+        raise ValueError('Invalid sample rate {}, must be greater than 0 and at most 1.'.format(sample_rate))
+
+    return max(1, int(round(1.0 / sample_rate)))
+
+def sample_rows(pixels, sample_rate=DEFAULT_SAMPLE_RATE, band_height=SAMPLE_BAND_HEIGHT):
+    """ Sample evenly spaced bands of rows, the first band is always sampled.
+
+    Args:
+        pixels (numpy.ndarray): Pixels as rows and columns
+        sample_rate (float): Fraction of bands to sample
+        band_height (int): Number of rows per band
+
+    Returns:
+        numpy.ndarray: Finite pixels of sampled bands
+    """
+    step = get_sample_step(sample_rate)
+
+    bands = [pixels[y_start:y_start + band_height] for y_start in xrange(0, pixels.shape[0], band_height * step)]
+
+    samples = numpy.concatenate([band.ravel() for band in bands]) if bands else numpy.empty(0, dtype=numpy.float32)
+
+    return samples[numpy.isfinite(samples)]
+
+def estimate_range(channel_pixels, sample_rate=DEFAULT_SAMPLE_RATE, percentiles=DEFAULT_PERCENTILES):
+    """ Estimate the range of pixel values to map to black and white from percentiles of sampled bands.
+
+    A few extreme pixels, e.g. fireflies, do not affect the range. All channels share the range to keep colors balanced.
+
+    Args:
+        channel_pixels (list): Pixels of channels as rows and columns
+        sample_rate (float): Fraction of bands to sample
+        percentiles (tuple): Lower and upper percentile
+
+    Returns:
+        tuple: Lower and upper value
+    """
+    samples = numpy.concatenate([sample_rows(pixels, sample_rate) for pixels in channel_pixels])
+
+    if not samples.size:
+        return (0.0, 1.0)
+
+    low, high = numpy.percentile(samples, percentiles)
+
+    if high <= low:
+        # constant images are mapped to black
+        high = low + 1.0
+
+    return (float(low), float(high))
+
+def normalize(pixels, low, high):
+    """ Map pixel values between low and high to 8bit, clipping values outside.
+
+    Args:
+        pixels (numpy.ndarray): Pixels
+        low (float): Value mapped to 0
+        high (float): Value mapped to 255
+
+    Returns:
+        numpy.ndarray: 8bit pixels, NaN is mapped to 0
+    """
+    scaled = (pixels.astype(numpy.float32) - low) * (255.0 / (high - low))
+
+    return numpy.nan_to_num(numpy.clip(scaled, 0.0, 255.0)).astype(numpy.uint8)
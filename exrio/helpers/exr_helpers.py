@@ -0,0 +1,270 @@
+""" EXR helpers module. """
+
+# system
+import threading
+
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+# image manipulation
+import OpenEXR
+import Imath
+import numpy
+
+# number of scanlines read and written at once when streaming pixels
+BAND_HEIGHT = 64
+
+# header attributes which only apply to tiled or multipart files
+TILED_ATTRIBUTES = ['tiles', 'type', 'chunkCount']
+
+# pixel type names as used in layer maps
+PIXEL_TYPES = {
+    'UINT': Imath.PixelType.UINT,
+    'HALF': Imath.PixelType.HALF,
+    'FLOAT': Imath.PixelType.FLOAT
+}
+
+# numpy data types per pixel type
+PIXEL_DTYPES = {
+    Imath.PixelType.UINT: numpy.uint32,
+    Imath.PixelType.HALF: numpy.float16,
+    Imath.PixelType.FLOAT: numpy.float32
+}
+
+def get_pixel_type(name):
+    """ Get pixel type from pixel type name.
+
+    Args:
+        name (str): Pixel type name (UINT, HALF or FLOAT)
+
+    Returns:
+        Imath.PixelType
+
+    Raises:
+        ValueError
+    """
+    try:
+        return Imath.PixelType(PIXEL_TYPES[name.upper()])
+    except KeyError:
+        raise ValueError('Unknown pixel type {}.'.format(name))
+
+def get_dtype(pixel_type):
+    """ Get numpy data type of pixel type.
+
+    Args:
+        pixel_type (Imath.PixelType): Pixel type
+
+    Returns:
+        numpy.dtype
+    """
+    return numpy.dtype(PIXEL_DTYPES[pixel_type.v])
+
+def get_size(header):
+    """ Get width and height of the data window.
+
+    Args:
+        header (dict): EXR header
+
+    Returns:
+        tuple
+    """
+    data_window = header['dataWindow']
+
+    return (data_window.max.x - data_window.min.x + 1, data_window.max.y - data_window.min.y + 1)
+
+def get_data_window(header):
+    """ Get data window as tuple, Imath.Box2i only supports comparisons with ==.
+
+    Args:
+        header (dict): EXR header
+
+    Returns:
+        tuple: Minimum x and y and maximum x and y
+    """
+    data_window = header['dataWindow']
+
+    return (data_window.min.x, data_window.min.y, data_window.max.x, data_window.max.y)
+
+def get_band_height(header, band_height=BAND_HEIGHT):
+    """ Get band height aligned to rows of tiles for tiled files.
+
+    Args:
+        header (dict): EXR header
+        band_height (int): Minimum number of scanlines per band
+
+    Returns:
+        int
+    """
+    if 'tiles' in header:
+        tile_height = header['tiles'].ySize
+
+        return ((band_height + tile_height - 1) // tile_height) * tile_height
+
+    return band_height
+
+def get_scanline_header(header):
+    """ Get copy of header without tiled and multipart attributes, which the scanline OutputFile can not write.
+
+    Args:
+        header (dict): EXR header
+
+    Returns:
+        dict
+    """
+    return {key: value for key, value in header.iteritems() if not key in TILED_ATTRIBUTES}
+
+def iter_bands(header, band_height=BAND_HEIGHT):
+    """ Iterate the data window in bands of scanlines.
+
+    Args:
+        header (dict): EXR header
+        band_height (int): Number of scanlines per band
+
+    Returns:
+        generator: First and last scanline (inclusive) of each band
+    """
+    data_window = header['dataWindow']
+
+    band_height = get_band_height(header, band_height)
+
+    for y_start in xrange(data_window.min.y, data_window.max.y + 1, band_height):
+        yield (y_start, min(y_start + band_height - 1, data_window.max.y))
+
+def convert_pixels(data, in_pixel_type, out_pixel_type):
+    """ Convert raw pixel data between pixel types.
+
+    Args:
+        data (str): Raw pixel data
+        in_pixel_type (Imath.PixelType): Pixel type of data
+        out_pixel_type (Imath.PixelType): Pixel type to convert to
+
+    Returns:
+        str
+    """
+    if in_pixel_type == out_pixel_type:
+        return data
+
+    pixels = numpy.frombuffer(data, dtype=get_dtype(in_pixel_type))
+
+    return pixels.astype(get_dtype(out_pixel_type)).tostring()
+
+def get_channel_bytes(header, channel):
+    """ Get number of uncompressed bytes of a channel.
+
+    Args:
+        header (dict): EXR header
+        channel (Imath.Channel): Channel
+
+    Returns:
+        int
+    """
+    width, height = get_size(header)
+
+    return (width // channel.xSampling) * (height // channel.ySampling) * get_dtype(channel.type).itemsize
+
+def find_constant_channels(in_exr_file, channels, band_height=BAND_HEIGHT):
+    """ Find channels in which all pixels have the same value by scanning bands of scanlines.
+
+    Channels are dropped from the scan as soon as a differing pixel is found. Pixels are compared by their bits, so channels filled with NaN are constant as well.
+
+    Args:
+        in_exr_file (OpenEXR.InputFile): Opened exr file
+        channels (list): Names of channels to scan
+        band_height (int): Number of scanlines per band
+
+    Returns:
+        dict: Channel name / constant value pairs
+    """
+    header = in_exr_file.header()
+
+    candidates = {channel_name: None for channel_name in channels}
+
+    for y_start, y_end in iter_bands(header, band_height):
+        if not candidates:
+            break
+
+        for channel_name in candidates.keys():
+            pixel_type = header['channels'][channel_name].type
+
+            dtype = get_dtype(pixel_type)
+
+            pixels = numpy.frombuffer(in_exr_file.channel(channel_name, pixel_type, y_start, y_end), dtype=dtype)
+
+            if not pixels.size:
+                continue
+
+            if candidates[channel_name] is None:
+                candidates[channel_name] = pixels[0]
+
+            # NaN never equals itself, its bits do
+            bits = pixels.view('u{}'.format(dtype.itemsize))
+
+            if (bits != bits[:1]).any() or bits[0] != candidates[channel_name].view(bits.dtype):
+                del candidates[channel_name]
+
+    return {channel_name: value.item() for channel_name, value in candidates.iteritems() if value is not None}
+
+def imap_bands(in_path, channels, bands, num_threads=1):
+    """ Read channels band by band, decoding up to num_threads bands in parallel.
+
+    Each thread opens its own InputFile. Channels of the same pixel type are read with a single call, so the scanlines of a band are decoded once instead of once per channel. At most two bands per thread are held in memory.
+
+    Args:
+        in_path (str): File to read
+        channels (dict): Channel name / pixel type pairs
+        bands (iterable): First and last scanline of each band
+        num_threads (int): Number of threads
+
+    Returns:
+        generator: Band and channel name / raw pixel data pairs in order of bands
+    """
+    local = threading.local()
+
+    # pixel type and channel names per pixel type
+    groups = {}
+
+    for channel_name, pixel_type in channels.iteritems():
+        groups.setdefault(pixel_type.v, (pixel_type, []))[1].append(channel_name)
+
+    def read_band(band):
+        """ Read channels of band with the InputFile of the current thread.
+
+        Args:
+            band (tuple): First and last scanline
+
+        Returns:
+            tuple
+        """
+        if not hasattr(local, 'exr_file'):
+            local.exr_file = OpenEXR.InputFile(in_path)
+
+        y_start, y_end = band
+
+        channel_data = {}
+
+        for pixel_type, channel_names in groups.itervalues():
+            channel_data.update(zip(channel_names, local.exr_file.channels(channel_names, pixel_type, y_start, y_end)))
+
+        return (band, channel_data)
+
+    if not num_threads or num_threads < 2:
+        for band in bands:
+            yield read_band(band)
+
+        return
+
+    pool = ThreadPool(processes=num_threads)
+
+    try:
+        pending = deque()
+
+        for band in bands:
+            pending.append(pool.apply_async(read_band, (band,)))
+
+            if len(pending) >= num_threads * 2:
+                yield pending.popleft().get()
+
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
@@ -1,12 +1,21 @@
 """ FS helpers module. """
 
 # system
+import binascii
+import errno
 import os
+import shutil
+import tempfile
+
+from contextlib import contextmanager
 
 # fs
 from fs.base import FS
 from fs.osfs import OSFS
 
+# prefix of temporary files, discovery skips files starting with it
+TEMP_PREFIX = '.exrio-tmp-'
+
 def assure_fs(path):
     """ Assure filesystem for each segment of the path.
 
@@ -51,6 +60,120 @@ def assure_fs(path):
 
     return reduce(reduce_path, path_parts)
 
+def create_temp_file(dirname, prefix='', suffix=''):
+    """ Create a new temporary file with the permissions a file created with open would have.
+
+    Files created by tempfile.mkstemp are only accessible by their owner. Here the umask of the process applies when the file is created, so it never has to be read or changed.
+
+    Args:
+        dirname (str): Directory of the file
+        prefix (str): Prefix of the file name
+        suffix (str): Suffix of the file name
+
+    Returns:
+        tuple: File descriptor opened for writing and path of the file
+
+    Raises:
+        IOError
+        OSError
+    """
+    for attempt in xrange(tempfile.TMP_MAX):
+        temp_path = os.path.join(dirname, prefix + binascii.hexlify(os.urandom(6)) + suffix)
+
+        try:
+            return (os.open(temp_path, os.O_RDWR | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666), temp_path)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+
+    raise IOError(errno.EEXIST, 'No usable temporary file name in {}.'.format(dirname))
+
+@contextmanager
+def atomic_paths(out_paths):
+    """ Provide temporary paths next to out_paths which are renamed to out_paths once the block succeeds.
+
+    Readers never see partially written files at out_paths, the temporary files are removed on failure. Temporary files start with TEMP_PREFIX, so discovery skips them, and have the default permissions of new files.
+
+    Args:
+        out_paths (list): Paths to write
+
+    Returns:
+        contextmanager: Temporary paths with the extensions of out_paths
+    """
+    temp_paths = []
+
+    try:
+        for out_path in out_paths:
+            dirname, basename = os.path.split(out_path)
+
+            name, extension = os.path.splitext(basename)
+
+            # outputs are shared with other users, e.g. render farm nodes
+            file_descriptor, temp_path = create_temp_file(dirname, TEMP_PREFIX + name + '.', extension)
+
+            os.close(file_descriptor)
+
+            temp_paths.append(temp_path)
+
+        yield temp_paths
+    except:
+        for temp_path in temp_paths:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        raise
+
+    for temp_path, out_path in zip(temp_paths, out_paths):
+        # rename does not replace existing files on windows
+        if os.name == 'nt' and os.path.exists(out_path):
+            os.remove(out_path)
+
+        os.rename(temp_path, out_path)
+
+@contextmanager
+def atomic_path(out_path):
+    """ Provide a temporary path next to out_path which is renamed to out_path once the block succeeds.
+
+    Args:
+        out_path (str): Path to write
+
+    Returns:
+        contextmanager: Temporary path with the extension of out_path
+    """
+    with atomic_paths([out_path]) as temp_paths:
+        yield temp_paths[0]
+
+@contextmanager
+def output_path(out, extension=''):
+    """ Provide a path to write to out, which is a path or a file-like object.
+
+    Paths are written atomically. Libraries which only write to paths write file-like objects through a temporary file, which is copied to out once the block succeeds.
+
+    Args:
+        out (mixed): Path or file-like object with a write method
+        extension (str): Extension of the temporary file for file-like objects
+
+    Returns:
+        contextmanager: Path to write
+    """
+    if isinstance(out, basestring):
+        with atomic_path(out) as temp_path:
+            yield temp_path
+
+        return
+
+    file_descriptor, temp_path = tempfile.mkstemp(suffix=extension)
+
+    os.close(file_descriptor)
+
+    try:
+        yield temp_path
+
+        with open(temp_path, 'rb') as file_handle:
+            shutil.copyfileobj(file_handle, out)
+    finally:
+        os.remove(temp_path)
+
 def main():
     assure_fs('../asdf')
 
@@ -0,0 +1,370 @@
+""" Header helpers module.
+
+Reads the headers of all parts of an exr file without decoding pixels, since the OpenEXR bindings only expose the first part.
+"""
+
+# system
+import struct
+
+# exceptions
+from exrio.exrio_exceptions import NoExrFileException, NoPartException, UnsupportedPartException
+
+# exrio
+from exrio import console
+
+# exr magic number
+MAGIC = 20000630
+
+# version flags
+TILED_FLAG = 0x200
+LONG_NAMES_FLAG = 0x400
+NON_IMAGE_FLAG = 0x800
+MULTIPART_FLAG = 0x1000
+
+# names of enum attribute values
+COMPRESSION_NAMES = ['NO_COMPRESSION', 'RLE_COMPRESSION', 'ZIPS_COMPRESSION', 'ZIP_COMPRESSION', 'PIZ_COMPRESSION', 'PXR24_COMPRESSION', 'B44_COMPRESSION', 'B44A_COMPRESSION', 'DWAA_COMPRESSION', 'DWAB_COMPRESSION']
+LINE_ORDER_NAMES = ['INCREASING_Y', 'DECREASING_Y', 'RANDOM_Y']
+PIXEL_TYPE_NAMES = ['UINT', 'HALF', 'FLOAT']
+LEVEL_MODE_NAMES = ['ONE_LEVEL', 'MIPMAP_LEVELS', 'RIPMAP_LEVELS']
+ROUNDING_MODE_NAMES = ['ROUND_DOWN', 'ROUND_UP']
+
+class _Reader(object):
+    """ Sequential reader of little endian values. """
+
+    def __init__(self, data, offset=0):
+        self.data = data
+        self.offset = offset
+
+    def unpack(self, fmt):
+        """ Unpack values and advance.
+
+        Args:
+            fmt (str): Struct format without byte order
+
+        Returns:
+            tuple
+        """
+        values = struct.unpack_from('<' + fmt, self.data, self.offset)
+
+        self.offset += struct.calcsize('<' + fmt)
+
+        return values
+
+    def string(self):
+        """ Read null terminated string and advance.
+
+        Returns:
+            str
+        """
+        end = self.data.index('\0', self.offset)
+
+        value = self.data[self.offset:end]
+
+        self.offset = end + 1
+
+        return value
+
+def _enum_name(names, value):
+    """ Get name of enum value.
+
+    Args:
+        names (list): Enum names
+        value (int): Enum value
+
+    Returns:
+        str
+    """
+    if value < len(names):
+        return names[value]
+
+    return value
+
+def _box(values):
+    """ Convert box values to dict.
+
+    Args:
+        values (tuple): Min x, min y, max x, max y
+
+    Returns:
+        dict
+    """
+    return {'min': {'x': values[0], 'y': values[1]}, 'max': {'x': values[2], 'y': values[3]}}
+
+def _read_chlist(data):
+    """ Read channel list.
+
+    Args:
+        data (str): Attribute data
+
+    Returns:
+        dict
+    """
+    reader = _Reader(data)
+
+    channels = {}
+
+    while reader.offset < len(data) and data[reader.offset] != '\0':
+        name = reader.string()
+
+        pixel_type, p_linear, x_sampling, y_sampling = reader.unpack('iB3xii')
+
+        channels[name] = {
+            'type': _enum_name(PIXEL_TYPE_NAMES, pixel_type),
+            'pLinear': bool(p_linear),
+            'xSampling': x_sampling,
+            'ySampling': y_sampling
+        }
+
+    return channels
+
+def _read_stringvector(data):
+    """ Read string vector.
+
+    Args:
+        data (str): Attribute data
+
+    Returns:
+        list
+    """
+    reader = _Reader(data)
+
+    strings = []
+
+    while reader.offset < len(data):
+        length, = reader.unpack('i')
+
+        strings.append(data[reader.offset:reader.offset + length])
+
+        reader.offset += length
+
+    return strings
+
+def _read_tiledesc(data):
+    """ Read tile description.
+
+    Args:
+        data (str): Attribute data
+
+    Returns:
+        dict
+    """
+    x_size, y_size, mode = struct.unpack_from('<IIB', data)
+
+    return {
+        'xSize': x_size,
+        'ySize': y_size,
+        'mode': _enum_name(LEVEL_MODE_NAMES, mode & 0x0f),
+        'roundingMode': _enum_name(ROUNDING_MODE_NAMES, mode >> 4)
+    }
+
+# attribute type / reader pairs
+ATTRIBUTE_READERS = {
+    'box2i': lambda data: _box(struct.unpack_from('<4i', data)),
+    'box2f': lambda data: _box(struct.unpack_from('<4f', data)),
+    'chlist': _read_chlist,
+    'chromaticities': lambda data: list(struct.unpack_from('<8f', data)),
+    'compression': lambda data: _enum_name(COMPRESSION_NAMES, ord(data[0])),
+    'double': lambda data: struct.unpack_from('<d', data)[0],
+    'envmap': lambda data: ord(data[0]),
+    'float': lambda data: struct.unpack_from('<f', data)[0],
+    'int': lambda data: struct.unpack_from('<i', data)[0],
+    'keycode': lambda data: list(struct.unpack_from('<7i', data)),
+    'lineOrder': lambda data: _enum_name(LINE_ORDER_NAMES, ord(data[0])),
+    'm33f': lambda data: list(struct.unpack_from('<9f', data)),
+    'm44f': lambda data: list(struct.unpack_from('<16f', data)),
+    'preview': lambda data: {'width': struct.unpack_from('<I', data)[0], 'height': struct.unpack_from('<I', data, 4)[0]},
+    'rational': lambda data: list(struct.unpack_from('<iI', data)),
+    'string': lambda data: data,
+    'stringvector': _read_stringvector,
+    'tiledesc': _read_tiledesc,
+    'timecode': lambda data: list(struct.unpack_from('<2I', data)),
+    'v2i': lambda data: list(struct.unpack_from('<2i', data)),
+    'v2f': lambda data: list(struct.unpack_from('<2f', data)),
+    'v2d': lambda data: list(struct.unpack_from('<2d', data)),
+    'v3i': lambda data: list(struct.unpack_from('<3i', data)),
+    'v3f': lambda data: list(struct.unpack_from('<3f', data)),
+    'v3d': lambda data: list(struct.unpack_from('<3d', data))
+}
+
+def _read_header(reader):
+    """ Read attributes of a single header.
+
+    Args:
+        reader (_Reader): Reader positioned at the start of the header
+
+    Returns:
+        dict
+    """
+    header = {}
+
+    while True:
+        name = reader.string()
+
+        # empty name terminates the header
+        if not name:
+            return header
+
+        attribute_type = reader.string()
+
+        size, = reader.unpack('i')
+
+        data = reader.data[reader.offset:reader.offset + size]
+
+        reader.offset += size
+
+        if attribute_type in ATTRIBUTE_READERS:
+            header[name] = ATTRIBUTE_READERS[attribute_type](data)
+        else:
+            header[name] = '<{} ({} bytes)>'.format(attribute_type, size)
+
+def read_version(in_path):
+    """ Read version field of exr file.
+
+    Args:
+        in_path (str): File to read
+
+    Returns:
+        int
+
+    Raises:
+        NoExrFileException
+    """
+    with open(in_path, 'rb') as file_handle:
+        data = file_handle.read(8)
+
+    if len(data) < 8 or struct.unpack('<i', data[:4])[0] != MAGIC:
+        raise NoExrFileException(in_path)
+
+    return struct.unpack('<i', data[4:])[0]
+
+def read_headers_with_offset(in_path, chunk_size=65536):
+    """ Read headers of all parts of exr file and the offset of the data following the headers.
+
+    Args:
+        in_path (str): File to read
+        chunk_size (int): Number of bytes to read at once
+
+    Returns:
+        tuple: Headers and offset of the line offset table in bytes
+
+    Raises:
+        NoExrFileException
+    """
+    version = read_version(in_path)
+
+    data = ''
+
+    with open(in_path, 'rb') as file_handle:
+        file_handle.seek(8)
+
+        # read chunks until all headers could be parsed, headers are small compared to pixel data
+        while True:
+            chunk = file_handle.read(chunk_size)
+
+            data += chunk
+
+            try:
+                reader = _Reader(data)
+
+                headers = [_read_header(reader)]
+
+                if version & MULTIPART_FLAG:
+                    # empty header terminates the list of parts
+                    while data[reader.offset] != '\0':
+                        headers.append(_read_header(reader))
+
+                    reader.offset += 1
+
+                break
+            except (IndexError, ValueError, struct.error):
+                if not chunk:
+                    raise NoExrFileException(in_path)
+
+    for header in headers:
+        if not 'type' in header:
+            header['type'] = 'tiledimage' if version & TILED_FLAG else 'scanlineimage'
+
+    # offsets are relative to the start of the file, which starts with magic number and version
+    return (headers, reader.offset + 8)
+
+def read_headers(in_path, chunk_size=65536):
+    """ Read headers of all parts of exr file.
+
+    Args:
+        in_path (str): File to read
+        chunk_size (int): Number of bytes to read at once
+
+    Returns:
+        list
+
+    Raises:
+        NoExrFileException
+    """
+    return read_headers_with_offset(in_path, chunk_size)[0]
+
+def is_multipart(in_path):
+    """ Test if exr file consists of multiple parts.
+
+    Args:
+        in_path (str): File to read
+
+    Returns:
+        bool
+    """
+    return bool(read_version(in_path) & MULTIPART_FLAG)
+
+def get_part_index(in_path, part=None):
+    """ Get index of part by index or name.
+
+    Args:
+        in_path (str): File to read
+        part (mixed): Index or name of part
+
+    Returns:
+        int
+
+    Raises:
+        NoPartException
+    """
+    if part is None:
+        return 0
+
+    headers = read_headers(in_path)
+
+    for index, header in enumerate(headers):
+        if str(index) == str(part) or header.get('name') == part:
+            return index
+
+    raise NoPartException('{} has no part {}.'.format(in_path, part))
+
+def assure_readable_part(in_path, part=None, output=False):
+    """ Assure that the selected part can be read by the OpenEXR bindings.
+
+    Only the first part of multipart files can be read and multipart or tiled files can not be written. If no part is selected, reading a file with several parts warns, writing it fails, so parts are never dropped silently.
+
+    Args:
+        in_path (str): File to read
+        part (mixed): Index or name of part
+        output (bool): The part is written to an output file
+
+    Raises:
+        NoPartException
+        UnsupportedPartException
+    """
+    index = get_part_index(in_path, part)
+
+    if index != 0:
+        raise UnsupportedPartException('Part {} of {} can not be read by the OpenEXR bindings, only the first part is supported.'.format(part, in_path))
+
+    if part is not None or not is_multipart(in_path):
+        return
+
+    count = len(read_headers(in_path))
+
+    if count < 2:
+        return
+
+    if output:
+        raise UnsupportedPartException('{} has {} parts, multipart output is not supported. Select part 0 to write the first part only.'.format(in_path, count))
+
+    console.warning('{} has {} parts, only the first part is read.'.format(in_path, count))
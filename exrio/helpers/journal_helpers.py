@@ -0,0 +1,157 @@
+""" Journal helpers module. """
+
+# system
+import json
+import os
+import time
+
+# name of the journal in the output directory
+JOURNAL_NAME = '.exrio_journal.jsonl'
+
+# name of the journal of a shard in the output directory
+SHARD_JOURNAL_NAME = '.exrio_journal.{}.jsonl'
+
+# task states
+STARTED = 'started'
+DONE = 'done'
+FAILED = 'failed'
+
+# job markers
+JOB_START = 'start'
+JOB_RESUME = 'resume'
+
+class Journal(object):
+    """ Append-only journal of task states, one JSON object per line.
+
+    Lines are appended with a single write to a file opened in append mode, so workers of several processes can share the journal.
+    """
+
+    def __init__(self, path):
+        """ Create journal.
+
+        Args:
+            path (str): Path of journal file
+        """
+        self.path = path
+
+    def _write(self, entry):
+        """ Append entry as a single line.
+
+        Args:
+            entry (dict): Entry
+        """
+        entry['time'] = time.time()
+
+        line = json.dumps(entry, sort_keys=True) + '\n'
+
+        file_descriptor = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+        try:
+            os.write(file_descriptor, line)
+        finally:
+            os.close(file_descriptor)
+
+    def start(self, resume=False):
+        """ Mark start of a job, a fresh job ignores tasks completed by previous jobs.
+
+        Args:
+            resume (bool): Resume the previous job
+        """
+        self._write({'job': JOB_RESUME if resume else JOB_START})
+
+    def append(self, key, state, error=None):
+        """ Append state of task.
+
+        Args:
+            key (str): Task key
+            state (str): Task state
+            error (str): Error of failed task
+        """
+        entry = {'task': key, 'state': state}
+
+        if error:
+            entry['error'] = error
+
+        self._write(entry)
+
+    def get_states(self):
+        """ Get last state of each task since the last fresh job.
+
+        Returns:
+            dict: Task key / state pairs
+        """
+        states = {}
+
+        if not os.path.isfile(self.path):
+            return states
+
+        with open(self.path) as file_handle:
+            for line in file_handle:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # line torn by a crash while writing
+                    continue
+
+                if entry.get('job') == JOB_START:
+                    states = {}
+                elif 'task' in entry:
+                    states[entry['task']] = entry['state']
+
+        return states
+
+    def get_completed(self):
+        """ Get keys of completed tasks since the last fresh job.
+
+        Returns:
+            set
+        """
+        return set(key for key, state in self.get_states().iteritems() if state == DONE)
+
+def run_journaled(journal, key, callback, *args):
+    """ Run callback and record its state in the journal.
+
+    Args:
+        journal (Journal): Journal
+        key (str): Task key
+        callback (callable): Task callback
+        *args: Task arguments
+
+    Returns:
+        mixed: Result of callback
+    """
+    journal.append(key, STARTED)
+
+    try:
+        result = callback(*args)
+    except Exception as error:
+        journal.append(key, FAILED, repr(error))
+
+        raise
+
+    journal.append(key, DONE)
+
+    return result
+
+def open_journal(out_fs, resume=False, shard=None):
+    """ Open journal in output filesystem and mark the start of a job.
+
+    Each shard of a job has a journal of its own, so shards do not reset each other.
+
+    Args:
+        out_fs (fs): Output filesystem
+        resume (bool): Resume the previous job
+        shard (Shard): Shard of the job
+
+    Returns:
+        tuple: Journal and keys of tasks completed by the resumed job
+    """
+    name = SHARD_JOURNAL_NAME.format(shard.name) if shard else JOURNAL_NAME
+
+    journal = Journal(out_fs.getsyspath(unicode(name)))
+
+    completed = journal.get_completed() if resume else set()
+
+    journal.start(resume)
+
+    return (journal, completed)
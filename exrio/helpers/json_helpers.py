@@ -2,6 +2,7 @@
 
 # system
 import json
+import math
 
 def is_jsonable(value):
     """ Test if a value can be json serialized.
@@ -18,6 +19,20 @@ def is_jsonable(value):
     except:
         return False
 
+def encode_float(value):
+    """ Encode NaN and infinity as strings nan, inf and -inf, which JSON has no literals for.
+
+    Args:
+        value (mixed): Value
+
+    Returns:
+        mixed: String of non-finite floats, value otherwise
+    """
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return repr(value)
+
+    return value
+
 def filter_jsonable(value, callback=None):
     """ Filter input if it is not jsonable.
 
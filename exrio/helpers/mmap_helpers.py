@@ -0,0 +1,104 @@
+""" Memory map helpers module.
+
+Uncompressed scanline files store each scanline as y coordinate, data size and the pixels of all channels in alphabetical order. Such files are mapped into memory and channels are exposed as strided numpy views of that layout, so pixels are neither decoded nor copied. Pages are only read once they are touched and are shared by all processes mapping the same file.
+"""
+
+# system
+import mmap
+import struct
+
+# image manipulation
+import numpy
+
+# helpers
+from exrio.helpers.header_helpers import read_version, read_headers_with_offset, TILED_FLAG, NON_IMAGE_FLAG, MULTIPART_FLAG
+
+# little endian numpy data types per pixel type name
+MAPPED_DTYPES = {
+    'UINT': '<u4',
+    'HALF': '<f2',
+    'FLOAT': '<f4'
+}
+
+def is_mappable(header):
+    """ Test if channels of a scanline header can be viewed with constant strides.
+
+    Args:
+        header (dict): Header as read by read_headers
+
+    Returns:
+        bool
+    """
+    if header.get('compression') != 'NO_COMPRESSION':
+        return False
+
+    for channel in header['channels'].values():
+        if channel['type'] not in MAPPED_DTYPES or channel['xSampling'] != 1 or channel['ySampling'] != 1:
+            return False
+
+    return True
+
+def map_channels(in_path):
+    """ Map uncompressed scanline exr file and get views of its channels.
+
+    Args:
+        in_path (str): File to map
+
+    Returns:
+        dict: Channel name / read-only numpy array of rows and columns pairs or None if the file can not be mapped
+    """
+    try:
+        if read_version(in_path) & (TILED_FLAG | NON_IMAGE_FLAG | MULTIPART_FLAG):
+            return
+
+        headers, offset = read_headers_with_offset(in_path)
+    except Exception:
+        return
+
+    header = headers[0]
+
+    if not is_mappable(header):
+        return
+
+    data_window = header['dataWindow']
+
+    width = data_window['max']['x'] - data_window['min']['x'] + 1
+    height = data_window['max']['y'] - data_window['min']['y'] + 1
+
+    names = sorted(header['channels'].keys())
+
+    dtypes = [numpy.dtype(MAPPED_DTYPES[header['channels'][name]['type']]) for name in names]
+
+    # y coordinate and data size followed by pixels of all channels
+    chunk_size = 8 + sum(width * dtype.itemsize for dtype in dtypes)
+
+    with open(in_path, 'rb') as file_handle:
+        try:
+            mapped = mmap.mmap(file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, EnvironmentError):
+            return
+
+    if offset + height * 8 > len(mapped):
+        return
+
+    offsets = numpy.frombuffer(mapped, dtype='<u8', count=height, offset=offset)
+
+    first = int(offsets[0])
+
+    # scanlines must be stored in increasing order and back to back to be viewed with constant strides
+    if first + height * chunk_size > len(mapped) or struct.unpack_from('<i', mapped, first)[0] != data_window['min']['y']:
+        return
+
+    if not (offsets == first + numpy.arange(height, dtype=numpy.uint64) * chunk_size).all():
+        return
+
+    views = {}
+
+    channel_offset = first + 8
+
+    for name, dtype in zip(names, dtypes):
+        views[name] = numpy.ndarray((height, width), dtype=dtype, buffer=mapped, offset=channel_offset, strides=(chunk_size, dtype.itemsize))
+
+        channel_offset += width * dtype.itemsize
+
+    return views
@@ -4,16 +4,41 @@
 import os
 import time
 
-from multiprocessing import Pool
+from multiprocessing import Pool, cpu_count
 
 # exrio
 from exrio import console
 
+# job configuration of the current worker process, set once per worker by init_worker
+_worker_context = {}
+
+def init_worker(context):
+    """ Store job configuration in the worker, so tasks only carry what differs between them.
+
+    Args:
+        context (dict): Job configuration
+    """
+    _worker_context.clear()
+    _worker_context.update(context)
+
+def get_worker_context():
+    """ Get job configuration of the current worker.
+
+    Resources which are expensive to create may be stored in the context to reuse them across tasks.
+
+    Returns:
+        dict
+    """
+    return _worker_context
+
 def _task_worker(args):
     """ Run args if is callable.
 
     Args:
         args (list): Arguments
+
+    Returns:
+        mixed: Result of callback
     """
     if len(args) > 0:
         callback = args[0]
@@ -24,31 +49,80 @@ def _task_worker(args):
             callback_args = args[1:]
 
         if hasattr(callback, '__call__'):
-            callback(*callback_args)
+            return callback(*callback_args)
 
-def run(tasks, num_threads=None, multiprocessing=True):
-    """ Run tasks with num_threads if multiprocessing.
+def get_num_threads(num_threads=None):
+    """ Get number of threads, defaults to the number of available processors.
 
     Args:
-        tasks (list): Tasks to process
+        num_threads (int): Number of threads
+
+    Returns:
+        int
+    """
+    if num_threads:
+        return num_threads
+
+    return int(os.environ.get('NUMBER_OF_PROCESSORS', cpu_count()))
+
+def imap(tasks, num_threads=None, multiprocessing=True, context=None):
+    """ Run tasks with num_threads if multiprocessing and yield their results as they finish.
+
+    Tasks may be a generator, in which case tasks are consumed while they are produced. The context is sent to each worker once instead of with every task.
+
+    Args:
+        tasks (iterable): Tasks to process
         num_threads (int): Number of threads
         multiprocessing (bool): Use multiprocessing
+        context (dict): Job configuration available to tasks via get_worker_context
+
+    Returns:
+        generator: Results of tasks in order of completion
     """
-    if not num_threads:
-        num_threads = int(os.environ["NUMBER_OF_PROCESSORS"])
+    num_threads = get_num_threads(num_threads)
 
     # only spawn maxium of len(tasks) threads if num_threads larger than len(tasks)
-    if num_threads > len(tasks):
-        num_threads = len(tasks)
+    if isinstance(tasks, (list, tuple)):
+        num_threads = max(min(num_threads, len(tasks)), 1)
 
     console.debug('Number of threads for multiprocessing: {}'.format(num_threads))
 
     if multiprocessing:
         # run tasks in parallel
-        pool = Pool(processes=num_threads)
+        pool = Pool(processes=num_threads, initializer=init_worker, initargs=(context or {},))
+
+        try:
+            for result in pool.imap_unordered(_task_worker, tasks):
+                yield result
 
-        pool.map(_task_worker, tasks)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
     else:
+        init_worker(context or {})
+
         # run tasks in order
         for task in tasks:
-            _task_worker(task)
\ No newline at end of file
+            yield _task_worker(task)
+
+def run(tasks, num_threads=None, multiprocessing=True, context=None):
+    """ Run tasks with num_threads if multiprocessing.
+
+    Tasks may be a generator, in which case tasks are consumed while they are produced.
+
+    Args:
+        tasks (iterable): Tasks to process
+        num_threads (int): Number of threads
+        multiprocessing (bool): Use multiprocessing
+        context (dict): Job configuration available to tasks via get_worker_context
+
+    Returns:
+        int: Number of processed tasks
+    """
+    count = 0
+
+    for result in imap(tasks, num_threads, multiprocessing, context):
+        count += 1
+
+    return count
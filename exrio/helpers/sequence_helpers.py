@@ -0,0 +1,294 @@
+""" Sequence helpers module. """
+
+# system
+import os
+import re
+
+from array import array
+
+# minimum number of digits of frame numbers, shorter numbers are part of the name
+MIN_PADDING = 3
+
+# file name split into head, frame number and extension, e.g. shot_beauty.1001.exr, the frame number follows a separator so versions like comp_v002.exr are not frames
+SEQUENCE_PATTERN = r'^(?P<head>(?:.*?[._])?)(?P<frame>\d{{{},}})(?P<tail>\.[a-z]+)$'.format(MIN_PADDING)
+
+# single frame or frame range with optional step, e.g. 1001-1100x2
+FRAME_RANGE_PATTERN = r'^(?P<start>-?\d+)(?:-(?P<end>-?\d+)(?:x(?P<step>\d+))?)?$'
+
+def split_frame(name):
+    """ Split file name into head, frame number, padding and tail.
+
+    Args:
+        name (str): File name
+
+    Returns:
+        tuple: Head, frame number, padding and tail or None if the file name has no frame number
+    """
+    matches = re.search(SEQUENCE_PATTERN, name, flags=re.IGNORECASE)
+
+    if matches:
+        return (matches.group('head'), int(matches.group('frame')), len(matches.group('frame')), matches.group('tail'))
+
+def compact_frames(frames):
+    """ Compact frame numbers into ranges of consecutive frames.
+
+    Args:
+        frames (iterable): Frame numbers
+
+    Returns:
+        list: First and last frame (inclusive) of each range
+    """
+    ranges = []
+
+    for frame in sorted(set(frames)):
+        if ranges and ranges[-1][1] == frame - 1:
+            ranges[-1] = (ranges[-1][0], frame)
+        else:
+            ranges.append((frame, frame))
+
+    return ranges
+
+def format_ranges(ranges):
+    """ Format ranges of frames, e.g. 1001-1049,1053-1100.
+
+    Args:
+        ranges (list): First and last frame of each range
+
+    Returns:
+        str
+    """
+    return ','.join(str(start) if start == end else '{}-{}'.format(start, end) for start, end in ranges)
+
+class FrameRange(object):
+    """ Selection of frames, parsed from e.g. 1001-1100x2,1200. """
+
+    def __init__(self, ranges):
+        """ Create frame range.
+
+        Args:
+            ranges (list): First frame, last frame (inclusive) and step of each range
+        """
+        self.ranges = ranges
+
+    @classmethod
+    def parse(cls, value):
+        """ Parse frame range.
+
+        Args:
+            value (str): Comma separated frames or ranges, e.g. 1001-1100x2,1200
+
+        Returns:
+            FrameRange
+
+        Raises:
+            ValueError
+        """
+        ranges = []
+
+        for part in value.replace(' ', '').split(','):
+            matches = re.search(FRAME_RANGE_PATTERN, part)
+
+            if not matches:
+                raise ValueError('Invalid frame range {}.'.format(part))
+
+            start = int(matches.group('start'))
+            end = int(matches.group('end')) if matches.group('end') else start
+            step = int(matches.group('step')) if matches.group('step') else 1
+
+            if end < start or step < 1:
+                raise ValueError('Invalid frame range {}.'.format(part))
+
+            ranges.append((start, end, step))
+
+        return cls(ranges)
+
+    def __contains__(self, frame):
+        for start, end, step in self.ranges:
+            if start <= frame <= end and (frame - start) % step == 0:
+                return True
+
+        return False
+
+    def __repr__(self):
+        return ','.join('{}-{}x{}'.format(start, end, step) for start, end, step in self.ranges)
+
+    def get_frames(self, first, last):
+        """ Get selected frames between first and last frame.
+
+        Args:
+            first (int): First frame
+            last (int): Last frame (inclusive)
+
+        Returns:
+            set
+        """
+        frames = set()
+
+        for start, end, step in self.ranges:
+            # first frame of the range at or after first
+            start += max(0, -(-(first - start) // step)) * step
+
+            frames.update(xrange(start, min(end, last) + 1, step))
+
+        return frames
+
+    def contains_name(self, name):
+        """ Test if the frame number of a file name is selected.
+
+        Args:
+            name (str): File name
+
+        Returns:
+            bool
+        """
+        parts = split_frame(name)
+
+        return parts is not None and parts[1] in self
+
+class Sequence(object):
+    """ Frame sequence of a directory, stored as pattern and frame numbers. """
+
+    def __init__(self, directory, head, padding, tail, frame_range=None):
+        """ Create sequence.
+
+        Args:
+            directory (str): Directory of sequence
+            head (str): File name in front of the frame number
+            padding (int): Number of digits of the frame number
+            tail (str): File name after the frame number
+            frame_range (FrameRange): Frames the sequence was selected with, only these can be missing
+        """
+        self.directory = directory
+        self.head = head
+        self.padding = padding
+        self.tail = tail
+        self.frame_range = frame_range
+
+        # frame numbers are stored as machine integers instead of one file name per frame
+        self.frames = array('l')
+
+    @property
+    def pattern(self):
+        """ Get pattern of sequence, e.g. shot_beauty.####.exr.
+
+        Returns:
+            str
+        """
+        return self.head + '#' * self.padding + self.tail
+
+    def get_path(self, frame):
+        """ Get path of frame.
+
+        Args:
+            frame (int): Frame number
+
+        Returns:
+            str
+        """
+        return os.path.join(self.directory, '{head}{frame:0{padding}d}{tail}'.format(head=self.head, frame=frame, padding=self.padding, tail=self.tail))
+
+    def get_ranges(self):
+        """ Get ranges of consecutive frames.
+
+        Returns:
+            list
+        """
+        return compact_frames(self.frames)
+
+    def get_missing(self):
+        """ Get ranges of missing frames between first and last frame, frames skipped by the frame range are not missing.
+
+        Returns:
+            list
+        """
+        ranges = self.get_ranges()
+
+        gaps = [(previous_end + 1, start - 1) for (previous_start, previous_end), (start, end) in zip(ranges, ranges[1:])]
+
+        if self.frame_range is None:
+            return gaps
+
+        return compact_frames(frame for first, last in gaps for frame in self.frame_range.get_frames(first, last))
+
+    def summary(self):
+        """ Get summary of sequence.
+
+        Returns:
+            dict
+        """
+        ranges = self.get_ranges()
+
+        return {
+            'directory': self.directory,
+            'pattern': self.pattern,
+            'first': ranges[0][0] if ranges else None,
+            'last': ranges[-1][1] if ranges else None,
+            'count': len(set(self.frames)) if self.padding else 1,
+            'frames': format_ranges(ranges),
+            'missing': format_ranges(self.get_missing())
+        }
+
+class SequenceCollector(object):
+    """ Collector grouping file paths into sequences one path at a time. """
+
+    def __init__(self, frame_range=None):
+        """ Create empty collector.
+
+        Args:
+            frame_range (FrameRange): Frames the paths were selected with
+        """
+        self.frame_range = frame_range
+        self.sequences = {}
+
+    def add(self, path):
+        """ Add file path to its sequence.
+
+        Files without frame number are added as sequences with a single frame and no padding.
+
+        Args:
+            path (str): File path
+        """
+        directory, name = os.path.split(path)
+
+        parts = split_frame(name)
+
+        if parts is None:
+            self.sequences.setdefault((directory, name, 0, ''), Sequence(directory, name, 0, ''))
+
+            return
+
+        head, frame, padding, tail = parts
+
+        key = (directory, head, padding, tail)
+
+        if not key in self.sequences:
+            self.sequences[key] = Sequence(directory, head, padding, tail, self.frame_range)
+
+        self.sequences[key].frames.append(frame)
+
+    def get_sequences(self):
+        """ Get collected sequences.
+
+        Returns:
+            list: Sequences sorted by directory and pattern
+        """
+        return [self.sequences[key] for key in sorted(self.sequences.keys())]
+
+def collect_sequences(paths, frame_range=None):
+    """ Group file paths into sequences.
+
+    Files without frame number are returned as sequences with a single frame and no padding.
+
+    Args:
+        paths (iterable): File paths
+        frame_range (FrameRange): Frames the paths were selected with
+
+    Returns:
+        list: Sequences sorted by directory and pattern
+    """
+    collector = SequenceCollector(frame_range)
+
+    for path in paths:
+        collector.add(path)
+
+    return collector.get_sequences()
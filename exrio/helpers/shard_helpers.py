@@ -0,0 +1,195 @@
+""" Shard helpers module. """
+
+# system
+import heapq
+import json
+import os
+import re
+import time
+
+from multiprocessing.pool import ThreadPool
+
+# helpers
+from exrio.helpers.fs_helpers import atomic_path
+from exrio.helpers.multiprocessing_helpers import get_num_threads
+
+# shard of a job, e.g. 3/20
+SHARD_PATTERN = r'^(?P<index>\d+)/(?P<count>\d+)$'
+
+# name of the manifest each shard writes to the output directory
+MANIFEST_NAME = '.exrio_manifest.{}.json'
+
+# manifest names of all shards
+MANIFEST_PATTERN = r'^\.exrio_manifest\.(?P<index>\d+)of(?P<count>\d+)\.json$'
+
+# state of items which were assigned to a shard but never started
+PENDING = 'pending'
+
+def get_size(path):
+    """ Get size of file, missing files have no size.
+
+    Args:
+        path (str): File path
+
+    Returns:
+        int
+    """
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+class Shard(object):
+    """ Deterministic part of a job, parsed from e.g. 3/20.
+
+    Every shard partitions the same items the same way without coordination. Items are assigned largest first to the shard with the least bytes, so shards finish at about the same time.
+    """
+
+    def __init__(self, index, count, job=None):
+        """ Create shard.
+
+        Args:
+            index (int): Index of shard, starting at 1
+            count (int): Number of shards
+            job (str): Identifier of the job shared by all of its shards
+        """
+        self.index = index
+        self.count = count
+        self.job = job
+
+        # bytes of items assigned to this shard by select
+        self.bytes = 0
+
+    @classmethod
+    def parse(cls, value):
+        """ Parse shard.
+
+        Args:
+            value (str): Index and number of shards, e.g. 3/20
+
+        Returns:
+            Shard
+
+        Raises:
+            ValueError
+        """
+        matches = re.search(SHARD_PATTERN, value.replace(' ', ''))
+
+        if not matches:
+            raise ValueError('Invalid shard {}.'.format(value))
+
+        index = int(matches.group('index'))
+        count = int(matches.group('count'))
+
+        if not 1 <= index <= count:
+            raise ValueError('Invalid shard {}, index must be between 1 and {}.'.format(value, count))
+
+        return cls(index, count)
+
+    def __repr__(self):
+        return '{}/{}'.format(self.index, self.count)
+
+    @property
+    def name(self):
+        """ Get name of shard used in file names, e.g. 3of20.
+
+        Returns:
+            str
+        """
+        return '{}of{}'.format(self.index, self.count)
+
+    def select(self, items, get_paths=None, num_threads=None):
+        """ Select items of this shard, balanced by the size of their files.
+
+        Items are ordered by size and path, which is the same on every node as long as all paths share the same root.
+
+        Args:
+            items (iterable): File paths or tasks
+            get_paths (callable): Get list of file paths of an item, the item is a file path by default
+            num_threads (int): Number of threads reading file sizes
+
+        Returns:
+            list: Items of this shard, largest first
+        """
+        items = list(items)
+
+        paths = [get_paths(item) if get_paths else [item] for item in items]
+
+        all_paths = [path for item_paths in paths for path in item_paths]
+
+        pool = ThreadPool(processes=get_num_threads(num_threads))
+
+        try:
+            # stat calls are latency bound on network filesystems
+            sizes = dict(zip(all_paths, pool.map(get_size, all_paths)))
+        finally:
+            pool.terminate()
+
+        item_sizes = [sum(sizes[path] for path in item_paths) for item_paths in paths]
+
+        order = sorted(xrange(len(items)), key=lambda item_index: (-item_sizes[item_index], paths[item_index]))
+
+        # bytes and index of each shard, ties go to the lower index
+        loads = [(0, index) for index in xrange(1, self.count + 1)]
+
+        selected = []
+
+        for item_index in order:
+            load, index = heapq.heappop(loads)
+
+            if index == self.index:
+                selected.append(items[item_index])
+
+                self.bytes = load + item_sizes[item_index]
+
+            heapq.heappush(loads, (load + item_sizes[item_index], index))
+
+        return selected
+
+def write_manifest(out_fs, shard, journal, keys):
+    """ Write manifest with the state of each item of the shard to the output directory.
+
+    Args:
+        out_fs (fs): Output filesystem
+        shard (Shard): Shard
+        journal (Journal): Journal of the shard
+        keys (list): Task keys of the items of the shard
+    """
+    states = journal.get_states()
+
+    manifest = {
+        'job': shard.job,
+        'time': time.time(),
+        'shard': shard.index,
+        'count': shard.count,
+        'bytes': shard.bytes,
+        'items': {key: states.get(key, PENDING) for key in keys}
+    }
+
+    with atomic_path(out_fs.getsyspath(unicode(MANIFEST_NAME.format(shard.name)))) as temp_path:
+        with open(temp_path, 'w') as file_handle:
+            file_handle.write(json.dumps(manifest, indent=2, sort_keys=True))
+
+def read_manifests(out_fs):
+    """ Read manifests of all shards in the output directory.
+
+    Args:
+        out_fs (fs): Output filesystem
+
+    Returns:
+        list: Manifests sorted by time of writing
+    """
+    manifests = []
+
+    for name in sorted(out_fs.listdir(u'/')):
+        if not re.search(MANIFEST_PATTERN, name):
+            continue
+
+        with out_fs.open(name) as file_handle:
+            try:
+                manifests.append(json.loads(file_handle.read()))
+            except ValueError:
+                continue
+
+    # manifests written before jobs were recorded are older than all others
+    return sorted(manifests, key=lambda manifest: (manifest.get('time', 0), manifest['count'], manifest['shard']))
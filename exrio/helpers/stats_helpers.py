@@ -0,0 +1,142 @@
+""" Stats helpers module. """
+
+# system
+from multiprocessing.pool import ThreadPool
+
+# image manipulation
+import OpenEXR
+import numpy
+
+# helpers
+from exrio.helpers.exr_helpers import BAND_HEIGHT, get_dtype, iter_bands, imap_bands
+from exrio.helpers.mmap_helpers import map_channels
+
+class ChannelStats(object):
+    """ Accumulate pixel statistics of a channel band by band. """
+
+    def __init__(self):
+        self.count = 0
+        self.finite = 0
+        self.nan = 0
+        self.inf = 0
+        self.zero = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def update(self, pixels):
+        """ Add band of pixels.
+
+        Args:
+            pixels (numpy.ndarray): Pixels of band
+        """
+        if not pixels.size:
+            return
+
+        pixels = pixels.astype(numpy.float64)
+
+        nan_mask = numpy.isnan(pixels)
+        inf_mask = numpy.isinf(pixels)
+
+        finite = pixels[~(nan_mask | inf_mask)]
+
+        self.count += pixels.size
+        self.nan += int(nan_mask.sum())
+        self.inf += int(inf_mask.sum())
+        self.zero += int((pixels == 0).sum())
+
+        if finite.size:
+            self.finite += finite.size
+            self.total += float(finite.sum())
+
+            band_minimum = float(finite.min())
+            band_maximum = float(finite.max())
+
+            self.minimum = band_minimum if self.minimum is None else min(self.minimum, band_minimum)
+            self.maximum = band_maximum if self.maximum is None else max(self.maximum, band_maximum)
+
+    def to_dict(self):
+        """ Get statistics, minimum, maximum and mean are computed of finite pixels.
+
+        Returns:
+            dict
+        """
+        return {
+            'min': self.minimum,
+            'max': self.maximum,
+            'mean': self.total / self.finite if self.finite else None,
+            'nan': self.nan,
+            'inf': self.inf,
+            'zero_percent': 100.0 * self.zero / self.count if self.count else None,
+            'count': self.count
+        }
+
+def get_array_stats(pixels, band_height=BAND_HEIGHT):
+    """ Compute statistics of a channel array in bands of rows, which bounds the size of temporary arrays.
+
+    Args:
+        pixels (numpy.ndarray): Pixels of channel as rows and columns
+        band_height (int): Number of rows per band
+
+    Returns:
+        dict
+    """
+    stats = ChannelStats()
+
+    for y_start in xrange(0, pixels.shape[0], band_height):
+        stats.update(pixels[y_start:y_start + band_height])
+
+    return stats.to_dict()
+
+def compute_stats(in_path, channels=None, num_threads=1):
+    """ Compute statistics of channels in bands of scanlines.
+
+    Each band is decoded once for all channels, up to num_threads bands in parallel. Views of uncompressed files are processed channel by channel in parallel threads instead.
+
+    Args:
+        in_path (str): File to read
+        channels (list): Names of channels, all channels by default
+        num_threads (int): Number of threads
+
+    Returns:
+        dict: Channel name / statistics pairs
+    """
+    header = OpenEXR.InputFile(in_path).header()
+
+    if channels is None:
+        channels = header['channels'].keys()
+
+    # views of uncompressed files read only the pages of the channel instead of decoding whole scanlines
+    views = map_channels(in_path)
+
+    if views is None:
+        stats = {channel_name: ChannelStats() for channel_name in channels}
+
+        pixel_types = {channel_name: header['channels'][channel_name].type for channel_name in channels}
+
+        for band, channel_data in imap_bands(in_path, pixel_types, iter_bands(header), num_threads):
+            for channel_name, data in channel_data.iteritems():
+                stats[channel_name].update(numpy.frombuffer(data, dtype=get_dtype(pixel_types[channel_name])))
+
+        return {channel_name: channel_stats.to_dict() for channel_name, channel_stats in stats.iteritems()}
+
+    def channel_stats(channel_name):
+        """ Compute statistics of single channel of the views.
+
+        Args:
+            channel_name (str): Channel name
+
+        Returns:
+            tuple
+        """
+        return (channel_name, get_array_stats(views[channel_name]))
+
+    if not num_threads or num_threads < 2 or len(channels) < 2:
+        return dict(channel_stats(channel_name) for channel_name in channels)
+
+    pool = ThreadPool(processes=min(num_threads, len(channels)))
+
+    try:
+        return dict(pool.map(channel_stats, channels))
+    finally:
+        pool.terminate()
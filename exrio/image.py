@@ -0,0 +1,277 @@
+""" EXR image module. """
+
+# system
+import copy
+import os
+
+# image manipulation
+import OpenEXR
+import numpy
+
+# exceptions
+from exrio.exrio_exceptions import NoExrFileException
+
+# helpers
+from exrio.helpers.exr_helpers import get_dtype, get_size, get_scanline_header, convert_pixels
+from exrio.helpers.header_helpers import assure_readable_part
+from exrio.helpers.stats_helpers import get_array_stats
+from exrio.helpers.mmap_helpers import map_channels
+from exrio.helpers.fs_helpers import output_path
+from exrio.helpers.exposure_helpers import DEFAULT_SAMPLE_RATE, DEFAULT_PERCENTILES
+from exrio.helpers.color_helpers import DEFAULT_VIEW, DEFAULT_TONE
+
+# exrio
+from exrio.rechannel import compile_layer_map, match_layers, convert_band
+from exrio.preview import get_preview_channels, render_preview
+
+class ExrImage(object):
+    """ EXR file with lazily decoded channels for use as a library.
+
+    The header is parsed on open. Channels are decoded on first access and cached until they are released. Pixels are exposed as read-only numpy arrays and memoryviews of the decoded buffers without copying them. Channels of uncompressed scanline files are views of the memory mapped file instead.
+    """
+
+    __slots__ = ['path', 'header', '_exr_file', '_views', '_buffers']
+
+    def __init__(self, path, part=None):
+        """ Open exr file and parse its header.
+
+        Args:
+            path (str): File to read
+            part (mixed): Index or name of part to read
+
+        Raises:
+            NoExrFileException
+            NoPartException
+            UnsupportedPartException
+        """
+        if not OpenEXR.isOpenExrFile(path):
+            raise NoExrFileException(path)
+
+        assure_readable_part(path, part)
+
+        self.path = path
+
+        self._exr_file = OpenEXR.InputFile(path)
+
+        self.header = self._exr_file.header()
+
+        # channel name / view pairs of uncompressed files
+        self._views = map_channels(path)
+
+        # channel name / decoded raw pixel data or view pairs
+        self._buffers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return 'ExrImage({}, {} channels, {} cached)'.format(os.path.basename(self.path), len(self.header['channels']), len(self._buffers))
+
+    @property
+    def size(self):
+        """ Get width and height of the data window.
+
+        Returns:
+            tuple
+        """
+        return get_size(self.header)
+
+    @property
+    def channel_names(self):
+        """ Get sorted names of channels.
+
+        Returns:
+            list
+        """
+        return sorted(self.header['channels'].keys())
+
+    def get_pixel_type(self, name):
+        """ Get pixel type of channel.
+
+        Args:
+            name (str): Channel name
+
+        Returns:
+            Imath.PixelType
+
+        Raises:
+            KeyError
+        """
+        return self.header['channels'][name].type
+
+    def get_shape(self, name):
+        """ Get number of rows and columns of channel, taking subsampling into account.
+
+        Args:
+            name (str): Channel name
+
+        Returns:
+            tuple
+        """
+        channel = self.header['channels'][name]
+
+        width, height = self.size
+
+        return (height // channel.ySampling, width // channel.xSampling)
+
+    def _get_data(self, name):
+        """ Get raw pixel data of channel, decoding it on first access.
+
+        Args:
+            name (str): Channel name
+
+        Returns:
+            mixed: Raw pixel data or numpy view of mapped file
+        """
+        if not name in self._buffers:
+            if self._exr_file is None:
+                raise ValueError('{} is closed.'.format(self.path))
+
+            if self._views is not None:
+                self._buffers[name] = self._views[name]
+            else:
+                self._buffers[name] = self._exr_file.channel(name, self.get_pixel_type(name))
+
+        return self._buffers[name]
+
+    def _get_bytes(self, name, pixel_type=None):
+        """ Get contiguous raw pixel data of channel as needed for writing.
+
+        Args:
+            name (str): Channel name
+            pixel_type (Imath.PixelType): Pixel type to convert to, pixel type of channel by default
+
+        Returns:
+            str
+        """
+        data = self._get_data(name)
+
+        if pixel_type is None:
+            pixel_type = self.get_pixel_type(name)
+
+        if isinstance(data, numpy.ndarray):
+            return numpy.ascontiguousarray(data, dtype=get_dtype(pixel_type)).tostring()
+
+        return convert_pixels(data, self.get_pixel_type(name), pixel_type)
+
+    def buffer(self, name):
+        """ Get raw pixel data of channel as memoryview without copying.
+
+        Args:
+            name (str): Channel name
+
+        Returns:
+            memoryview
+        """
+        return memoryview(self._get_data(name))
+
+    def channel(self, name):
+        """ Get pixels of channel as read-only numpy array of rows and columns without copying.
+
+        Args:
+            name (str): Channel name
+
+        Returns:
+            numpy.ndarray
+        """
+        data = self._get_data(name)
+
+        if isinstance(data, numpy.ndarray):
+            return data
+
+        return numpy.frombuffer(data, dtype=get_dtype(self.get_pixel_type(name))).reshape(self.get_shape(name))
+
+    def is_cached(self, name):
+        """ Test if channel is decoded.
+
+        Args:
+            name (str): Channel name
+
+        Returns:
+            bool
+        """
+        return name in self._buffers
+
+    def release(self, names=None):
+        """ Release decoded channels, arrays and memoryviews handed out keep their data alive.
+
+        Args:
+            names (list): Names of channels to release, all channels by default
+        """
+        if names is None:
+            self._buffers.clear()
+
+            return
+
+        for name in names:
+            self._buffers.pop(name, None)
+
+    def close(self):
+        """ Release decoded channels and close the exr file. """
+        self.release()
+
+        # the mapping is unmapped once the last view handed out is gone
+        self._views = None
+
+        if self._exr_file is not None:
+            self._exr_file.close()
+
+            self._exr_file = None
+
+    def rename(self, out, layer_map=None, half=False, half_exclude=None):
+        """ Write channels renamed via regular expressions of layer_map.
+
+        Args:
+            out (mixed): Path or file-like object to write
+            layer_map (dict): Regular expression / replacement name pairs
+            half (bool): Convert float channels to half
+            half_exclude (list): Regular expressions of channels to keep at full precision
+        """
+        # create new copy from header, tiled and multipart files are written as scanline files
+        out_exr_header = copy.deepcopy(get_scanline_header(self.header))
+
+        out_exr_header['channels'], matched_layers, out_layers = match_layers(self.header, compile_layer_map(layer_map or {}), half, half_exclude)
+
+        channel_data = {layer_name: self._get_bytes(layer_name) for layer_name in matched_layers.keys()}
+
+        with output_path(out, '.exr') as temp_path:
+            out_exr_file = OpenEXR.OutputFile(temp_path, out_exr_header)
+
+            if matched_layers:
+                out_exr_file.writePixels(convert_band(matched_layers, channel_data))
+
+            out_exr_file.close()
+
+    def preview(self, out, layer=None, format='JPEG', sample_rate=DEFAULT_SAMPLE_RATE, percentiles=DEFAULT_PERCENTILES, view=DEFAULT_VIEW, tone=DEFAULT_TONE, exposure=0.0):
+        """ Write preview by mapping the exposure range or a display view to 8bit.
+
+        Args:
+            out (mixed): Path or file-like object to write
+            layer (str): Regular expression selecting the channels to preview
+            format (str): Image format
+            sample_rate (float): Fraction of bands of scanlines sampled to estimate the exposure range
+            percentiles (tuple): Percentiles of pixel values mapped to black and white
+            view (str): raw maps the exposure range to 8bit, linear, srgb and rec709 are display views of scene linear pixels
+            tone (str): Tone curve of display views
+            exposure (float): Exposure adjustment in stops
+        """
+        channel_pixels = [self.channel(name) for name in get_preview_channels(self.header, layer)]
+
+        image = render_preview(channel_pixels, self.size, sample_rate, percentiles, view, tone, exposure)
+
+        with output_path(out) as temp_path:
+            image.save(temp_path, format)
+
+    def stats(self, names=None):
+        """ Compute statistics of channels.
+
+        Args:
+            names (list): Names of channels, all channels by default
+
+        Returns:
+            dict: Channel name / statistics pairs
+        """
+        return {name: get_array_stats(self.channel(name)) for name in names or self.channel_names}
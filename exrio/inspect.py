@@ -12,13 +12,19 @@ from exrio.exrio_exceptions import NoExrFileException, SameFileException
 
 # helpers
 from exrio.helpers.json_helpers import is_jsonable, filter_jsonable
-from exrio.helpers.multiprocessing_helpers import run
+from exrio.helpers.multiprocessing_helpers import run, imap, get_num_threads
+from exrio.helpers.discovery_helpers import discover_fs
+from exrio.helpers.header_helpers import is_multipart, read_headers
+from exrio.helpers.sequence_helpers import collect_sequences
+from exrio.helpers.stats_helpers import compute_stats
 
-def inspect_file(in_path):
+def inspect_file(in_path, stats=False, num_threads=1):
     """ TODO: add docstring.
 
     Args:
         in_path (str): File to read
+        stats (bool): Compute pixel statistics per channel
+        num_threads (int): Number of threads computing statistics of channels
 
     Raises:
         NoExrFileException
@@ -28,9 +34,57 @@ def inspect_file(in_path):
     # start time
     time_start = time.time()
 
+    print json.dumps(get_inspection(in_path, stats, num_threads), indent=4)
+
+    # stop time
+    time_stop = time.time()
+
+    # duration
+    duration = round(time_stop - time_start)
+
+    print 'Finished inspect for {in_path} ({duration}s).'.format(in_path=in_path, duration=duration)
+
+def get_inspection(in_path, stats=False, num_threads=1):
+    """ Get header and optionally pixel statistics of exr file.
+
+    Args:
+        in_path (str): File to read
+        stats (bool): Compute pixel statistics per channel
+        num_threads (int): Number of threads computing statistics of channels
+
+    Returns:
+        dict: Header or file, header and stats if stats
+
+    Raises:
+        NoExrFileException
+    """
     if not OpenEXR.isOpenExrFile(in_path):
         raise NoExrFileException(in_path)
 
+    header = get_header(in_path)
+
+    if not stats:
+        return header
+
+    return {
+        'file': in_path,
+        'header': header,
+        'stats': compute_stats(in_path, num_threads=num_threads)
+    }
+
+def get_header(in_path):
+    """ Get jsonable header of exr file.
+
+    Args:
+        in_path (str): File to read
+
+    Returns:
+        dict: Header or headers of all parts of multipart files
+    """
+    if is_multipart(in_path):
+        # the OpenEXR bindings only expose the first part, read the headers of all parts directly
+        return {'parts': read_headers(in_path)}
+
     # open exr file
     in_exr_file = OpenEXR.InputFile(in_path)
 
@@ -51,43 +105,105 @@ def inspect_file(in_path):
         # if isinstance(value, Imath.Box2i):
         return repr(value)
 
-    print json.dumps(filter_jsonable(in_exr_header, catch_value), indent=4)
+    return filter_jsonable(in_exr_header, catch_value)
 
-    # stop time
-    time_stop = time.time()
+def inspect_files(files, num_threads=None, multiprocessing=True, **kwargs):
+    """ TODO: add docstring.
 
-    # duration
-    duration = round(time_stop - time_start)
+    Args:
+        files (iterable): Exr files
+        num_threads (int): Number of threads to use for statistics
+        multiprocessing (bool): Use multiprocessing for statistics
+    """
+    if kwargs.get('stats'):
+        return inspect_stats_files(files, num_threads, multiprocessing)
 
-    print 'Finished inspect for {in_path} ({duration}s).'.format(in_path=in_path, duration=duration)
+    print 'Started inspect of files.'
 
-def inspect_files(files):
-    """ TODO: add docstring.
+    def iter_tasks():
+        """ Create inspect tasks while files are discovered.
+
+        Returns:
+            generator
+        """
+        for file_path in files:
+            yield (inspect_file, file_path)
+
+    count = run(iter_tasks(), None, False)
+
+    print 'Finished inspect of {} files.'.format(count)
+
+def inspect_stats_files(files, num_threads=None, multiprocessing=True):
+    """ Inspect headers and pixel statistics of files in the worker pool, printing results as they finish.
 
     Args:
-        files (list): List of exr files
+        files (iterable): Exr files
+        num_threads (int): Number of threads to use
+        multiprocessing (bool): Use multiprocessing
     """
-    print 'Started inspect of {} files.'.format(len(files))
+    print 'Started inspect of files with statistics.'
+
+    # compute channels in threads only if files are not processed in parallel already
+    channel_threads = 1 if multiprocessing else get_num_threads(num_threads)
+
+    def iter_tasks():
+        """ Create inspect tasks while files are discovered.
 
-    tasks = []
+        Returns:
+            generator
+        """
+        for file_path in files:
+            yield (get_inspection, file_path, True, channel_threads)
+
+    count = 0
+
+    for inspection in imap(iter_tasks(), num_threads, multiprocessing):
+        print json.dumps(inspection, indent=4)
+
+        count += 1
+
+    print 'Finished inspect of {} files.'.format(count)
+
+def inspect_sequences(sequences):
+    """ Print summaries of frame sequences, including frame ranges and missing frames.
 
-    for file_path in files:
-        tasks.append((inspect_file, file_path))
+    Args:
+        sequences (list): Sequences
+    """
+    print 'Started inspect of sequences.'
 
-    run(tasks, None, False)
+    summaries = [sequence.summary() for sequence in sorted(sequences, key=lambda sequence: (sequence.directory, sequence.head, sequence.padding, sequence.tail))]
 
-    print 'Finished inspect of {} files.'.format(len(files))
+    print json.dumps(summaries, indent=4)
 
-def inspect_dir(in_fs):
+    print 'Finished inspect of {} sequences.'.format(len(summaries))
+
+def inspect_dir(in_fs, num_threads=None, multithreading=True, **kwargs):
     """ TODO: add docstring.
 
     Args:
         in_fs (fs): Input filesystem
+        num_threads (int): Number of threads to use
+        multithreading (bool): Use multithreading
     """
 
-    files = []
+    # discovered files are grouped into sequences only if they are summarized, the sequences of a shard only contain its files
+    sequences = [] if kwargs.get('sequences') and not kwargs.get('shard') else None
+
+    files = discover_fs(in_fs, kwargs.get('include'), kwargs.get('exclude'), kwargs.get('max_depth'), frames=kwargs.get('frames'), sequences=sequences)
+
+    # select files of this shard, balanced by file size
+    if kwargs.get('shard'):
+        files = kwargs['shard'].select(files)
+
+        if kwargs.get('sequences'):
+            return inspect_sequences(collect_sequences(files, kwargs.get('frames')))
+
+    if kwargs.get('sequences'):
+        # complete discovery
+        for file_path in files:
+            pass
 
-    for file_name in in_fs.walk.files(filter=['*.exr']):
-        files.append(in_fs.getsyspath(file_name))
+        return inspect_sequences(sequences)
 
-    return inspect_files(files)
\ No newline at end of file
+    return inspect_files(files, num_threads, multithreading, **kwargs)
\ No newline at end of file
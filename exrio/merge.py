@@ -0,0 +1,340 @@
+""" Merge exr module. """
+
+# system
+import copy
+import os
+import time
+
+# exr
+import OpenEXR
+
+# exceptions
+from exrio.exrio_exceptions import NoExrFileException, SameFileException
+
+# helpers
+from exrio.helpers.multiprocessing_helpers import run, get_worker_context
+from exrio.helpers.journal_helpers import open_journal, run_journaled, FAILED
+from exrio.helpers.shard_helpers import write_manifest
+from exrio.helpers.discovery_helpers import discover_fs
+from exrio.helpers.exr_helpers import get_scanline_header, iter_bands
+from exrio.helpers.header_helpers import read_headers, assure_readable_part
+from exrio.helpers.fs_helpers import atomic_path
+from exrio.helpers.sequence_helpers import split_frame
+
+# exrio
+from exrio.rechannel import compile_layer_map, compile_half_exclude, match_layers, convert_band
+from exrio import console
+
+# methods
+
+def get_frame(path):
+    """ Get frame number and its padding of file name.
+
+    Args:
+        path (str): File path
+
+    Returns:
+        tuple: Frame number and padding or None if the file name has no frame number
+    """
+    parts = split_frame(os.path.basename(path))
+
+    if parts:
+        head, frame, padding, tail = parts
+
+        return (frame, padding)
+
+def get_source_name(root):
+    """ Get name of source from its directory.
+
+    Args:
+        root (str): Directory of source
+
+    Returns:
+        str
+    """
+    return os.path.basename(os.path.normpath(root))
+
+def merge_file(in_paths, out_path, layer_map=None, half=False, half_exclude=None, qualify=False, source_names=None):
+    """ Merge channels of exr files at in_paths into one exr file at out_path, streaming bands of scanlines.
+
+    Channels of every source are renamed by layer_map. If the same output channel is produced by several sources, the first source wins.
+
+    Args:
+        in_paths (list): Files to read
+        out_path (str): File to write
+        layer_map (dict): Regular expression / replacement name pairs
+        half (bool): Convert float channels to half
+        half_exclude (list): Regular expressions of channels to keep at full precision
+        qualify (bool): Prefix channel names with the source name before matching
+        source_names (list): Name of the source of each file, the parent directory of each file by default
+
+    Raises:
+        NoExrFileException
+        SameFileException
+        UnsupportedPartException
+    """
+    console.info('Started merge of {count} files into {out_path}.'.format(count=len(in_paths), out_path=os.path.basename(out_path)))
+
+    if out_path in in_paths:
+        raise SameFileException(out_path)
+
+    # start time
+    time_start = time.time()
+
+    if not layer_map:
+        layer_map = {}
+
+    rules = compile_layer_map(layer_map)
+
+    half_exclude = compile_half_exclude(half_exclude)
+
+    out_exr_header = None
+
+    # source tuples of input file, qualified / input channel name pairs and matched layers
+    sources = []
+
+    for source_index, in_path in enumerate(in_paths):
+        if not OpenEXR.isOpenExrFile(in_path):
+            raise NoExrFileException(in_path)
+
+        assure_readable_part(in_path, None, True)
+
+        in_exr_file = OpenEXR.InputFile(in_path)
+
+        in_exr_header = in_exr_file.header()
+
+        # header of first source is used for the merged file
+        if out_exr_header is None:
+            out_exr_header = copy.deepcopy(get_scanline_header(in_exr_header))
+
+            out_exr_header['channels'] = {}
+
+        # qualified channel name / input channel name pairs
+        names = {}
+
+        source_name = source_names[source_index] if source_names else get_source_name(os.path.dirname(in_path))
+
+        for layer_name in in_exr_header['channels'].keys():
+            if qualify:
+                names[source_name + '.' + layer_name] = layer_name
+            else:
+                names[layer_name] = layer_name
+
+        qualified_header = {'channels': {qualified_name: in_exr_header['channels'][layer_name] for qualified_name, layer_name in names.iteritems()}}
+
+        out_channels, matched_layers, out_layers = match_layers(qualified_header, rules, half, half_exclude)
+
+        # skip output channels of previous sources
+        for qualified_name, (pixel_type, layer_channels) in matched_layers.items():
+            for out_channel_name in layer_channels.keys():
+                if out_channel_name in out_exr_header['channels']:
+                    console.warning('Skipped duplicate channel {} of {}.'.format(out_channel_name, os.path.basename(in_path)))
+
+                    del layer_channels[out_channel_name]
+                else:
+                    out_exr_header['channels'][out_channel_name] = out_channels[out_channel_name]
+
+            if not layer_channels:
+                del matched_layers[qualified_name]
+
+        if matched_layers:
+            sources.append((in_exr_file, names, matched_layers))
+
+    # write to temporary file which replaces out_path once complete
+    with atomic_path(out_path) as temp_path:
+        out_exr_file = OpenEXR.OutputFile(temp_path, out_exr_header)
+
+        # stream all sources band by band, only one band of each source is held in memory
+        if sources:
+            for y_start, y_end in iter_bands(out_exr_header):
+                band = {}
+
+                for in_exr_file, names, matched_layers in sources:
+                    channel_data = {qualified_name: in_exr_file.channel(names[qualified_name], pixel_type, y_start, y_end) for qualified_name, (pixel_type, layer_channels) in matched_layers.iteritems()}
+
+                    band.update(convert_band(matched_layers, channel_data))
+
+                out_exr_file.writePixels(band, y_end - y_start + 1)
+
+        out_exr_file.close()
+
+    # stop time
+    time_stop = time.time()
+
+    # duration
+    duration = round(time_stop - time_start)
+
+    console.info('Finished merge of {out_path} ({duration}s).'.format(out_path=os.path.basename(out_path), duration=duration))
+
+def check_data_windows(in_paths):
+    """ Check that all files share the same data window by reading their headers only.
+
+    Args:
+        in_paths (list): Files to check
+
+    Returns:
+        bool
+    """
+    data_windows = [read_headers(in_path)[0]['dataWindow'] for in_path in in_paths]
+
+    return all(data_window == data_windows[0] for data_window in data_windows)
+
+def match_frames(files_per_source):
+    """ Match files of several sources by frame number.
+
+    Args:
+        files_per_source (list): List of exr files per source
+
+    Returns:
+        dict: Frame number / (padding, list of files) pairs of frames present in all sources
+    """
+    frames = {}
+
+    for source_index, files in enumerate(files_per_source):
+        for file_path in files:
+            frame = get_frame(file_path)
+
+            if frame is None:
+                console.warning('Skipped {}, no frame number.'.format(os.path.basename(file_path)))
+
+                continue
+
+            frame_number, padding = frame
+
+            frames.setdefault(frame_number, (padding, {}))[1].setdefault(source_index, file_path)
+
+    matched_frames = {}
+
+    for frame_number, (padding, sources) in sorted(frames.iteritems()):
+        if len(sources) < len(files_per_source):
+            console.warning('Skipped frame {}, missing in {} of {} sources.'.format(frame_number, len(files_per_source) - len(sources), len(files_per_source)))
+
+            continue
+
+        matched_frames[frame_number] = (padding, [sources[source_index] for source_index in xrange(len(files_per_source))])
+
+    return matched_frames
+
+def merge_task(in_paths, out_name):
+    """ Merge files of a frame with the job configuration of the worker.
+
+    Args:
+        in_paths (list): Files to read
+        out_name (str): Name of file to write
+    """
+    context = get_worker_context()
+
+    run_journaled(context['journal'], 'merge:' + out_name, merge_file, in_paths, os.path.join(context['out_root'], out_name), context['rules'], context['half'], context['half_exclude'], context['qualify'], context['source_names'])
+
+def merge_files(files_per_source, out_fs, layer_map=None, num_threads=None, multiprocessing=True, **kwargs):
+    """ Merge lists of exr files by frame number and use multiprocessing.
+
+    Data windows are compared up front from the headers, frames with mismatching data windows are skipped.
+
+    Args:
+        files_per_source (list): List of exr files per source
+        out_fs (fs): Output filesystem
+        layer_map (dict): regular expression / replacement name pairs
+        num_threads (int): Number of threads to use
+        multiprocessing (bool): Use multiprocessing
+    """
+    frames = match_frames(files_per_source)
+
+    source_names = kwargs.get('source_names')
+
+    # qualified channel names of sources with the same name would collide
+    if kwargs.get('qualify') and source_names and len(set(source_names)) < len(source_names):
+        console.warning('Sources {} share names, their qualified channels collide.'.format(', '.join(source_names)))
+
+    console.info('Started merge of {} frames.'.format(len(frames)))
+
+    name = kwargs.get('name') or 'merged'
+
+    # prepend prefix to name
+    if 'prefix' in kwargs and kwargs['prefix']:
+        name = kwargs['prefix'] + name
+
+    items = sorted(frames.iteritems())
+
+    shard = kwargs.get('shard')
+
+    # select frames of this shard, balanced by the size of their input files
+    if shard:
+        items = shard.select(items, lambda item: item[1][1])
+
+        console.info('Shard {}: {} frames, {} bytes.'.format(shard, len(items), shard.bytes))
+
+    # journal of task states in the output directory, completed tasks are skipped on resume
+    journal, completed = open_journal(out_fs, bool(kwargs.get('resume')), shard)
+
+    skipped = 0
+
+    keys = []
+
+    tasks = []
+
+    for frame_number, (padding, in_paths) in items:
+        out_name = u'{name}.{frame:0{padding}d}.exr'.format(name=name, frame=frame_number, padding=padding)
+
+        key = 'merge:' + out_name
+
+        keys.append(key)
+
+        if key in completed:
+            skipped += 1
+
+            continue
+
+        if not check_data_windows(in_paths):
+            console.error('Skipped frame {}, data windows do not match.'.format(frame_number))
+
+            journal.append(key, FAILED, 'data windows do not match')
+
+            continue
+
+        tasks.append((merge_task, in_paths, out_name))
+
+    # job configuration is sent to each worker once, tasks only carry the files of a frame
+    context = {
+        'rules': compile_layer_map(layer_map or {}),
+        'half': bool(kwargs.get('half')),
+        'half_exclude': compile_half_exclude(kwargs.get('half_exclude')),
+        'qualify': bool(kwargs.get('qualify')),
+        'source_names': source_names,
+        'out_root': out_fs.getsyspath(u'/'),
+        'journal': journal
+    }
+
+    try:
+        if tasks:
+            run(tasks, num_threads, multiprocessing, context)
+    finally:
+        # the manifest records failed and unfinished frames as well
+        if shard:
+            write_manifest(out_fs, shard, journal, keys)
+
+    if skipped:
+        console.info('Skipped {} frames completed before resume.'.format(skipped))
+
+    console.info('Finished merge of {} frames.'.format(len(tasks)))
+
+def merge_dirs(in_fss, out_fs, layer_map=None, num_threads=None, multithreading=True, **kwargs):
+    """ Merge exr files of several directories by frame number.
+
+    Args:
+        in_fss (list): Input filesystems
+        out_fs (fs): Output filesystem
+        layer_map (dict): regular expression / replacement name pairs
+        num_threads (int): Number of threads to use
+        multithreading (bool): Use multithreading
+    """
+
+    files_per_source = []
+
+    for in_fs in in_fss:
+        files_per_source.append(list(discover_fs(in_fs, kwargs.get('include'), kwargs.get('exclude'), kwargs.get('max_depth'), frames=kwargs.get('frames'))))
+
+    # sources are named after the input directories, not the subdirectories of their files
+    source_names = [get_source_name(in_fs.getsyspath(u'/')) for in_fs in in_fss]
+
+    return merge_files(files_per_source, out_fs, layer_map, num_threads, multithreading, source_names=source_names, **kwargs)
@@ -5,59 +5,81 @@ import os
 import re
 import time
 
+from StringIO import StringIO
+
 # image manipulation
 import OpenEXR
 import Imath
 import Image
+import numpy
 
 # exceptions
 from exrio.exrio_exceptions import NoExrFileException, SameFileException
 
 # helpers
-from exrio.helpers.multiprocessing_helpers import run
+from exrio.helpers.multiprocessing_helpers import run, imap, get_worker_context
+from exrio.helpers.journal_helpers import open_journal, run_journaled, DONE
+from exrio.helpers.shard_helpers import write_manifest
+from exrio.helpers.discovery_helpers import discover_fs
 from exrio.helpers.list_helpers import sort_rgba
+from exrio.helpers.exr_helpers import get_size, get_dtype, iter_bands, imap_bands
+from exrio.helpers.mmap_helpers import map_channels
+from exrio.helpers.exposure_helpers import DEFAULT_SAMPLE_RATE, DEFAULT_PERCENTILES, estimate_range, normalize
+from exrio.helpers.color_helpers import RAW_VIEW, DEFAULT_VIEW, DEFAULT_TONE, get_lut, apply_lut
+from exrio.helpers.header_helpers import assure_readable_part
+from exrio.helpers.fs_helpers import atomic_path
+from exrio.helpers.archive_helpers import open_writer, get_shard_url
 
 # exrio
 from exrio import console
 
-def preview_file(in_path, out_path, layer=None):
-    """ Create preview of exr files by normalizing the color range to 8bit.
+# version of the preview algorithm, cached previews of other versions are not used
+PREVIEW_VERSION = 2
 
-    Args:
-        in_path (str): File to read
-        out_path (str): File to write
+def get_preview_params(layer=None, part=None, sample_rate=DEFAULT_SAMPLE_RATE, percentiles=DEFAULT_PERCENTILES, view=DEFAULT_VIEW, tone=DEFAULT_TONE, exposure=0.0):
+    """ Get parameters which change the preview, used as part of the cache key.
 
-    Raises:
-        NoExrFileException
+    Args:
+        layer (str): Regular expression selecting the channels to preview
+        part (mixed): Index or name of part to preview
+        sample_rate (float): Fraction of bands of scanlines sampled to estimate the exposure range
+        percentiles (tuple): Percentiles of pixel values mapped to black and white
+        view (str): raw maps the exposure range to 8bit, linear, srgb and rec709 are display views of scene linear pixels
+        tone (str): Tone curve of display views
+        exposure (float): Exposure adjustment in stops
+
+    Returns:
+        dict
     """
-    console.info('Started preview of {in_path}.'.format(in_path=os.path.basename(in_path)))
-
-    if in_path == out_path:
-        raise SameFileException(out_path)
-
-    # start time
-    time_start = time.time()
-
-    if not OpenEXR.isOpenExrFile(in_path):
-        raise NoExrFileException(in_path)
-
-    # open exr file
-    in_exr_file = OpenEXR.InputFile(in_path)
-
-    # get open exr header
-    in_exr_header = in_exr_file.header()
+    return {
+        'version': PREVIEW_VERSION,
+        'layer': layer,
+        'part': part,
+        'normalization': 'percentile',
+        'sample_rate': sample_rate,
+        'percentiles': list(percentiles),
+        'view': view,
+        'tone': tone,
+        'exposure': exposure
+    }
+
+def get_preview_channels(header, layer=None):
+    """ Get three channels to preview, selected by layer.
 
-    pixel_type = Imath.PixelType(Imath.PixelType.FLOAT)
-    data_window = in_exr_header['dataWindow']
-    size = (data_window.max.x - data_window.min.x + 1, data_window.max.y - data_window.min.y + 1)
+    Args:
+        header (dict): EXR header
+        layer (str): Regular expression selecting the channels to preview
 
+    Returns:
+        list: Names of red, green and blue channel
+    """
     # default channels
     channels = 'RGB'
 
     if layer:
         selected_channels = []
 
-        for layer_name, value in in_exr_header['channels'].iteritems():
+        for layer_name, value in header['channels'].iteritems():
             if re.search(r'{}'.format(layer), layer_name, flags=re.IGNORECASE):
                 if not layer_name in selected_channels:
                     selected_channels.append(layer_name)
@@ -76,24 +98,208 @@ def preview_file(in_path, out_path, layer=None):
 
         console.debug(channels)
 
-    rgbf = [Image.fromstring("F", size, in_exr_file.channel(c, pixel_type)) for c in channels]
+    return list(channels)
 
-    extrema = [im.getextrema() for im in rgbf]
-    darkest = min([lo for (lo,hi) in extrema])
-    lighest = max([hi for (lo,hi) in extrema])
-    scale = 255 / (lighest - darkest)
+def map_preview(channel_pixels, sample_rate=DEFAULT_SAMPLE_RATE, percentiles=DEFAULT_PERCENTILES, view=DEFAULT_VIEW, tone=DEFAULT_TONE, exposure=0.0):
+    """ Map pixels of red, green and blue channel to 8bit.
 
-    def normalize_0_255(value):
-        """ Normalize value.
+    The raw view maps the exposure range, estimated from percentiles of sampled bands of scanlines, linearly to 8bit, so single extreme pixels do not darken the preview. Display views look up the 8bit value of each pixel in a table of their color pipeline.
 
-        Args:
-            value (float): Value to normalize
-        """
-        return (value * scale) + darkest
+    Args:
+        channel_pixels (list): Pixels of red, green and blue channel as rows and columns
+        sample_rate (float): Fraction of bands of scanlines sampled to estimate the exposure range
+        percentiles (tuple): Percentiles of pixel values mapped to black and white
+        view (str): raw maps the exposure range to 8bit, linear, srgb and rec709 are display views of scene linear pixels
+        tone (str): Tone curve of display views
+        exposure (float): Exposure adjustment in stops
+
+    Returns:
+        list: 8bit pixels of red, green and blue channel
+
+    Raises:
+        ValueError
+    """
+    if view == RAW_VIEW:
+        low, high = estimate_range(channel_pixels, sample_rate, percentiles)
+
+        # each stop of exposure halves the range mapped to 8bit
+        high = low + (high - low) / 2.0 ** exposure
+
+        return [normalize(pixels, low, high) for pixels in channel_pixels]
+
+    lut = get_lut(view, tone, exposure)
+
+    return [apply_lut(pixels, lut) for pixels in channel_pixels]
+
+def render_preview(channel_pixels, size, sample_rate=DEFAULT_SAMPLE_RATE, percentiles=DEFAULT_PERCENTILES, view=DEFAULT_VIEW, tone=DEFAULT_TONE, exposure=0.0):
+    """ Render preview of red, green and blue channel.
+
+    Args:
+        channel_pixels (list): Pixels of red, green and blue channel as rows and columns
+        size (tuple): Width and height
+        sample_rate (float): Fraction of bands of scanlines sampled to estimate the exposure range
+        percentiles (tuple): Percentiles of pixel values mapped to black and white
+        view (str): raw maps the exposure range to 8bit, linear, srgb and rec709 are display views of scene linear pixels
+        tone (str): Tone curve of display views
+        exposure (float): Exposure adjustment in stops
+
+    Returns:
+        Image
+
+    Raises:
+        ValueError
+    """
+    rgb8 = map_preview(channel_pixels, sample_rate, percentiles, view, tone, exposure)
 
-    rgb8 = [im.point(normalize_0_255).convert("L") for im in rgbf]
+    return Image.merge("RGB", [Image.fromstring("L", size, pixels.tostring()) for pixels in rgb8])
 
-    Image.merge("RGB", rgb8).save(out_path)
+def create_preview(in_path, layer=None, part=None, num_threads=1, sample_rate=DEFAULT_SAMPLE_RATE, percentiles=DEFAULT_PERCENTILES, view=DEFAULT_VIEW, tone=DEFAULT_TONE, exposure=0.0):
+    """ Create preview image of exr file.
+
+    Args:
+        in_path (str): File to read
+        layer (str): Regular expression selecting the channels to preview
+        part (mixed): Index or name of part to preview
+        num_threads (int): Number of threads decoding bands of scanlines or tiles
+        sample_rate (float): Fraction of bands of scanlines sampled to estimate the exposure range
+        percentiles (tuple): Percentiles of pixel values mapped to black and white
+        view (str): raw maps the exposure range to 8bit, linear, srgb and rec709 are display views of scene linear pixels
+        tone (str): Tone curve of display views
+        exposure (float): Exposure adjustment in stops
+
+    Returns:
+        Image
+
+    Raises:
+        NoExrFileException
+        NoPartException
+        UnsupportedPartException
+    """
+    if not OpenEXR.isOpenExrFile(in_path):
+        raise NoExrFileException(in_path)
+
+    assure_readable_part(in_path, part)
+
+    # open exr file
+    in_exr_file = OpenEXR.InputFile(in_path)
+
+    # get open exr header
+    in_exr_header = in_exr_file.header()
+
+    # display views look up half float pixels, which halves the decoded data
+    pixel_type = Imath.PixelType(Imath.PixelType.FLOAT if view == RAW_VIEW else Imath.PixelType.HALF)
+
+    channels = get_preview_channels(in_exr_header, layer)
+
+    size = get_size(in_exr_header)
+
+    width, height = size
+
+    views = map_channels(in_path)
+
+    if views is not None:
+        # uncompressed files are read from the mapped pages of the selected channels only
+        channel_pixels = [views[c] for c in channels]
+    else:
+        # decode selected channels in bands of scanlines or tiles
+        channel_data = {c: [] for c in channels}
+
+        for band, band_data in imap_bands(in_path, {c: pixel_type for c in channel_data}, iter_bands(in_exr_header), num_threads):
+            for c, data in band_data.iteritems():
+                channel_data[c].append(data)
+
+        channel_pixels = [numpy.frombuffer(''.join(channel_data[c]), dtype=get_dtype(pixel_type)).reshape(height, width) for c in channels]
+
+    return render_preview(channel_pixels, size, sample_rate, percentiles, view, tone, exposure)
+
+def encode_preview(in_path, out_name, layer=None, part=None, num_threads=1, image_format='JPEG', sample_rate=DEFAULT_SAMPLE_RATE, percentiles=DEFAULT_PERCENTILES, view=DEFAULT_VIEW, tone=DEFAULT_TONE, exposure=0.0):
+    """ Create preview of exr file and encode it, for previews which are written by another process.
+
+    Args:
+        in_path (str): File to read
+        out_name (str): Name of preview
+        layer (str): Regular expression selecting the channels to preview
+        part (mixed): Index or name of part to preview
+        num_threads (int): Number of threads decoding bands of scanlines or tiles
+        image_format (str): Image format
+        sample_rate (float): Fraction of bands of scanlines sampled to estimate the exposure range
+        percentiles (tuple): Percentiles of pixel values mapped to black and white
+        view (str): raw maps the exposure range to 8bit, linear, srgb and rec709 are display views of scene linear pixels
+        tone (str): Tone curve of display views
+        exposure (float): Exposure adjustment in stops
+
+    Returns:
+        tuple: in_path, out_name and encoded preview
+    """
+    output = StringIO()
+
+    create_preview(in_path, layer, part, num_threads, sample_rate, percentiles, view, tone, exposure).save(output, image_format)
+
+    return (in_path, out_name, output.getvalue())
+
+def get_preview_name(in_path, prefix=None):
+    """ Get file name of preview.
+
+    Args:
+        in_path (str): File to preview
+        prefix (str): Prefix of file name
+
+    Returns:
+        unicode
+    """
+    filename, extension = os.path.splitext(os.path.basename(in_path))
+
+    # prepend prefix to filename
+    if prefix:
+        filename = prefix + filename
+
+    return unicode(filename + '.jpg')
+
+def preview_file(in_path, out_path, layer=None, part=None, num_threads=1, cache=None, sample_rate=DEFAULT_SAMPLE_RATE, percentiles=DEFAULT_PERCENTILES, view=DEFAULT_VIEW, tone=DEFAULT_TONE, exposure=0.0):
+    """ Create preview of exr files by mapping the exposure range to 8bit.
+
+    Args:
+        in_path (str): File to read
+        out_path (str): File to write
+        layer (str): Regular expression selecting the channels to preview
+        part (mixed): Index or name of part to preview
+        num_threads (int): Number of threads decoding bands of scanlines or tiles
+        cache (PreviewCache): Cache to serve and store previews
+        sample_rate (float): Fraction of bands of scanlines sampled to estimate the exposure range
+        percentiles (tuple): Percentiles of pixel values mapped to black and white
+        view (str): raw maps the exposure range to 8bit, linear, srgb and rec709 are display views of scene linear pixels
+        tone (str): Tone curve of display views
+        exposure (float): Exposure adjustment in stops
+
+    Raises:
+        NoExrFileException
+        NoPartException
+        UnsupportedPartException
+    """
+    console.info('Started preview of {in_path}.'.format(in_path=os.path.basename(in_path)))
+
+    if in_path == out_path:
+        raise SameFileException(out_path)
+
+    # start time
+    time_start = time.time()
+
+    if cache:
+        cache_key = cache.get_key(in_path, get_preview_params(layer, part, sample_rate, percentiles, view, tone, exposure))
+
+        if cache.fetch(cache_key, out_path):
+            console.info('Finished preview for {out_path} from cache.'.format(out_path=os.path.basename(out_path)))
+
+            return
+
+    image = create_preview(in_path, layer, part, num_threads, sample_rate, percentiles, view, tone, exposure)
+
+    # write to temporary file which replaces out_path once complete
+    with atomic_path(out_path) as temp_path:
+        image.save(temp_path)
+
+    if cache:
+        cache.store(cache_key, out_path)
 
     # stop time
     time_stop = time.time()
@@ -103,11 +309,36 @@ def preview_file(in_path, out_path, layer=None):
 
     console.info('Finished preview for {out_path} ({duration}s).'.format(out_path=os.path.basename(out_path), duration=duration))
 
+def preview_task(file_path):
+    """ Create preview of file with the job configuration of the worker.
+
+    Args:
+        file_path (str): File to read
+    """
+    context = get_worker_context()
+
+    out_path = os.path.join(context['out_root'], get_preview_name(file_path, context['prefix']))
+
+    run_journaled(context['journal'], 'preview:' + file_path, preview_file, file_path, out_path, context['layer'], context['part'], context['band_threads'], context['cache'], context['sample_rate'], context['percentiles'], context['view'], context['tone'], context['exposure'])
+
+def encode_task(file_path):
+    """ Create and encode preview of file with the job configuration of the worker.
+
+    Args:
+        file_path (str): File to read
+
+    Returns:
+        tuple: file_path, name and encoded preview
+    """
+    context = get_worker_context()
+
+    return encode_preview(file_path, get_preview_name(file_path, context['prefix']), context['layer'], context['part'], context['band_threads'], 'JPEG', context['sample_rate'], context['percentiles'], context['view'], context['tone'], context['exposure'])
+
 def preview_files(files, out_fs, num_threads=None, multiprocessing=True, **kwargs):
     """ Create previews for a list of files and use multiprocessing.
 
     Args:
-        files (list): List of exr files
+        files (iterable): Exr files
         out_fs (fs): Output filesystem
         num_threads (int): Number of threads to use
         multiprocessing (bool): Use multiprocessing
@@ -115,49 +346,212 @@ def preview_files(files, out_fs, num_threads=None, multiprocessing=True, **kwarg
     Raises:
         SameFileException
     """
-    console.info('Started preview of {} files.'.format(len(files)))
+    console.info('Started preview of files.')
+
+    # decode bands in threads only if files are not processed in parallel already
+    band_threads = 1 if multiprocessing else num_threads
 
-    tasks = []
+    cache = kwargs.get('cache')
 
-    for file_path in files:
-        dirname, basename = os.path.split(file_path)
+    sample_rate = kwargs.get('sample_rate') or DEFAULT_SAMPLE_RATE
+    percentiles = kwargs.get('percentiles') or DEFAULT_PERCENTILES
 
-        filename, extension = os.path.splitext(basename)
+    view = kwargs.get('view') or DEFAULT_VIEW
+    tone = kwargs.get('tone') or DEFAULT_TONE
+    exposure = kwargs.get('exposure') or 0.0
+
+    params = get_preview_params(kwargs.get('layer'), kwargs.get('part'), sample_rate, percentiles, view, tone, exposure)
+
+    hits = [0]
+
+    shard = kwargs.get('shard')
+
+    # select files of this shard, every shard of the job selects from the same files
+    if shard:
+        files = shard.select(files)
+
+        console.info('Shard {}: {} files, {} bytes.'.format(shard, len(files), shard.bytes))
+
+    # journal of task states in the output directory, completed tasks are skipped on resume
+    journal, completed = open_journal(out_fs, bool(kwargs.get('resume')), shard)
+
+    skipped = [0]
+
+    def iter_tasks():
+        """ Create preview tasks while files are discovered, cache hits are served without a task.
+
+        Returns:
+            generator
+        """
+        for file_path in files:
+            # get out_path
+            out_path = out_fs.getsyspath(get_preview_name(file_path, kwargs.get('prefix')))
 
-        # prepend prefix to filename
-        if 'prefix' in kwargs and kwargs['prefix']:
-            filename = kwargs['prefix'] + filename
+            key = 'preview:' + file_path
 
-        out_name = unicode(filename + '.jpg')
+            if cache and cache.fetch(cache.get_key(file_path, params), out_path):
+                hits[0] += 1
 
-        # get out_path
-        out_path = out_fs.getsyspath(out_name)
+                # the manifest of a shard counts cache hits as done
+                if shard:
+                    journal.append(key, DONE)
 
-        layer = None
+                continue
 
-        # get layer from kwargs
-        if 'layer' in kwargs:
-            layer = kwargs['layer']
+            if key in completed:
+                skipped[0] += 1
 
-        tasks.append((preview_file, file_path, out_path, layer))
+                continue
 
-    run(tasks, num_threads, multiprocessing)
+            yield (preview_task, file_path)
 
-    console.info('Finished preview of {} files.'.format(len(files)))
+    # job configuration is sent to each worker once, tasks only carry the file path
+    context = {
+        'layer': kwargs.get('layer'),
+        'part': kwargs.get('part'),
+        'prefix': kwargs.get('prefix'),
+        'band_threads': band_threads,
+        'sample_rate': sample_rate,
+        'percentiles': percentiles,
+        'view': view,
+        'tone': tone,
+        'exposure': exposure,
+        'cache': cache,
+        'out_root': out_fs.getsyspath(u'/'),
+        'journal': journal
+    }
+
+    try:
+        count = run(iter_tasks(), num_threads, multiprocessing, context)
+    finally:
+        # the manifest records failed and unfinished files as well
+        if shard:
+            write_manifest(out_fs, shard, journal, ['preview:' + file_path for file_path in files])
+
+    if cache:
+        stats = cache.update_stats(hits[0], count)
+
+        evicted = cache.evict()
+
+        console.info('Preview cache: {hits} hits, {misses} misses, {evicted} evicted ({total_hits} hits, {total_misses} misses in total).'.format(hits=hits[0], misses=count, evicted=evicted, total_hits=stats['hits'], total_misses=stats['misses']))
+
+    if skipped[0]:
+        console.info('Skipped {} files completed before resume.'.format(skipped[0]))
+
+    console.info('Finished preview of {} files.'.format(count + hits[0]))
+
+def preview_files_to_url(files, out_url, num_threads=None, multiprocessing=True, **kwargs):
+    """ Create previews for a list of files and write them to an archive or filesystem given as FS URL.
+
+    Previews are encoded by the workers and sent back to this process, which appends them to a single archive.
+
+    Args:
+        files (iterable): Exr files
+        out_url (str): FS URL, e.g. zip://previews.zip, tar://previews.tar or ftp://host/previews
+        num_threads (int): Number of threads to use
+        multiprocessing (bool): Use multiprocessing
+    """
+    console.info('Started preview of files into {}.'.format(out_url))
+
+    # decode bands in threads only if files are not processed in parallel already
+    band_threads = 1 if multiprocessing else num_threads
+
+    cache = kwargs.get('cache')
+    layer = kwargs.get('layer')
+    part = kwargs.get('part')
+
+    sample_rate = kwargs.get('sample_rate') or DEFAULT_SAMPLE_RATE
+    percentiles = kwargs.get('percentiles') or DEFAULT_PERCENTILES
+
+    view = kwargs.get('view') or DEFAULT_VIEW
+    tone = kwargs.get('tone') or DEFAULT_TONE
+    exposure = kwargs.get('exposure') or 0.0
+
+    params = get_preview_params(layer, part, sample_rate, percentiles, view, tone, exposure)
+
+    if kwargs.get('resume'):
+        console.warning('Resume requires an output directory, all previews are written again.')
+
+    shard = kwargs.get('shard')
+
+    # select files of this shard, each shard writes an archive of its own
+    if shard:
+        files = shard.select(files)
+
+        out_url = get_shard_url(out_url, shard)
+
+        console.info('Shard {}: {} files, {} bytes.'.format(shard, len(files), shard.bytes))
+
+    hits = [0]
+
+    count = 0
+
+    with open_writer(out_url) as writer:
+        def iter_tasks():
+            """ Create encode tasks while files are discovered, cache hits are written without a task.
+
+            Returns:
+                generator
+            """
+            for file_path in files:
+                out_name = get_preview_name(file_path, kwargs.get('prefix'))
+
+                if cache:
+                    data = cache.read(cache.get_key(file_path, params))
+
+                    if data is not None:
+                        writer.write(out_name, data)
+
+                        hits[0] += 1
+
+                        continue
+
+                yield (encode_task, file_path)
+
+        # job configuration is sent to each worker once, tasks only carry the file path
+        context = {
+            'layer': layer,
+            'part': part,
+            'prefix': kwargs.get('prefix'),
+            'band_threads': band_threads,
+            'sample_rate': sample_rate,
+            'percentiles': percentiles,
+            'view': view,
+            'tone': tone,
+            'exposure': exposure
+        }
+
+        # single writer appends previews in order of completion
+        for file_path, out_name, data in imap(iter_tasks(), num_threads, multiprocessing, context):
+            writer.write(out_name, data)
+
+            if cache:
+                cache.store_data(cache.get_key(file_path, params), data)
+
+            count += 1
+
+    if cache:
+        stats = cache.update_stats(hits[0], count)
+
+        evicted = cache.evict()
+
+        console.info('Preview cache: {hits} hits, {misses} misses, {evicted} evicted ({total_hits} hits, {total_misses} misses in total).'.format(hits=hits[0], misses=count, evicted=evicted, total_hits=stats['hits'], total_misses=stats['misses']))
+
+    console.info('Finished preview of {} files into {}.'.format(count + hits[0], out_url))
 
 def preview_dir(in_fs, out_fs, num_threads=None, multithreading=True, **kwargs):
     """ Create list of exr files in directory and create previews.
 
     Args:
         in_fs (fs): Input filesystem
-        out_fs (fs): Output filesystem
+        out_fs (fs): Output filesystem, unused if the out_url keyword argument is given
         num_threads (int): Number of threads to use
         multithreading (bool): Use multithreading
     """
 
-    files = []
+    files = discover_fs(in_fs, kwargs.get('include'), kwargs.get('exclude'), kwargs.get('max_depth'), frames=kwargs.get('frames'))
 
-    for file_name in in_fs.walk.files(filter=['*.exr']):
-        files.append(in_fs.getsyspath(file_name))
+    if kwargs.get('out_url'):
+        return preview_files_to_url(files, kwargs['out_url'], num_threads, multithreading, **kwargs)
 
     return preview_files(files, out_fs, num_threads, multithreading, **kwargs)
@@ -2,33 +2,219 @@
 
 # system
 import copy
+import json
 import os
 import re
 import time
+
+from collections import namedtuple
+
 # exr
 import OpenEXR
+import Imath
 
 # exceptions
 from exrio.exrio_exceptions import NoExrFileException, SameFileException
 
 # helpers
-from exrio.helpers.multiprocessing_helpers import run
+from exrio.helpers.multiprocessing_helpers import run, get_worker_context
+from exrio.helpers.journal_helpers import open_journal, run_journaled
+from exrio.helpers.shard_helpers import write_manifest
+from exrio.helpers.discovery_helpers import discover_fs
+from exrio.helpers.exr_helpers import get_pixel_type, get_channel_bytes, get_scanline_header, iter_bands, imap_bands, convert_pixels, find_constant_channels
+from exrio.helpers.header_helpers import assure_readable_part
+from exrio.helpers.fs_helpers import atomic_path
+from exrio.helpers.json_helpers import encode_float
 
 # exrio
 from exrio import console
 
+# default patterns of channels which keep full precision when converting to half
+HALF_EXCLUDE = ['depth', 'position', r'^z$', r'^p\.']
+
+# header attribute listing dropped constant channels and their values
+CONSTANT_CHANNELS_ATTRIBUTE = 'exrio/constantChannels'
+
+# constant channel handling modes
+CONSTANT_MODES = ['drop', 'record']
+
+# classes
+
+LayerRule = namedtuple('LayerRule', ['pattern', 'name', 'pixel_type'])
+
 # methods
 
-def rechannel_file(in_path, out_path, layer_map=None):
+def compile_layer_map(layer_map):
+    """ Compile layer map into a list of rules.
+
+    A layer map value is either the replacement name or a dict containing the replacement name and an optional target pixel type, e.g. {"name": "diffuse", "type": "HALF"}.
+
+    Args:
+        layer_map (mixed): Regular expression / replacement pairs or rules compiled before
+
+    Returns:
+        list
+    """
+    if isinstance(layer_map, list):
+        return layer_map
+
+    rules = []
+
+    for pattern, replacement in layer_map.iteritems():
+        pixel_type = None
+
+        if isinstance(replacement, dict):
+            if 'type' in replacement and replacement['type']:
+                pixel_type = get_pixel_type(replacement['type'])
+
+            replacement = replacement['name']
+
+        rules.append(LayerRule(re.compile(r'{}'.format(pattern), flags=re.IGNORECASE), replacement, pixel_type))
+
+    return rules
+
+def compile_half_exclude(half_exclude=None):
+    """ Compile regular expressions of channels which keep full precision when converting to half.
+
+    Args:
+        half_exclude (list): Regular expressions or patterns compiled before, HALF_EXCLUDE by default
+
+    Returns:
+        list
+    """
+    if half_exclude is None:
+        half_exclude = HALF_EXCLUDE
+
+    return [pattern if hasattr(pattern, 'search') else re.compile(r'{}'.format(pattern), flags=re.IGNORECASE) for pattern in half_exclude]
+
+def get_out_pixel_type(rule, layer_name, out_channel_name, pixel_type, half=False, half_exclude=None):
+    """ Get pixel type of rechanneled channel.
+
+    Args:
+        rule (LayerRule): Matched rule
+        layer_name (str): Input channel name
+        out_channel_name (str): Output channel name
+        pixel_type (Imath.PixelType): Input pixel type
+        half (bool): Convert float channels to half
+        half_exclude (list): Compiled regular expressions of channels to keep at full precision, HALF_EXCLUDE by default
+
+    Returns:
+        Imath.PixelType
+    """
+    # explicit pixel type of rule takes precedence
+    if rule.pixel_type:
+        return rule.pixel_type
+
+    if half and pixel_type.v == Imath.PixelType.FLOAT:
+        if half_exclude is None:
+            half_exclude = compile_half_exclude()
+
+        for pattern in half_exclude:
+            if pattern.search(layer_name) or pattern.search(out_channel_name):
+                return pixel_type
+
+        return Imath.PixelType(Imath.PixelType.HALF)
+
+    return pixel_type
+
+def match_layers(in_exr_header, rules, half=False, half_exclude=None):
+    """ Match channels of header against rules of a compiled layer map.
+
+    Args:
+        in_exr_header (dict): EXR header
+        rules (list): Compiled layer map
+        half (bool): Convert float channels to half
+        half_exclude (list): Compiled regular expressions of channels to keep at full precision
+
+    Returns:
+        tuple: Output channels, input channel name / (pixel type, {output channel name: output pixel type}) pairs and output channel name / replacement layer name pairs
+    """
+    out_channels = {}
+    matched_layers = {}
+    out_layers = {}
+
+    # patterns are compiled once per header instead of once per channel
+    if half_exclude is None:
+        half_exclude = compile_half_exclude()
+
+    for layer_name, value in in_exr_header['channels'].iteritems():
+        for rule in rules:
+            matches = rule.pattern.search(layer_name)
+
+            if matches:
+                match_data = matches.groupdict()
+
+                if 'channel' in match_data.keys():
+                    out_channel_name = rule.name + '.' + match_data['channel']
+                else:
+                    out_channel_name = rule.name
+
+                out_pixel_type = get_out_pixel_type(rule, layer_name, out_channel_name, value.type, half, half_exclude)
+
+                out_channels[out_channel_name] = Imath.Channel(out_pixel_type, value.xSampling, value.ySampling)
+
+                # store rechanneld layer by input name so each input channel is decoded only once
+                matched_layers.setdefault(layer_name, (value.type, {}))[1][out_channel_name] = out_pixel_type
+
+                out_layers[out_channel_name] = rule.name
+
+    return (out_channels, matched_layers, out_layers)
+
+def convert_band(matched_layers, channel_data):
+    """ Convert decoded band of input channels into output channels.
+
+    Args:
+        matched_layers (dict): Input channel name / (pixel type, {output channel name: output pixel type}) pairs
+        channel_data (dict): Input channel name / raw pixel data pairs
+
+    Returns:
+        dict: Output channel name / raw pixel data pairs
+    """
+    band = {}
+
+    for layer_name, (pixel_type, out_channels) in matched_layers.iteritems():
+        data = channel_data[layer_name]
+
+        # convert only once per distinct output pixel type
+        converted = {}
+
+        for out_channel_name, out_pixel_type in out_channels.iteritems():
+            if out_pixel_type.v not in converted:
+                converted[out_pixel_type.v] = convert_pixels(data, pixel_type, out_pixel_type)
+
+            band[out_channel_name] = converted[out_pixel_type.v]
+
+    return band
+
+def get_layout(header):
+    """ Get channel layout of header, files with the same layout match the same layers.
+
+    Args:
+        header (dict): EXR header
+
+    Returns:
+        tuple
+    """
+    return tuple(sorted((name, channel.type.v, channel.xSampling, channel.ySampling) for name, channel in header['channels'].iteritems()))
+
+def rechannel_file(in_path, out_path, layer_map=None, half=False, half_exclude=None, constant=None, part=None, num_threads=1, matches=None):
     """ Rechannel layers of exr file at in_path by replacing layer names via regular expression provided by layer_map and storing a new exr file at out_path.
 
     Args:
         in_path (str): File to read
         out_path (str): File to write
         layer_map (dict): Regular expression / replacement name pairs
+        half (bool): Convert float channels to half
+        half_exclude (list): Regular expressions of channels to keep at full precision
+        constant (str): Drop constant channels ('drop') and list them in the header ('record')
+        part (mixed): Index or name of part to rechannel
+        num_threads (int): Number of threads decoding bands of scanlines or tiles
+        matches (dict): Matched layers per channel layout, reused across files of a job
 
     Raises:
         NoExrFileException
+        NoPartException
+        UnsupportedPartException
     """
     console.info('Started rechannel of {in_path}.'.format(in_path=os.path.basename(in_path)))
 
@@ -41,51 +227,75 @@ def rechannel_file(in_path, out_path, layer_map=None):
     if not layer_map:
         layer_map = {}
 
+    rules = compile_layer_map(layer_map)
+
+    half_exclude = compile_half_exclude(half_exclude)
+
     if not OpenEXR.isOpenExrFile(in_path):
         raise NoExrFileException(in_path)
 
+    assure_readable_part(in_path, part, True)
+
     # open exr file
     in_exr_file = OpenEXR.InputFile(in_path)
 
     # get open exr header
     in_exr_header = in_exr_file.header()
 
-    # create new copy from header
-    out_exr_header = copy.deepcopy(in_exr_header)
+    # create new copy from header, tiled and multipart files are written as scanline files
+    out_exr_header = copy.deepcopy(get_scanline_header(in_exr_header))
 
-    # reset channels
-    out_exr_header['channels'] = {}
+    layout = get_layout(in_exr_header)
 
-    # empty dict for matched layers
-    matched_layers = {}
+    # files of a sequence share their channels, which are matched against the rules once
+    if matches is not None and layout in matches:
+        out_channels, matched_layers, out_layers = matches[layout]
+    else:
+        out_channels, matched_layers, out_layers = match_layers(in_exr_header, rules, half, half_exclude)
 
-    for layer_name, value in in_exr_header['channels'].iteritems():
-        for pattern, replacement_name in layer_map.iteritems():
-            matches = re.search(r'{}'.format(pattern), layer_name, flags=re.IGNORECASE)
+        if matches is not None:
+            matches[layout] = (out_channels, matched_layers, out_layers)
 
-            if matches:
-                match_data = matches.groupdict()
+    # insert rechanneled channels into header with converted channel values, copies are changed by dropping constant channels
+    out_exr_header['channels'] = dict(out_channels)
 
-                if 'channel' in match_data.keys():
-                    out_channel_name = replacement_name + '.' + match_data['channel']
-                else:
-                    out_channel_name = replacement_name
+    matched_layers = dict(matched_layers)
+
+    if constant and matched_layers:
+        constant_layers = find_constant_channels(in_exr_file, matched_layers.keys())
+
+        constant_channels = {}
+        saved_bytes = 0
+
+        for layer_name, constant_value in constant_layers.iteritems():
+            pixel_type, out_channels = matched_layers.pop(layer_name)
 
-                # insert rechanneld channel into header with old channel value
-                out_exr_header['channels'].update({
-                    out_channel_name: value
-                })
+            for out_channel_name in out_channels.keys():
+                saved_bytes += get_channel_bytes(out_exr_header, out_exr_header['channels'].pop(out_channel_name))
 
-                # store rechanneld layer with data
-                matched_layers[out_channel_name] = in_exr_file.channel(layer_name)
+                constant_channels[out_channel_name] = constant_value
 
-    out_exr_file = OpenEXR.OutputFile(out_path, out_exr_header)
+        if constant_channels:
+            if constant == 'record':
+                # json.dumps would write NaN and Infinity, which are not valid JSON
+                out_exr_header[CONSTANT_CHANNELS_ATTRIBUTE] = json.dumps({out_channel_name: encode_float(constant_value) for out_channel_name, constant_value in constant_channels.iteritems()}, sort_keys=True, allow_nan=False)
 
-    # copy matched layers
-    if matched_layers:
-        out_exr_file.writePixels(matched_layers)
+            console.info('Dropped {count} constant channels of {in_path} ({saved_bytes} bytes uncompressed).'.format(count=len(constant_channels), in_path=os.path.basename(in_path), saved_bytes=saved_bytes))
 
-    out_exr_file.close()
+    # write to temporary file which replaces out_path once complete
+    with atomic_path(out_path) as temp_path:
+        out_exr_file = OpenEXR.OutputFile(temp_path, out_exr_header)
+
+        # stream matched layers in bands of scanlines
+        if matched_layers:
+            channels = {layer_name: pixel_type for layer_name, (pixel_type, out_channels) in matched_layers.iteritems()}
+
+            for (y_start, y_end), channel_data in imap_bands(in_path, channels, iter_bands(in_exr_header), num_threads):
+                band = convert_band(matched_layers, channel_data)
+
+                out_exr_file.writePixels(band, y_end - y_start + 1)
+
+        out_exr_file.close()
 
     # stop time
     time_stop = time.time()
@@ -95,11 +305,23 @@ def rechannel_file(in_path, out_path, layer_map=None):
 
     console.info('Finished rechannel of of {out_path} ({duration}s).'.format(out_path=os.path.basename(out_path), duration=duration)) 
 
+def rechannel_task(file_path):
+    """ Rechannel file with the job configuration of the worker.
+
+    Args:
+        file_path (str): File to read
+    """
+    context = get_worker_context()
+
+    basename = (context['prefix'] or '') + os.path.basename(file_path)
+
+    run_journaled(context['journal'], 'rechannel:' + file_path, rechannel_file, file_path, os.path.join(context['out_root'], basename), context['rules'], context['half'], context['half_exclude'], context['constant'], context['part'], context['band_threads'], context['matches'])
+
 def rechannel_files(files, out_fs, layer_map=None, num_threads=None, multiprocessing=True, **kwargs):
     """ Rechannel list of exr files and use multiprocessing.
 
     Args:
-        files (list): List of exr files
+        files (iterable): Exr files
         out_fs (fs): Output filesystem
         layer_map (dict): regular expression / replacement name pairs
         num_threads (int): Number of threads to use
@@ -108,25 +330,63 @@ def rechannel_files(files, out_fs, layer_map=None, num_threads=None, multiproces
     Raises:
         SameFileException
     """
-    console.info('Started rechannel of {} files.'.format(len(files)))
+    console.info('Started rechannel of files.')
+
+    # decode bands in threads only if files are not processed in parallel already
+    band_threads = 1 if multiprocessing else num_threads
+
+    shard = kwargs.get('shard')
 
-    tasks = []
+    # select files of this shard, every shard of the job selects from the same files
+    if shard:
+        files = shard.select(files)
 
-    for file_path in files:
-        dirname, basename = os.path.split(file_path)
+        console.info('Shard {}: {} files, {} bytes.'.format(shard, len(files), shard.bytes))
 
-        # prepend prefix to basename
-        if 'prefix' in kwargs and kwargs['prefix']:
-            basename = kwargs['prefix'] + basename
+    # journal of task states in the output directory, completed tasks are skipped on resume
+    journal, completed = open_journal(out_fs, bool(kwargs.get('resume')), shard)
 
-        # get out_path
-        out_path = out_fs.getsyspath(unicode(basename))
+    skipped = [0]
 
-        tasks.append((rechannel_file, file_path, out_path, layer_map))
+    def iter_tasks():
+        """ Create rechannel tasks while files are discovered.
 
-    run(tasks, num_threads, multiprocessing)
+        Returns:
+            generator
+        """
+        for file_path in files:
+            if 'rechannel:' + file_path in completed:
+                skipped[0] += 1
 
-    console.info('Finished rechannel of {} files.'.format(len(files)))
+                continue
+
+            yield (rechannel_task, file_path)
+
+    # job configuration is sent to each worker once, tasks only carry the file path
+    context = {
+        'rules': compile_layer_map(layer_map or {}),
+        'half': bool(kwargs.get('half')),
+        'half_exclude': compile_half_exclude(kwargs.get('half_exclude')),
+        'constant': kwargs.get('constant'),
+        'part': kwargs.get('part'),
+        'prefix': kwargs.get('prefix'),
+        'band_threads': band_threads,
+        'out_root': out_fs.getsyspath(u'/'),
+        'journal': journal,
+        'matches': {}
+    }
+
+    try:
+        count = run(iter_tasks(), num_threads, multiprocessing, context)
+    finally:
+        # the manifest records failed and unfinished files as well
+        if shard:
+            write_manifest(out_fs, shard, journal, ['rechannel:' + file_path for file_path in files])
+
+    if skipped[0]:
+        console.info('Skipped {} files completed before resume.'.format(skipped[0]))
+
+    console.info('Finished rechannel of {} files.'.format(count))
 
 def rechannel_dir(in_fs, out_fs, layer_map=None, num_threads=None, multithreading=True, **kwargs):
     """ Rechannel exr files in in_fs.
@@ -139,9 +399,6 @@ def rechannel_dir(in_fs, out_fs, layer_map=None, num_threads=None, multithreadin
         multithreading (bool): Use multithreading
     """
 
-    files = []
-
-    for file_name in in_fs.walk.files(filter=['*.exr']):
-        files.append(in_fs.getsyspath(file_name))
+    files = discover_fs(in_fs, kwargs.get('include'), kwargs.get('exclude'), kwargs.get('max_depth'), frames=kwargs.get('frames'))
 
     return rechannel_files(files, out_fs, layer_map, num_threads, multithreading, **kwargs)
\ No newline at end of file
@@ -0,0 +1,93 @@
+""" Shard manifest module. """
+
+# system
+import json
+
+# helpers
+from exrio.helpers.journal_helpers import DONE, FAILED
+from exrio.helpers.shard_helpers import read_manifests
+from exrio.helpers.fs_helpers import atomic_path
+
+# exrio
+from exrio import console
+
+# name of the combined manifest in the output directory
+COMBINED_MANIFEST_NAME = 'exrio_manifest.json'
+
+def merge_manifests(out_fs, job=None):
+    """ Combine the manifests of all shards of a job and print missing shards, failed and unfinished items.
+
+    The combined manifest is written to the output directory. Manifests belong to the same job if they share the job identifier and the number of shards, the job of the most recent manifest is merged unless a job is given.
+
+    Args:
+        out_fs (fs): Output filesystem of the job
+        job (str): Identifier of the job to merge
+
+    Returns:
+        dict: Report
+    """
+    manifests = read_manifests(out_fs)
+
+    if not manifests:
+        console.error('No shard manifests in {}.'.format(out_fs.getsyspath(u'/')))
+
+        return
+
+    if job is not None:
+        manifests = [manifest for manifest in manifests if manifest.get('job') == job]
+
+        if not manifests:
+            console.error('No shard manifests of job {} in {}.'.format(job, out_fs.getsyspath(u'/')))
+
+            return
+
+    # manifests of other jobs writing to the same output directory are ignored
+    job = manifests[-1].get('job')
+    count = manifests[-1]['count']
+
+    stale = [manifest for manifest in manifests if (manifest.get('job'), manifest['count']) != (job, count)]
+
+    if stale:
+        console.warning('Ignored {} manifests of other jobs.'.format(len(stale)))
+
+    manifests = [manifest for manifest in manifests if (manifest.get('job'), manifest['count']) == (job, count)]
+
+    items = {}
+
+    # items assigned to more than one shard, e.g. if nodes discovered different files
+    duplicates = set()
+
+    for manifest in manifests:
+        for key, state in manifest['items'].iteritems():
+            if key in items:
+                duplicates.add(key)
+
+                # an item counts as done if any shard completed it
+                if items[key] == DONE:
+                    continue
+
+            items[key] = state
+
+    shards = set(manifest['shard'] for manifest in manifests)
+
+    report = {
+        'job': job,
+        'count': count,
+        'items': len(items),
+        'done': len([key for key, state in items.iteritems() if state == DONE]),
+        'missing_shards': [index for index in xrange(1, count + 1) if index not in shards],
+        'failed': sorted(key for key, state in items.iteritems() if state == FAILED),
+        'unfinished': sorted(key for key, state in items.iteritems() if state not in [DONE, FAILED]),
+        'duplicates': sorted(duplicates),
+        'bytes': {manifest['shard']: manifest['bytes'] for manifest in manifests}
+    }
+
+    with atomic_path(out_fs.getsyspath(unicode(COMBINED_MANIFEST_NAME))) as temp_path:
+        with open(temp_path, 'w') as file_handle:
+            file_handle.write(json.dumps({'report': report, 'items': items}, indent=2, sort_keys=True))
+
+    print json.dumps(report, indent=4)
+
+    console.info('Merged manifests of {shards} of {count} shards: {done} of {items} items done, {failed} failed, {unfinished} unfinished.'.format(shards=len(shards), count=count, done=report['done'], items=report['items'], failed=len(report['failed']), unfinished=len(report['unfinished'])))
+
+    return report
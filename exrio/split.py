@@ -0,0 +1,236 @@
+""" Split exr module. """
+
+# system
+import copy
+import os
+import time
+
+from multiprocessing.pool import ThreadPool
+
+# exr
+import OpenEXR
+
+# exceptions
+from exrio.exrio_exceptions import NoExrFileException, SameDirectoryException
+
+# helpers
+from exrio.helpers.multiprocessing_helpers import run, get_worker_context
+from exrio.helpers.journal_helpers import open_journal, run_journaled
+from exrio.helpers.shard_helpers import write_manifest
+from exrio.helpers.discovery_helpers import discover_fs
+from exrio.helpers.exr_helpers import get_scanline_header, iter_bands, imap_bands
+from exrio.helpers.header_helpers import assure_readable_part
+from exrio.helpers.fs_helpers import atomic_paths
+
+# exrio
+from exrio.rechannel import compile_layer_map, compile_half_exclude, match_layers, convert_band
+from exrio import console
+
+# methods
+
+def split_file(in_path, out_dir, layer_map=None, half=False, half_exclude=None, part=None, num_threads=1, prefix=None):
+    """ Split exr file at in_path into one exr file per replacement layer of layer_map, decoding each input channel once.
+
+    The files are stored as out_dir/<layer>/<prefix><basename>.
+
+    Args:
+        in_path (str): File to read
+        out_dir (str): Directory to write layer directories to
+        layer_map (dict): Regular expression / replacement name pairs
+        half (bool): Convert float channels to half
+        half_exclude (list): Regular expressions of channels to keep at full precision
+        part (mixed): Index or name of part to split
+        num_threads (int): Number of threads decoding bands and writing files
+        prefix (str): Prefix of output files
+
+    Raises:
+        NoExrFileException
+        SameDirectoryException
+        NoPartException
+        UnsupportedPartException
+    """
+    console.info('Started split of {in_path}.'.format(in_path=os.path.basename(in_path)))
+
+    if os.path.normpath(os.path.dirname(in_path)) == os.path.normpath(out_dir):
+        raise SameDirectoryException(out_dir)
+
+    # start time
+    time_start = time.time()
+
+    if not layer_map:
+        layer_map = {}
+
+    rules = compile_layer_map(layer_map)
+
+    half_exclude = compile_half_exclude(half_exclude)
+
+    if not OpenEXR.isOpenExrFile(in_path):
+        raise NoExrFileException(in_path)
+
+    assure_readable_part(in_path, part, True)
+
+    # open exr file
+    in_exr_file = OpenEXR.InputFile(in_path)
+
+    # get open exr header
+    in_exr_header = in_exr_file.header()
+
+    out_channels, matched_layers, out_layers = match_layers(in_exr_header, rules, half, half_exclude)
+
+    basename = os.path.basename(in_path)
+
+    # prepend prefix to basename
+    if prefix:
+        basename = prefix + basename
+
+    layers = sorted(set(out_layers.values()))
+
+    out_paths = []
+
+    for layer in layers:
+        layer_dir = os.path.join(out_dir, layer)
+
+        if not os.path.isdir(layer_dir):
+            os.makedirs(layer_dir)
+
+        out_paths.append(os.path.join(layer_dir, basename))
+
+    # write to temporary files which replace the output files once all are complete
+    with atomic_paths(out_paths) as temp_paths:
+        # group output channels by replacement layer and open one output file per layer
+        out_exr_files = {}
+
+        for layer, temp_path in zip(layers, temp_paths):
+            out_exr_header = copy.deepcopy(get_scanline_header(in_exr_header))
+
+            out_exr_header['channels'] = {out_channel_name: value for out_channel_name, value in out_channels.iteritems() if out_layers[out_channel_name] == layer}
+
+            out_exr_files[layer] = OpenEXR.OutputFile(temp_path, out_exr_header)
+
+        if out_exr_files:
+            # each output file is written by one thread per band, at most one band is converted at a time
+            pool = ThreadPool(processes=min(max(num_threads or 1, 1), len(out_exr_files)))
+
+            try:
+                channels = {layer_name: pixel_type for layer_name, (pixel_type, layer_channels) in matched_layers.iteritems()}
+
+                for (y_start, y_end), channel_data in imap_bands(in_path, channels, iter_bands(in_exr_header), num_threads):
+                    band = convert_band(matched_layers, channel_data)
+
+                    def write_layer(layer):
+                        """ Write band of layer.
+
+                        Args:
+                            layer (str): Replacement layer name
+                        """
+                        layer_band = {out_channel_name: data for out_channel_name, data in band.iteritems() if out_layers[out_channel_name] == layer}
+
+                        out_exr_files[layer].writePixels(layer_band, y_end - y_start + 1)
+
+                    pool.map(write_layer, out_exr_files.keys())
+            finally:
+                pool.terminate()
+
+                for out_exr_file in out_exr_files.values():
+                    out_exr_file.close()
+
+    # stop time
+    time_stop = time.time()
+
+    # duration
+    duration = round(time_stop - time_start)
+
+    console.info('Finished split of {in_path} into {count} layers ({duration}s).'.format(in_path=os.path.basename(in_path), count=len(out_exr_files), duration=duration))
+
+def split_task(file_path):
+    """ Split file with the job configuration of the worker.
+
+    Args:
+        file_path (str): File to read
+    """
+    context = get_worker_context()
+
+    run_journaled(context['journal'], 'split:' + file_path, split_file, file_path, context['out_root'], context['rules'], context['half'], context['half_exclude'], context['part'], context['band_threads'], context['prefix'])
+
+def split_files(files, out_fs, layer_map=None, num_threads=None, multiprocessing=True, **kwargs):
+    """ Split list of exr files and use multiprocessing.
+
+    Args:
+        files (iterable): Exr files
+        out_fs (fs): Output filesystem
+        layer_map (dict): regular expression / replacement name pairs
+        num_threads (int): Number of threads to use
+        multiprocessing (bool): Use multiprocessing
+    """
+    console.info('Started split of files.')
+
+    # decode bands in threads only if files are not processed in parallel already
+    band_threads = 1 if multiprocessing else num_threads
+
+    out_dir = out_fs.getsyspath(u'/')
+
+    shard = kwargs.get('shard')
+
+    # select files of this shard, every shard of the job selects from the same files
+    if shard:
+        files = shard.select(files)
+
+        console.info('Shard {}: {} files, {} bytes.'.format(shard, len(files), shard.bytes))
+
+    # journal of task states in the output directory, completed tasks are skipped on resume
+    journal, completed = open_journal(out_fs, bool(kwargs.get('resume')), shard)
+
+    skipped = [0]
+
+    def iter_tasks():
+        """ Create split tasks while files are discovered.
+
+        Returns:
+            generator
+        """
+        for file_path in files:
+            if 'split:' + file_path in completed:
+                skipped[0] += 1
+
+                continue
+
+            yield (split_task, file_path)
+
+    # job configuration is sent to each worker once, tasks only carry the file path
+    context = {
+        'rules': compile_layer_map(layer_map or {}),
+        'half': bool(kwargs.get('half')),
+        'half_exclude': compile_half_exclude(kwargs.get('half_exclude')),
+        'part': kwargs.get('part'),
+        'prefix': kwargs.get('prefix'),
+        'band_threads': band_threads,
+        'out_root': out_dir,
+        'journal': journal
+    }
+
+    try:
+        count = run(iter_tasks(), num_threads, multiprocessing, context)
+    finally:
+        # the manifest records failed and unfinished files as well
+        if shard:
+            write_manifest(out_fs, shard, journal, ['split:' + file_path for file_path in files])
+
+    if skipped[0]:
+        console.info('Skipped {} files completed before resume.'.format(skipped[0]))
+
+    console.info('Finished split of {} files.'.format(count))
+
+def split_dir(in_fs, out_fs, layer_map=None, num_threads=None, multithreading=True, **kwargs):
+    """ Split exr files in in_fs.
+
+    Args:
+        in_fs (fs): Input filesystem
+        out_fs (fs): Output filesystem
+        layer_map (dict): regular expression / replacement name pairs
+        num_threads (int): Number of threads to use
+        multithreading (bool): Use multithreading
+    """
+
+    files = discover_fs(in_fs, kwargs.get('include'), kwargs.get('exclude'), kwargs.get('max_depth'), frames=kwargs.get('frames'))
+
+    return split_files(files, out_fs, layer_map, num_threads, multithreading, **kwargs)
@@ -0,0 +1,112 @@
+""" Tests of the exposure helpers module. """
+
+# system
+import unittest
+
+# image manipulation
+import numpy
+
+# helpers
+from exrio.helpers.exposure_helpers import DEFAULT_PERCENTILES, get_sample_step, sample_rows, estimate_range, normalize
+
+# maximum error of the estimated range relative to the full range of a full scan
+MAX_RELATIVE_ERROR = 0.02
+
+def create_gradient(height=1080, width=1920, fireflies=0.0005, seed=1):
+    """ Create diagonal gradient with wavy rows and sparse extreme pixels.
+
+    Args:
+        height (int): Number of rows
+        width (int): Number of columns
+        fireflies (float): Fraction of extreme pixels
+        seed (int): Random seed
+
+    Returns:
+        numpy.ndarray
+    """
+    random = numpy.random.RandomState(seed)
+
+    rows, columns = numpy.mgrid[0:height, 0:width].astype(numpy.float32)
+
+    pixels = columns / width * 4.0 + rows / height * 2.0 + numpy.sin(rows / 50.0)
+
+    pixels[random.rand(height, width) < fireflies] = 1e4
+
+    return pixels.astype(numpy.float32)
+
+def full_scan(channel_pixels, percentiles=DEFAULT_PERCENTILES):
+    """ Get percentiles of all finite pixels.
+
+    Args:
+        channel_pixels (list): Pixels of channels
+        percentiles (tuple): Lower and upper percentile
+
+    Returns:
+        tuple
+    """
+    pixels = numpy.concatenate([pixels.ravel() for pixels in channel_pixels])
+
+    low, high = numpy.percentile(pixels[numpy.isfinite(pixels)], percentiles)
+
+    return (float(low), float(high))
+
+class EstimateRangeTest(unittest.TestCase):
+
+    def test_error_is_bounded(self):
+        channel_pixels = [create_gradient(seed=1), create_gradient(seed=2) * 0.5]
+
+        low, high = full_scan(channel_pixels)
+
+        for sample_rate in [1.0, 0.5, 0.25, 0.125, 0.0625]:
+            estimated_low, estimated_high = estimate_range(channel_pixels, sample_rate)
+
+            self.assertLessEqual(abs(estimated_low - low) / (high - low), MAX_RELATIVE_ERROR, sample_rate)
+            self.assertLessEqual(abs(estimated_high - high) / (high - low), MAX_RELATIVE_ERROR, sample_rate)
+
+    def test_full_sample_rate_is_exact(self):
+        channel_pixels = [create_gradient(height=300, width=200)]
+
+        self.assertEqual(estimate_range(channel_pixels, 1.0, (1.0, 99.0)), full_scan(channel_pixels, (1.0, 99.0)))
+
+    def test_fireflies_are_ignored(self):
+        low, high = estimate_range([create_gradient()])
+
+        self.assertLess(high, 10.0)
+
+    def test_non_finite_pixels_are_ignored(self):
+        pixels = create_gradient(height=256, width=256, fireflies=0.0)
+
+        pixels[::7, ::5] = numpy.nan
+        pixels[::11, ::3] = numpy.inf
+
+        low, high = estimate_range([pixels])
+
+        self.assertTrue(numpy.isfinite(low) and numpy.isfinite(high))
+
+    def test_constant_pixels(self):
+        self.assertEqual(estimate_range([numpy.full((128, 128), 0.5, dtype=numpy.float32)]), (0.5, 1.5))
+
+    def test_empty_pixels(self):
+        self.assertEqual(estimate_range([numpy.full((128, 128), numpy.nan, dtype=numpy.float32)]), (0.0, 1.0))
+
+class SampleTest(unittest.TestCase):
+
+    def test_invalid_sample_rate(self):
+        for sample_rate in [0, -0.5, 1.5]:
+            self.assertRaises(ValueError, get_sample_step, sample_rate)
+
+    def test_sampled_rows(self):
+        pixels = numpy.arange(256 * 4, dtype=numpy.float32).reshape(256, 4)
+
+        # first and third band of 64 rows
+        self.assertEqual(sample_rows(pixels, 0.5, 64).size, 2 * 64 * 4)
+
+class NormalizeTest(unittest.TestCase):
+
+    def test_normalize(self):
+        pixels = numpy.array([-1.0, 0.0, 0.5, 1.0, 2.0, numpy.nan], dtype=numpy.float32)
+
+        self.assertEqual(normalize(pixels, 0.0, 1.0).tolist(), [0, 0, 127, 255, 255, 0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+""" Tests of the json helpers module. """
+
+# system
+import json
+import unittest
+
+# helpers
+from exrio.helpers.json_helpers import encode_float
+
+class EncodeFloatTest(unittest.TestCase):
+
+    def test_non_finite(self):
+        self.assertEqual([encode_float(float(value)) for value in ['nan', 'inf', '-inf']], ['nan', 'inf', '-inf'])
+
+    def test_round_trip(self):
+        values = {'A': float('nan'), 'Z': float('inf'), 'Y': 0.5, 'id': 7}
+
+        decoded = json.loads(json.dumps({key: encode_float(value) for key, value in values.iteritems()}, allow_nan=False))
+
+        self.assertEqual(decoded['Z'], 'inf')
+        self.assertNotEqual(float(decoded['A']), float(decoded['A']))
+        self.assertEqual(float(decoded['Z']), float('inf'))
+        self.assertEqual((decoded['Y'], decoded['id']), (0.5, 7))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+""" Tests of the sequence helpers module. """
+
+# system
+import os
+import unittest
+
+# helpers
+from exrio.helpers.sequence_helpers import split_frame, compact_frames, format_ranges, FrameRange, collect_sequences
+
+class SplitFrameTest(unittest.TestCase):
+
+    def test_frame(self):
+        self.assertEqual(split_frame('shot_beauty.1001.exr'), ('shot_beauty.', 1001, 4, '.exr'))
+        self.assertEqual(split_frame('shot_beauty_0042.EXR'), ('shot_beauty_', 42, 4, '.EXR'))
+        self.assertEqual(split_frame('0001.exr'), ('', 1, 4, '.exr'))
+
+    def test_version_is_not_a_frame(self):
+        self.assertIsNone(split_frame('comp_v002.exr'))
+        self.assertIsNone(split_frame('comp1001.exr'))
+
+    def test_short_number_is_not_a_frame(self):
+        self.assertIsNone(split_frame('shot.01.exr'))
+
+    def test_no_frame(self):
+        self.assertIsNone(split_frame('beauty.exr'))
+
+class CompactFramesTest(unittest.TestCase):
+
+    def test_ranges(self):
+        self.assertEqual(compact_frames([1005, 1001, 1002, 1003, 1003, 1010]), [(1001, 1003), (1005, 1005), (1010, 1010)])
+
+    def test_empty(self):
+        self.assertEqual(compact_frames([]), [])
+
+    def test_format(self):
+        self.assertEqual(format_ranges(compact_frames([1, 2, 3, 5, 7, 8])), '1-3,5,7-8')
+
+class FrameRangeTest(unittest.TestCase):
+
+    def test_parse(self):
+        frame_range = FrameRange.parse('1001-1010x3, 1200,-5--1')
+
+        self.assertEqual(frame_range.ranges, [(1001, 1010, 3), (1200, 1200, 1), (-5, -1, 1)])
+
+        self.assertEqual([frame for frame in xrange(995, 1205) if frame in frame_range], [1001, 1004, 1007, 1010, 1200])
+        self.assertTrue(-3 in frame_range)
+
+    def test_parse_invalid(self):
+        for value in ['', 'a', '1010-1001', '1001-1010x0', '1001x2', '1001-']:
+            self.assertRaises(ValueError, FrameRange.parse, value)
+
+    def test_get_frames(self):
+        frame_range = FrameRange.parse('1001-1100x10,1050')
+
+        self.assertEqual(sorted(frame_range.get_frames(1015, 1055)), [1021, 1031, 1041, 1050, 1051])
+
+    def test_contains_name(self):
+        frame_range = FrameRange.parse('1001-1002')
+
+        self.assertTrue(frame_range.contains_name('shot.1002.exr'))
+        self.assertFalse(frame_range.contains_name('shot.1003.exr'))
+        self.assertFalse(frame_range.contains_name('shot.exr'))
+
+class CollectSequencesTest(unittest.TestCase):
+
+    def test_sequences(self):
+        paths = [os.path.join('shot', name) for name in ['beauty.1003.exr', 'beauty.1001.exr', 'beauty.1004.exr', 'beauty.1010.exr', 'comp_v002.exr', 'depth_0001.exr']]
+
+        sequences = collect_sequences(paths)
+
+        self.assertEqual([sequence.pattern for sequence in sequences], ['beauty.####.exr', 'comp_v002.exr', 'depth_####.exr'])
+
+        beauty = sequences[0].summary()
+
+        self.assertEqual((beauty['first'], beauty['last'], beauty['count']), (1001, 1010, 4))
+        self.assertEqual(beauty['frames'], '1001,1003-1004,1010')
+        self.assertEqual(beauty['missing'], '1002,1005-1009')
+
+        self.assertEqual(sequences[0].get_path(1002), os.path.join('shot', 'beauty.1002.exr'))
+
+        self.assertEqual(sequences[1].summary()['count'], 1)
+
+    def test_directories_are_separate(self):
+        sequences = collect_sequences([os.path.join('a', 'beauty.1001.exr'), os.path.join('b', 'beauty.1001.exr')])
+
+        self.assertEqual([sequence.directory for sequence in sequences], ['a', 'b'])
+
+    def test_missing_within_frame_range(self):
+        frame_range = FrameRange.parse('1001-1011x2')
+
+        paths = ['beauty.{}.exr'.format(frame) for frame in [1001, 1003, 1009, 1011]]
+
+        self.assertEqual(collect_sequences(paths, frame_range)[0].summary()['missing'], '1005,1007')
+        self.assertEqual(collect_sequences(paths)[0].summary()['missing'], '1002,1004-1008,1010')
+
+if __name__ == '__main__':
+    unittest.main()